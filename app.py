@@ -1,20 +1,3605 @@
+import time
+_STARTED = time.perf_counter() # Startup phases are timed from here (--profile-startup)
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox, Menu, ttk 
+from tkinter import font as tkfont
+from tkinter import simpledialog
 import os
 import re
-from PIL import Image, ImageTk # Import Pillow for image handling
-import datetime # For status bar time
 import shutil # For deleting non-empty directories
+import mmap
+import threading
+import bisect
+import struct
+import hashlib
+import pickle
+import tempfile
+import ast
+import json
+import itertools
+import queue
+import heapq
+import collections
+import sys
+import ctypes
+import ctypes.util
+import multiprocessing
+import subprocess
+import signal
+import codecs
+import locale
+import argparse
+import weakref
+from array import array
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class Grammar:
+    """A language's token rules compiled into one alternation regex, scanned once per line."""
+
+    def __init__(self, name, rules, blocks=(), keywords=()):
+        # rules: (tag, pattern) pairs, earlier rules win. tag may be a tuple naming the
+        # tag of each capture group in pattern (None leaves the text untagged).
+        # blocks: (tag, open, close) spans that may continue over several lines.
+        self.name = name
+        self.keywords = list(keywords)
+        self.blocks = [(tag, re.compile(close)) for tag, _open, close in blocks]
+        self._rules = {}
+        parts = []
+        group = 1
+        for i, (tag, _open, _close) in enumerate(blocks):
+            parts.append(f"(?P<b{i}>{_open})")
+            self._rules[f"b{i}"] = ("block", i, group)
+            group += 1 + re.compile(_open).groups
+        for i, (tag, pattern) in enumerate(rules):
+            parts.append(f"(?P<r{i}>{pattern})")
+            self._rules[f"r{i}"] = (tag, None, group)
+            group += 1 + re.compile(pattern).groups
+        self.regex = re.compile("|".join(parts)) if parts else None
+
+    def lex_line(self, line, state=None):
+        """Returns the non-overlapping (tag, start, end) tokens of line and the end state."""
+        tokens = []
+        pos = 0
+        if state is not None:
+            # Inside a block opened on a previous line
+            tag, close = self.blocks[state]
+            match = close.search(line)
+            if match is None:
+                return [(tag, 0, len(line))] if line else [], state
+            pos = match.end()
+            tokens.append((tag, 0, pos))
+        if self.regex is None:
+            return tokens, None
+
+        search = self.regex.search
+        length = len(line)
+        while pos < length:
+            match = search(line, pos)
+            if match is None:
+                break
+            tag, block, group = self._rules[match.lastgroup]
+            start, end = match.span()
+            if tag == "block":
+                block_tag, close = self.blocks[block]
+                closing = close.search(line, end)
+                if closing is None:
+                    tokens.append((block_tag, start, length))
+                    return tokens, block
+                end = closing.end()
+                tokens.append((block_tag, start, end))
+            elif isinstance(tag, tuple):
+                for offset, sub_tag in enumerate(tag, 1):
+                    if sub_tag and match.start(group + offset) != -1:
+                        tokens.append((sub_tag, match.start(group + offset), match.end(group + offset)))
+            elif tag:
+                tokens.append((tag, start, end))
+            pos = end if end > start else end + 1
+        return tokens, None
+
+
+def _keyword_rule(words):
+    return r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b"
+
+
+PYTHON_KEYWORDS = ["import", "from", "def", "class", "return", "if", "else", "elif",
+                   "for", "while", "break", "continue", "try", "except", "finally",
+                   "with", "as", "True", "False", "None", "and", "or", "not", "in", "is",
+                   "lambda", "yield", "pass", "raise", "global", "nonlocal", "del",
+                   "assert", "async", "await"]
+
+JS_KEYWORDS = ["var", "let", "const", "function", "return", "if", "else", "for", "while",
+               "do", "break", "continue", "switch", "case", "default", "try", "catch",
+               "finally", "throw", "new", "delete", "typeof", "instanceof", "in", "of",
+               "class", "extends", "super", "this", "import", "export", "from", "as",
+               "async", "await", "yield", "true", "false", "null", "undefined", "void"]
+
+CSS_KEYWORDS = ["!important", "inherit", "initial", "unset", "none", "auto"]
+
+NUMBER_RULE = r"\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\b"
+
+GRAMMARS = {
+    "python": Grammar(
+        "Python",
+        rules=[
+            ("comment", r"#.*"),
+            ("string", r"[rRbBuUfF]{0,2}(?:\"(?:\\.|[^\"\\])*\"?|'(?:\\.|[^'\\])*'?)"),
+            (("keyword", "function"), r"\b(def|class)\s+([A-Za-z_]\w*)"),
+            ("keyword", _keyword_rule(PYTHON_KEYWORDS)),
+            (None, r"[A-Za-z_]\w*"), # Plain identifiers, so keywords never match inside them
+            ("number", NUMBER_RULE),
+            ("operator", r"[+\-*/=!<>&|^%~.:,@]"),
+        ],
+        blocks=[("string", r"[rRbBuUfF]{0,2}\"\"\"", r"\"\"\""),
+                ("string", r"[rRbBuUfF]{0,2}'''", r"'''")],
+        keywords=PYTHON_KEYWORDS),
+    "javascript": Grammar(
+        "JavaScript",
+        rules=[
+            ("comment", r"//.*"),
+            ("string", r"\"(?:\\.|[^\"\\])*\"?|'(?:\\.|[^'\\])*'?"),
+            (("keyword", "function"), r"\b(function|class)\s+([A-Za-z_$][\w$]*)"),
+            ("keyword", _keyword_rule(JS_KEYWORDS)),
+            (None, r"[A-Za-z_$][\w$]*"),
+            ("number", NUMBER_RULE),
+            ("operator", r"[+\-*/=!<>&|^%~?.:,]"),
+        ],
+        blocks=[("comment", r"/\*", r"\*/"),
+                ("string", r"`", r"(?<!\\)`")],
+        keywords=JS_KEYWORDS),
+    "html": Grammar(
+        "HTML",
+        rules=[
+            (("operator", "keyword"), r"(</?)([A-Za-z][\w:-]*)"),
+            (("function", "operator", "string"), r"\b([A-Za-z_:][\w:.-]*)\s*(=)\s*(\"[^\"]*\"?|'[^']*'?)"),
+            ("operator", r"/?>"),
+            ("number", r"&#?\w+;"),
+        ],
+        blocks=[("comment", r"<!--", r"-->")]),
+    "css": Grammar(
+        "CSS",
+        rules=[
+            ("string", r"\"(?:\\.|[^\"\\])*\"?|'(?:\\.|[^'\\])*'?"),
+            ("keyword", r"@[\w-]+|!important\b"),
+            (("function", "operator"), r"(?<![.#:\w-])([A-Za-z-]+)\s*(:)(?!:)"),
+            ("number", r"#[0-9a-fA-F]{3,8}\b|-?\b\d+(?:\.\d+)?(?:%|[a-z]+)?"),
+            ("keyword", _keyword_rule(CSS_KEYWORDS[1:])),
+            ("operator", r"[{};,>+~]"),
+        ],
+        blocks=[("comment", r"/\*", r"\*/")],
+        keywords=CSS_KEYWORDS),
+    "json": Grammar(
+        "JSON",
+        rules=[
+            (("function",), r"(\"(?:\\.|[^\"\\])*\")(?=\s*:)"), # Object keys
+            ("string", r"\"(?:\\.|[^\"\\])*\"?"),
+            ("keyword", r"\b(?:true|false|null)\b"),
+            ("number", r"-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b"),
+            ("operator", r"[{}\[\]:,]"),
+        ],
+        keywords=["true", "false", "null"]),
+    "xml": Grammar(
+        "XML",
+        rules=[
+            (("operator", "keyword"), r"(</?|<\?)([A-Za-z_][\w:.-]*)"),
+            (("function", "operator", "string"), r"\b([A-Za-z_:][\w:.-]*)\s*(=)\s*(\"[^\"]*\"?|'[^']*'?)"),
+            ("operator", r"\??/?>"),
+            ("number", r"&#?\w+;"),
+        ],
+        blocks=[("comment", r"<!--", r"-->"),
+                ("string", r"<!\[CDATA\[", r"\]\]>")]),
+}
+PLAIN_TEXT = Grammar("Texto Plano", rules=[])
+
+GRAMMARS_BY_EXTENSION = {
+    ".py": GRAMMARS["python"], ".pyw": GRAMMARS["python"],
+    ".js": GRAMMARS["javascript"], ".mjs": GRAMMARS["javascript"],
+    ".html": GRAMMARS["html"], ".htm": GRAMMARS["html"],
+    ".css": GRAMMARS["css"],
+    ".json": GRAMMARS["json"],
+    ".xml": GRAMMARS["xml"],
+}
+
+
+def grammar_for_path(path):
+    """Grammar for a file path. Untitled buffers are treated as Python, as before."""
+    if not path:
+        return GRAMMARS["python"]
+    return GRAMMARS_BY_EXTENSION.get(os.path.splitext(path)[1].lower(), PLAIN_TEXT)
+
+
+_UNKNOWN = object() # Lexer state of a line that has not been lexed since it changed
+
+
+class IncrementalHighlighter:
+    """Keeps per-line lexer state and re-tags only changed lines, viewport first."""
+
+    TAGS = ("keyword", "string", "comment", "function", "number", "operator")
+    VIEWPORT_MARGIN = 40 # Lines tagged around the viewport on every refresh
+    FILL_CHUNK = 400 # Lines lexed/tagged per background step
+
+    def __init__(self, text, grammar=None, buffer=None):
+        self.text = text
+        self.grammar = grammar or GRAMMARS["python"]
+        self.buffer = buffer # Lines are read from the document's TextBuffer when it has one
+        # One entry per buffer line (index 0 is line 1)
+        self.states = [_UNKNOWN] # Lexer state at the end of the line
+        # Cached tokens, None when the line must be re-lexed: it was edited, or the lexing of the
+        # lines above stopped before its start state was known to be unchanged
+        self.tokens = [None]
+        self.painted = [False] # Whether the line's tags match its tokens
+        self.applied = [()] # Tokens currently tagged in the widget, None if unknown
+        self.invalid_from = 0 # First line that must be re-lexed (len(tokens) when none)
+
+    def set_grammar(self, grammar):
+        """Switches language, discarding every cached token and applied tag."""
+        self.grammar = grammar
+        for tag in self.TAGS:
+            self.text.tag_remove(tag, "1.0", tk.END)
+        self.reset()
+        self.applied = [()] * len(self.tokens)
+
+    def reset(self):
+        if self.buffer is not None:
+            line_count = self.buffer.line_count
+        else:
+            line_count = int(self.text.index("end-1c").split('.')[0])
+        self.states = [_UNKNOWN] * line_count
+        self.tokens = [None] * line_count
+        self.painted = [False] * line_count
+        self.applied = [None] * line_count
+        self.invalid_from = 0
+
+    def on_edit(self, first_line, old_last_line, new_last_line):
+        """Lines first_line..old_last_line were replaced by first_line..new_last_line."""
+        start, old_end, new_end = first_line - 1, old_last_line, new_last_line
+        count = new_end - start
+        self.states[start:old_end] = [_UNKNOWN] * count
+        self.tokens[start:old_end] = [None] * count
+        self.painted[start:old_end] = [False] * count
+        # Text inserted inside a tagged range inherits its tags, so edited lines are unknown
+        self.applied[start:old_end] = [None] * count
+        self.invalid_from = min(self.invalid_from, start)
+
+    def _lex(self, stop):
+        """Re-lexes stale lines up to index stop (inclusive), following continuations."""
+        i = self.invalid_from
+        count = len(self.tokens)
+        if i >= count:
+            return
+        stop = min(stop, count - 1)
+        state = self.states[i - 1] if i > 0 else None
+        batch, batch_start = [], i
+        while i <= stop:
+            if i - batch_start >= len(batch):
+                batch_end = min(i + self.FILL_CHUNK, count) - 1
+                if self.buffer is not None:
+                    batch = self.buffer.lines(i + 1, batch_end + 1)
+                else:
+                    batch = self.text.get(f"{i + 1}.0", f"{batch_end + 1}.end").split("\n")
+                batch_start = i
+            tokens, new_state = self.grammar.lex_line(batch[i - batch_start], state)
+            if tokens != self.tokens[i]:
+                self.tokens[i] = tokens
+                self.painted[i] = False
+            converged = self.states[i] is not _UNKNOWN and self.states[i] == new_state
+            self.states[i] = new_state
+            state = new_state
+            i += 1
+            if converged:
+                # Later lines still lex the same; skip to the next line marked stale, if any
+                try:
+                    i = self.tokens.index(None, i)
+                except ValueError:
+                    i = count
+                state = self.states[i - 1] if 0 < i < count else None
+            elif i < count and i > stop:
+                # Stopping while the state still changes: mark the next line, so a later pass that
+                # converges above it (e.g. after another edit) cannot skip it
+                self.tokens[i] = None
+                self.painted[i] = False
+        self.invalid_from = i
+
+    def _paint(self, first, last):
+        """Applies cached tokens to unpainted lines in first..last (indexes).
+
+        Only the difference with what is already tagged is sent to Tk, as one
+        multi-range "tag remove" and one "tag add" call per tag.
+        """
+        last = min(last, len(self.tokens) - 1)
+        removes = {tag: [] for tag in self.TAGS}
+        adds = {tag: [] for tag in self.TAGS}
+        for i in range(first, last + 1):
+            tokens = self.tokens[i]
+            if self.painted[i] or tokens is None:
+                continue
+            line_num = i + 1
+            applied = self.applied[i]
+            if applied is None:
+                for ranges in removes.values():
+                    ranges.extend((f"{line_num}.0", f"{line_num}.end"))
+                added = tokens
+            else:
+                for tag, start, end in set(applied).difference(tokens):
+                    removes[tag].extend((f"{line_num}.{start}", f"{line_num}.{end}"))
+                added = set(tokens).difference(applied)
+            for tag, start, end in added:
+                adds[tag].extend((f"{line_num}.{start}", f"{line_num}.{end}"))
+            self.applied[i] = tokens
+            self.painted[i] = True
+
+        widget = self.text._w
+        call = self.text.tk.call
+        for tag, ranges in removes.items():
+            if ranges:
+                call(widget, "tag", "remove", tag, *ranges)
+        for tag, ranges in adds.items():
+            if ranges:
+                call(widget, "tag", "add", tag, *ranges)
+
+    def visible_range(self):
+        first = int(self.text.index("@0,0").split('.')[0]) - 1
+        last = int(self.text.index("@0,%d" % self.text.winfo_height()).split('.')[0]) - 1
+        return max(first - self.VIEWPORT_MARGIN, 0), last + self.VIEWPORT_MARGIN
+
+    def refresh(self):
+        """Lexes and tags the viewport (plus margin)."""
+        first, last = self.visible_range()
+        self._lex(last)
+        self._paint(first, last)
+
+    def run(self):
+        """Time-sliced refresh job: the viewport first, then the rest of the file."""
+        self.refresh()
+        while self.invalid_from < len(self.tokens) or False in self.painted:
+            yield
+            self._fill_step()
+
+    def _fill_step(self):
+        count = len(self.tokens)
+        if self.invalid_from < count:
+            self._lex(self.invalid_from + self.FILL_CHUNK)
+        try:
+            first = self.painted.index(False)
+        except ValueError:
+            first = count
+        if first < count:
+            self._paint(first, first + self.FILL_CHUNK)
+
+
+class RefreshScheduler:
+    """Coalesces UI refresh work into master.after callbacks.
+
+    Each kind of work (gutter, highlight, status...) is registered with a
+    latency budget. Marking a kind dirty schedules it to run within that
+    budget; further requests before it runs are merged into the same run.
+    A debounced kind instead runs once its latency has passed without new
+    requests (e.g. once edits settle).
+    A job that returns a generator is run in time slices, yielding to the
+    Tk event loop between slices so input is never starved. A job that
+    raises is reported like any Tk callback error and dropped, without
+    holding up the others.
+    """
+
+    SLICE_MS = 8 # Max time spent in chunked jobs before yielding to the event loop
+
+    def __init__(self, master):
+        self.master = master
+        self._jobs = {} # kind -> (callback, default latency in ms)
+        self._debounced = set()
+        self._due = {} # kind -> monotonic deadline
+        self._running = {} # kind -> generator of a time-sliced job in progress
+        self._timer = None
+        self._timer_at = None
+        self.stats = {}
+        self.tracer = None # Called with (kind, start, end) of every run and slice while profiling
+
+    def register(self, kind, callback, latency_ms, debounce=False):
+        self._jobs[kind] = (callback, latency_ms)
+        if debounce:
+            self._debounced.add(kind)
+        self.stats[kind] = {"requests": 0, "runs": 0, "slices": 0, "max_ms": 0.0}
+
+    def mark_dirty(self, kind, latency_ms=None, event=None):
+        """Requests a run of kind within latency_ms (its registered budget by default)."""
+        if latency_ms is None:
+            latency_ms = self._jobs[kind][1]
+        self.stats[kind]["requests"] += 1
+        deadline = time.monotonic() + latency_ms / 1000
+        if kind not in self._due or deadline < self._due[kind] or kind in self._debounced:
+            self._due[kind] = deadline
+        self._arm()
+
+    def run_now(self, kind):
+        """Runs a pending or new request for kind immediately (e.g. after opening a file)."""
+        self._due.pop(kind, None)
+        self.stats[kind]["requests"] += 1
+        self._start(kind)
+        self._arm()
+
+    def _arm(self):
+        if self._running:
+            wake_at = time.monotonic()
+        elif self._due:
+            wake_at = min(self._due.values())
+        else:
+            return
+        if self._timer is not None:
+            if self._timer_at <= wake_at:
+                return
+            self.master.after_cancel(self._timer)
+        delay = max(int((wake_at - time.monotonic()) * 1000), 1)
+        self._timer = self.master.after(delay, self._tick)
+        self._timer_at = wake_at
+
+    def _record(self, kind, started):
+        ended = time.perf_counter()
+        stats = self.stats[kind]
+        stats["max_ms"] = max(stats["max_ms"], (ended - started) * 1000)
+        if self.tracer is not None:
+            self.tracer(kind, started, ended)
+
+    def _start(self, kind):
+        self.stats[kind]["runs"] += 1
+        self._running.pop(kind, None) # A new request restarts an unfinished job
+        started = time.perf_counter()
+        try:
+            result = self._jobs[kind][0]()
+        except Exception:
+            self.master.report_callback_exception(*sys.exc_info())
+            return
+        finally:
+            self._record(kind, started)
+        if hasattr(result, "__next__"):
+            self._running[kind] = result
+
+    def _step(self, kind):
+        self.stats[kind]["slices"] += 1
+        started = time.perf_counter()
+        try:
+            next(self._running[kind])
+        except StopIteration:
+            del self._running[kind]
+        except Exception:
+            del self._running[kind] # Retrying would only raise again
+            self.master.report_callback_exception(*sys.exc_info())
+        finally:
+            self._record(kind, started)
+
+    def _tick(self):
+        self._timer = None
+        try:
+            now = time.monotonic()
+            for kind in [kind for kind, deadline in self._due.items() if deadline <= now]:
+                del self._due[kind]
+                self._start(kind)
+
+            slice_end = time.perf_counter() + self.SLICE_MS / 1000
+            while self._running and time.perf_counter() < slice_end:
+                for kind in list(self._running):
+                    self._step(kind)
+        finally:
+            self._arm() # Whatever is still due or running gets its next tick
+
+    def format_stats(self):
+        lines = []
+        for kind, stats in self.stats.items():
+            requests, runs = stats["requests"], stats["runs"]
+            merged = 100 * (requests - runs) / requests if requests else 0
+            lines.append(f" - {kind}: {requests} solicitudes, {runs} ejecuciones "
+                         f"({merged:.0f}% combinadas), {stats['slices']} fragmentos, "
+                         f"máx {stats['max_ms']:.1f} ms")
+        return "\n".join(lines)
+
+
+class LineNumberGutter:
+    """Line-number canvas that reuses a pool of text items instead of recreating them."""
+
+    PADDING = 12 # Horizontal space around the numbers, in pixels
+
+    def __init__(self, parent, text=None, font=("Consolas", 10), bg='#282c34', fg="#6a737d"):
+        self.text = text
+        self.font = tkfont.Font(family=font[0], size=font[1])
+        self.fg = fg
+        self.canvas = tk.Canvas(parent, width=30, bg=bg, highlightthickness=0)
+        self.items = [] # Pooled canvas text items, one per visible line
+        self.labels = [] # Text currently shown by each pooled item
+        self.positions = [] # y coordinate of each pooled item
+        self._viewport = None # What the last redraw was based on
+        self._digits = 0
+        self._moved = False # Width changed, so every item needs new coordinates
+        self.line_offset = 0 # Added to widget line numbers (the huge file viewer shows a window)
+
+    def set_text(self, text, line_offset=0):
+        """Numbers another text widget (e.g. after switching tabs)."""
+        self.text = text
+        self.line_offset = line_offset
+        self._viewport = None
+
+    def redraw(self):
+        """Relabels/repositions the pooled items; does nothing when the viewport did not move."""
+        if self.text is None:
+            return
+        line_count = int(self.text.index("end-1c").split('.')[0])
+        first_info = self.text.dlineinfo("@0,0")
+        viewport = (self.text.index("@0,0"), first_info and first_info[1],
+                    self.text.winfo_height(), line_count, self.line_offset)
+        if viewport == self._viewport:
+            return
+        self._viewport = viewport
+        self._fit_width(line_count + self.line_offset)
+
+        first = int(viewport[0].split('.')[0])
+        visible = []
+        line = first
+        while line <= line_count:
+            info = self.text.dlineinfo(f"{line}.0")
+            if info is None:
+                break
+            visible.append((str(line + self.line_offset), info[1]))
+            line += 1
+
+        x = int(self.canvas.cget("width")) - self.PADDING // 2
+        for k, (label, y) in enumerate(visible):
+            if k == len(self.items):
+                self.items.append(self.canvas.create_text(x, y, anchor="ne", text=label,
+                                                          fill=self.fg, font=self.font))
+                self.labels.append(label)
+                self.positions.append(y)
+                continue
+            item = self.items[k]
+            if self.positions[k] != y or self._moved:
+                self.canvas.coords(item, x, y)
+                self.positions[k] = y
+            if self.labels[k] != label:
+                self.canvas.itemconfigure(item, text=label, state="normal")
+                self.labels[k] = label
+        self._moved = False
+        for k in range(len(visible), len(self.items)):
+            if self.labels[k] is not None:
+                self.canvas.itemconfigure(self.items[k], state="hidden")
+                self.labels[k] = None
+
+    def _fit_width(self, line_count):
+        """Grows (or shrinks) the gutter when the line count gains or loses digits."""
+        digits = max(len(str(line_count)), 2)
+        self._moved = digits != self._digits
+        if self._moved:
+            self._digits = digits
+            self.canvas.config(width=self.font.measure("9" * digits) + self.PADDING)
+
+
+class StreamingFileLoader:
+    """Reads a text file in chunks and appends them to a Text widget from after() callbacks."""
+
+    CHUNK_CHARS = 256 * 1024 # Characters inserted per step
+
+    def __init__(self, text, path):
+        self.text = text
+        self.path = path
+        self.file = open(path, "r", encoding="utf-8")
+        self.stat = os.fstat(self.file.fileno()) # Taken before reading: a later change shows in st_mtime_ns
+        self.size = self.stat.st_size
+        self.hash = hashlib.sha1() # Of the text read so far, as the editor saves it (UTF-8)
+        self._job = None
+
+    def start(self, on_progress, on_done, on_error):
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self._step()
+
+    def cancel(self):
+        if self._job is not None:
+            self.text.after_cancel(self._job)
+            self._job = None
+        self.file.close()
+
+    def _step(self):
+        self._job = None
+        try:
+            chunk = self.file.read(self.CHUNK_CHARS)
+        except (OSError, UnicodeDecodeError) as e:
+            self.file.close()
+            self.on_error(e)
+            return
+        if not chunk:
+            self.file.close()
+            self.on_done()
+            return
+        self.hash.update(chunk.encode("utf-8", "surrogatepass"))
+        self.text.config(state="normal")
+        self.text.insert("end-1c", chunk)
+        self.text.config(state="disabled") # No typing until the whole file is in
+        self.on_progress(min(self.file.buffer.tell(), self.size), self.size)
+        # Yield to the event loop between chunks so the window stays responsive
+        self._job = self.text.after(1, self._step)
+
+
+def _cache_dir(*parts):
+    """Per-user cache directory for TkCode (created on demand)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "tkcode", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _cache_file(kind, path, suffix=".idx"):
+    """Where the cache of kind (e.g. "symbols") for a file or project root path is kept."""
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(_cache_dir(kind), digest + suffix)
+
+
+def _read_cache(path):
+    """Bytes of a cache file, or None when there is none (or it cannot be read)."""
+    try:
+        with open(path, "rb") as cache:
+            return cache.read()
+    except OSError:
+        return None
+
+
+def _load_cached_state(path, version, root):
+    """State pickled by an index for root, or None if missing, corrupt or from another version."""
+    data = _read_cache(path)
+    if data is None:
+        return None
+    try:
+        state = pickle.loads(data)
+        if state["version"] == version and state["root"] == root:
+            return state
+    except Exception:
+        pass
+    return None # Rebuilt from scratch
+
+
+def _write_cache(path, *parts):
+    """Replaces a cache file with the concatenated parts (bytes-like).
+
+    Caches are only an optimization: if the file cannot be written, the
+    work is simply done again next time.
+    """
+    try:
+        with open(path + ".tmp", "wb") as cache:
+            for part in parts:
+                cache.write(part)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+
+
+class LineIndex:
+    """Byte offsets of every line start in a file, built in a background thread.
+
+    The finished index is saved next to the other TkCode caches and reused
+    while the file's size and mtime are unchanged.
+    """
+
+    CHUNK_BYTES = 16 * 1024 * 1024
+    MAGIC = b"TKLI1"
+
+    def __init__(self, path, mm, size):
+        self.mm = mm
+        self.size = size
+        self.offsets = array("Q", [0])
+        self.complete = False
+        self.closed = False
+        stat = os.stat(path)
+        self.key = struct.pack("<QQ", stat.st_size, stat.st_mtime_ns)
+        self.cache_path = _cache_file("line-index", path)
+        if not self._load():
+            threading.Thread(target=self._build, daemon=True).start()
+
+    def _load(self):
+        data = _read_cache(self.cache_path)
+        header = self.MAGIC + self.key
+        if data is None or not data.startswith(header):
+            return False
+        offsets = array("Q")
+        offsets.frombytes(memoryview(data)[len(header):])
+        self.offsets = offsets
+        self.complete = True
+        return True
+
+    def _build(self):
+        position = 0
+        try:
+            while position < self.size and not self.closed:
+                chunk = self.mm[position:position + self.CHUNK_BYTES]
+                # Line lengths come from a C-level split; accumulate turns them into offsets
+                lengths = map(len, chunk.split(b"\n")[:-1])
+                found = array("Q", itertools.accumulate(map((1).__add__, lengths), initial=position))
+                self.offsets.extend(found[1:])
+                position += len(chunk)
+        except ValueError: # The mmap was closed under us
+            return
+        if self.closed:
+            return
+        _write_cache(self.cache_path, self.MAGIC + self.key, memoryview(self.offsets))
+        self.complete = True
+
+    def close(self):
+        self.closed = True
+
+    def indexed_bytes(self):
+        return self.size if self.complete else self.offsets[-1]
+
+    def line_count(self):
+        """Lines known so far (all of them once complete)."""
+        count = len(self.offsets)
+        if not self.complete:
+            return count - 1 # The last known line start has no known end yet
+        if count > 1 and self.offsets[-1] == self.size:
+            return count - 1 # A trailing newline does not start a new line
+        return count
+
+    def estimated_line_count(self):
+        count = self.line_count()
+        if self.complete or not self.indexed_bytes():
+            return max(count, 1)
+        return max(count, int(count * self.size / self.indexed_bytes()))
+
+    def line_span(self, line):
+        """Byte range of a 1-based line, without its newline."""
+        start = self.offsets[line - 1]
+        end = self.offsets[line] - 1 if line < len(self.offsets) else self.size
+        return start, end
+
+    def line_of_offset(self, offset):
+        return bisect.bisect_right(self.offsets, offset)
+
+
+class HugeFileViewer:
+    """Read-only view of a memory-mapped file that only materializes the visible lines.
+
+    The Text widget holds a window of WINDOW_LINES lines; when the view gets
+    close to either edge of that window the content is swapped for a window
+    centered on the current position. The scrollbar is driven in file lines.
+    """
+
+    WINDOW_LINES = 600
+    MARGIN_LINES = 150 # Re-window when the view gets this close to an edge
+    SEARCH_CHUNK = 8 * 1024 * 1024 # Bytes scanned per search step
+
+    def __init__(self, text, scrollbar, path):
+        self.text = text
+        self.scrollbar = scrollbar
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.file.close()
+            raise
+        self.index = LineIndex(path, self.mm, self.size)
+        self.window_start = 1 # File line shown on text line 1
+        self.window_end = 1 # File line after the last one materialized
+        self._search_job = None
+        self._poll_job = None
+
+    def close(self):
+        self.cancel_search()
+        if self._poll_job is not None:
+            self.text.after_cancel(self._poll_job)
+        self.index.close()
+        self.mm.close()
+        self.file.close()
+
+    def open(self, on_status):
+        self.on_status = on_status
+        self._show_window(1)
+        self.text.yview_moveto(0)
+        self._poll_index()
+
+    def _poll_index(self):
+        # Until the index is complete, more lines become reachable every tick
+        self._poll_job = None
+        if self.index.complete:
+            self.on_status(f"{self.index.line_count()} líneas (solo lectura)")
+        else:
+            percent = 100 * self.index.indexed_bytes() // max(self.size, 1)
+            self.on_status(f"Indexando líneas… {percent}% (solo lectura)")
+            self._poll_job = self.text.after(250, self._poll_index)
+        if self.window_end - self.window_start < self.WINDOW_LINES:
+            self._show_window(self.window_start, keep_view=True)
+        self._update_scrollbar()
+
+    def _read_lines(self, first, end):
+        start = self.index.offsets[first - 1]
+        stop = self.index.line_span(end - 1)[1]
+        data = self.mm[start:stop].decode("utf-8", errors="replace").replace("\r\n", "\n")
+        return data[:-1] if data.endswith("\r") else data
+
+    def _show_window(self, first, keep_view=False):
+        count = self.index.line_count()
+        if count == 0 and self.index.complete:
+            count = 1
+        first = max(1, min(first, count - self.WINDOW_LINES + 1))
+        end = min(first + self.WINDOW_LINES, count + 1)
+        top = self.top_line()
+        self.text.config(state="normal")
+        self.text.delete("1.0", tk.END)
+        if end > first:
+            self.text.insert("1.0", self._read_lines(first, end))
+        self.text.config(state="disabled")
+        self.window_start, self.window_end = first, end
+        if keep_view:
+            self.text.yview(f"{max(top - first, 0) + 1}.0")
+
+    def top_line(self):
+        """File line at the top of the view."""
+        return self.window_start + int(self.text.index("@0,0").split('.')[0]) - 1
+
+    def on_scroll(self, first, last):
+        """yscrollcommand of the text widget while the viewer is active."""
+        local_top = int(self.text.index("@0,0").split('.')[0])
+        local_bottom = int(self.text.index("@0,%d" % self.text.winfo_height()).split('.')[0])
+        shown = self.window_end - self.window_start
+        if ((local_top < self.MARGIN_LINES and self.window_start > 1) or
+                (local_bottom > shown - self.MARGIN_LINES and self.window_end <= self.index.line_count())):
+            top = self.window_start + local_top - 1
+            self._show_window(top - self.WINDOW_LINES // 2 + (local_bottom - local_top) // 2)
+            self.text.yview(f"{top - self.window_start + 1}.0")
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = self.index.estimated_line_count()
+        top = self.top_line() - 1
+        visible = int(self.text.index("@0,%d" % self.text.winfo_height()).split('.')[0]) - \
+            int(self.text.index("@0,0").split('.')[0]) + 1
+        self.scrollbar.set(min(top / total, 1.0), min((top + visible) / total, 1.0))
+
+    def scrollbar_command(self, *args):
+        """Scrollbar command: positions are in file lines, not widget lines."""
+        if args[0] == "moveto":
+            self.goto_line(int(float(args[1]) * self.index.estimated_line_count()) + 1, center=False)
+        else:
+            self.text.yview(*args)
+
+    def goto_line(self, line, column=0, center=True):
+        line = max(1, min(line, max(self.index.line_count(), 1)))
+        if not self.window_start + self.MARGIN_LINES <= line < self.window_end - self.MARGIN_LINES:
+            self._show_window(line - self.WINDOW_LINES // 2)
+        local = f"{line - self.window_start + 1}.{column}"
+        self.text.mark_set(tk.INSERT, local)
+        if center:
+            self.text.see(local)
+        else:
+            self.text.yview(local)
+        self._update_scrollbar()
+        return local
+
+    def current_offset(self):
+        """Byte offset of the insertion cursor in the file."""
+        line, column = map(int, self.text.index(tk.INSERT).split('.'))
+        file_line = self.window_start + line - 1
+        start, end = self.index.line_span(file_line)
+        prefix = self.mm[start:end].decode("utf-8", errors="replace")[:column]
+        return start + len(prefix.encode("utf-8"))
+
+    def search(self, needle, on_result, start=None):
+        """Finds needle (bytes) after the cursor in chunked after() steps.
+
+        on_result receives (line, column, byte offset) or None when not found.
+        """
+        self.cancel_search()
+        position = self.current_offset() + 1 if start is None else start
+        self._search_step(needle, position, on_result)
+
+    def _search_step(self, needle, position, on_result):
+        self._search_job = None
+        stop = min(position + self.SEARCH_CHUNK + len(needle) - 1, self.size)
+        found = self.mm.find(needle, position, stop)
+        if found == -1:
+            if stop >= self.size:
+                on_result(None)
+            else:
+                self.on_status(f"Buscando… {100 * stop // self.size}%")
+                self._search_job = self.text.after(1, self._search_step, needle, stop - len(needle) + 1, on_result)
+            return
+        if found >= self.index.indexed_bytes():
+            # The line index has not reached the match yet; wait for it
+            self._search_job = self.text.after(100, self._search_step, needle, found, on_result)
+            return
+        line = self.index.line_of_offset(found)
+        start = self.index.line_span(line)[0]
+        column = len(self.mm[start:found].decode("utf-8", errors="replace"))
+        on_result((line, column, found))
+
+    def cancel_search(self):
+        if self._search_job is not None:
+            self.text.after_cancel(self._search_job)
+            self._search_job = None
+
+
+def _snapshot_directory(path):
+    """Maps each entry name of a directory to (inode, kind) using scandir's cached data."""
+    snapshot = {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    snapshot[entry.name] = (entry.inode(), 'folder')
+                elif entry.is_file():
+                    snapshot[entry.name] = (entry.inode(), 'file')
+            except OSError:
+                continue
+    return snapshot
+
+
+def _diff_snapshots(old, new):
+    """Returns (added, removed, renamed) between two directory snapshots.
+
+    added and removed are lists of (name, kind); renamed pairs (old name, new name,
+    kind) are entries that kept their inode under a different name.
+    """
+    removed = {name: value for name, value in old.items() if name not in new}
+    added = {name: value for name, value in new.items() if name not in old}
+    by_inode = {value: name for name, value in removed.items()}
+    renamed = []
+    for name, value in list(added.items()):
+        old_name = by_inode.get(value)
+        if old_name is not None and value[0]:
+            renamed.append((old_name, name, value[1]))
+            del added[name]
+            del removed[old_name]
+    return ([(name, kind) for name, (_inode, kind) in added.items()],
+            [(name, kind) for name, (_inode, kind) in removed.items()],
+            renamed)
+
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify, reporting which watched directories changed."""
+
+    IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+    IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_ONLYDIR = 0x400, 0x800, 0x4000, 0x01000000
+    MASK = (IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+            IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+
+    @classmethod
+    def create(cls):
+        """Returns an instance, or None where inotify is not available."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            return cls()
+        except (OSError, AttributeError):
+            return None
+
+    def add(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch", path)
+        return wd
+
+    def remove(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read(self):
+        """Returns the set of watch descriptors with pending events, or None on queue overflow."""
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                changed.add(wd)
+
+
+class DirectoryWatcher:
+    """Keeps directory snapshots up to date and reports per-directory changes.
+
+    Directories are registered with the listing they were displayed from.
+    inotify tells which of them changed; where it is unavailable (or out of
+    watches) their mtime is polled instead. A changed directory is re-listed
+    on the executor and diffed against its snapshot, and on_changes(node,
+    path, added, removed, renamed) is called on the Tk thread.
+    """
+
+    INOTIFY_MS = 250
+    POLL_MS = 1000
+
+    def __init__(self, master, executor, on_changes):
+        self.master = master
+        self.executor = executor
+        self.on_changes = on_changes
+        self.dirs = {} # path -> {"node", "snapshot", "mtime", "wd"}
+        self._wd_paths = {}
+        self._results = queue.Queue()
+        self._scanning = set()
+        self._rescan = set() # Changed again while a scan was running
+        self._polling = False
+        self._last_poll = 0.0
+        self._inotify = _Inotify.create()
+        self._job = self.master.after(self.INOTIFY_MS, self._tick)
+
+    def watch(self, path, node, snapshot):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        wd = None
+        if self._inotify is not None:
+            try:
+                wd = self._inotify.add(path)
+                self._wd_paths[wd] = path
+            except OSError:
+                wd = None # e.g. max_user_watches reached: fall back to polling this one
+        self.dirs[path] = {"node": node, "snapshot": snapshot, "mtime": mtime, "wd": wd}
+
+    def unwatch(self, path):
+        """Stops watching path and everything below it."""
+        prefix = path.rstrip(os.sep) + os.sep
+        for watched in [p for p in self.dirs if p == path or p.startswith(prefix)]:
+            wd = self.dirs.pop(watched)["wd"]
+            if wd is not None:
+                self._wd_paths.pop(wd, None)
+                self._inotify.remove(wd)
+
+    def rename(self, old_path, new_path):
+        """Moves the registrations of a renamed directory (and its subdirectories)."""
+        prefix = old_path.rstrip(os.sep) + os.sep
+        for watched in [p for p in self.dirs if p == old_path or p.startswith(prefix)]:
+            state = self.dirs.pop(watched)
+            moved = new_path + watched[len(old_path):]
+            self.dirs[moved] = state
+            if state["wd"] is not None:
+                self._wd_paths[state["wd"]] = moved
+
+    def unwatch_all(self):
+        for path in list(self.dirs):
+            self.unwatch(path)
+
+    def check_now(self, path):
+        """Re-lists path right away (after a change made by the editor itself)."""
+        if path in self.dirs:
+            self._scan(path)
+
+    def _scan(self, path):
+        if path in self._scanning:
+            self._rescan.add(path)
+            return
+        self._scanning.add(path)
+        self.executor.submit(self._scan_worker, path, self.dirs[path]["snapshot"])
+
+    def _scan_worker(self, path, old_snapshot):
+        # Worker thread: list and diff, results go back through the queue
+        try:
+            new_snapshot = _snapshot_directory(path)
+        except OSError:
+            new_snapshot = None # Gone: the parent's own change removes its node
+        self._results.put((path, old_snapshot, new_snapshot))
+
+    def _poll_worker(self, mtimes):
+        changed = []
+        for path, mtime in mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    changed.append(path)
+            except OSError:
+                changed.append(path)
+        self._results.put(("poll", changed))
+
+    def _tick(self):
+        self._job = None
+        if self._inotify is not None:
+            wds = self._inotify.read()
+            if wds is None: # Events were lost: re-check everything
+                changed = list(self.dirs)
+            else:
+                changed = [self._wd_paths[wd] for wd in wds if wd in self._wd_paths]
+            for path in changed:
+                if path in self.dirs:
+                    self._scan(path)
+
+        now = time.monotonic()
+        if not self._polling and now - self._last_poll >= self.POLL_MS / 1000:
+            mtimes = {path: state["mtime"] for path, state in self.dirs.items() if state["wd"] is None}
+            if mtimes:
+                self._polling = True
+                self._last_poll = now
+                self.executor.submit(self._poll_worker, mtimes)
+
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if result[0] == "poll":
+                self._polling = False
+                for path in result[1]:
+                    if path in self.dirs:
+                        self._scan(path)
+                continue
+            self._apply(*result)
+        self._job = self.master.after(self.INOTIFY_MS, self._tick)
+
+    def _apply(self, path, old_snapshot, new_snapshot):
+        self._scanning.discard(path)
+        state = self.dirs.get(path)
+        if state is not None and new_snapshot is not None and state["snapshot"] is old_snapshot:
+            try:
+                state["mtime"] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+            added, removed, renamed = _diff_snapshots(old_snapshot, new_snapshot)
+            state["snapshot"] = new_snapshot
+            if added or removed or renamed:
+                self.on_changes(state["node"], path, added, removed, renamed)
+        if path in self._rescan:
+            self._rescan.discard(path)
+            if path in self.dirs:
+                self._scan(path)
+
+
+class ExplorerEntry:
+    """What the explorer knows about one path."""
+
+    __slots__ = ("path", "iid", "kind", "parent", "children", "loaded", "dummy", "size", "mtime")
+
+    def __init__(self, path, iid, kind, parent):
+        self.path = path
+        self.iid = iid
+        self.kind = kind # 'file' or 'folder'
+        self.parent = parent # Parent folder path, None for the project root
+        self.children = set() # Paths of the children inserted in the tree
+        self.loaded = False # Whether the folder's listing was requested
+        self.dummy = None # iid of the placeholder child that shows the expand arrow
+        self.size = None # Filled lazily by ExplorerIndex.metadata()
+        self.mtime = None
+
+
+class ExplorerIndex:
+    """Maps absolute paths to explorer Treeview nodes (and back) with cached metadata.
+
+    Kept in sync on every insert, delete and rename, so path lookups never
+    walk the tree or query Tk.
+    """
+
+    def __init__(self):
+        self.entries = {} # path -> ExplorerEntry
+        self.paths = {} # iid -> path
+
+    def clear(self):
+        self.entries.clear()
+        self.paths.clear()
+
+    def add(self, path, iid, kind, parent=None):
+        entry = ExplorerEntry(path, iid, kind, parent)
+        self.entries[path] = entry
+        self.paths[iid] = path
+        if parent in self.entries:
+            self.entries[parent].children.add(path)
+        return entry
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def node(self, path):
+        entry = self.entries.get(path)
+        return entry.iid if entry else None
+
+    def by_node(self, iid):
+        path = self.paths.get(iid)
+        return self.entries.get(path) if path is not None else None
+
+    def remove(self, path):
+        """Forgets path and everything below it."""
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return
+        self.paths.pop(entry.iid, None)
+        if entry.parent in self.entries:
+            self.entries[entry.parent].children.discard(path)
+        for child in list(entry.children):
+            self.remove(child)
+
+    def rename(self, old_path, new_path):
+        """Re-keys a renamed entry and its loaded descendants; returns the moved entries."""
+        moved = []
+        entry = self.entries.pop(old_path, None)
+        if entry is None:
+            return moved
+        parent = self.entries.get(entry.parent)
+        if parent is not None:
+            parent.children.discard(old_path)
+            parent.children.add(new_path)
+        pending = [(entry, new_path)]
+        while pending:
+            entry, path = pending.pop()
+            old_children = entry.children
+            entry.path = path
+            entry.children = set()
+            self.entries[path] = entry
+            self.paths[entry.iid] = path
+            moved.append(entry)
+            for child_path in old_children:
+                child = self.entries.pop(child_path, None)
+                if child is not None:
+                    child_new = os.path.join(path, os.path.basename(child_path))
+                    child.parent = path
+                    entry.children.add(child_new)
+                    pending.append((child, child_new))
+        return moved
+
+    def metadata(self, path):
+        """(kind, size, mtime) for an indexed path, stat-ing it only the first time."""
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        if entry.mtime is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return entry.kind, None, None
+            entry.size, entry.mtime = stat.st_size, stat.st_mtime
+        return entry.kind, entry.size, entry.mtime
+
+    def invalidate(self, path):
+        entry = self.entries.get(path)
+        if entry is not None:
+            entry.size = entry.mtime = None
+
+
+SKIPPED_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv",
+                ".tox", ".mypy_cache", ".pytest_cache"}
+
+
+def _walk_project_files(root):
+    """Yields (path, size, mtime_ns) of the files below root, skipping VCS and tool folders."""
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIPPED_DIRS:
+                                stack.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            yield entry.path, stat.st_size, stat.st_mtime_ns
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def _read_text_file(path, max_bytes):
+    """A file's bytes, or None when it is unreadable, bigger than max_bytes or looks binary."""
+    try:
+        with open(path, "rb") as source:
+            data = source.read(max_bytes + 1)
+    except OSError:
+        return None
+    if len(data) > max_bytes or b"\0" in data[:8192]:
+        return None
+    return data
+
+
+TRIGRAM_FOLD = bytes(range(128)).lower() + b"\x80" * 128 # ASCII case-folded, every other byte -> 0x80
+# Characters that re.IGNORECASE matches with one folded to other bytes: KELVIN SIGN and LONG S match "k"
+# and "s", LATIN CAPITAL LETTER SHARP S matches "ß"... Ignoring case, files containing one are always
+# candidates (they carry TRIGRAM_CASE_MARK) and queries are not narrowed down on them.
+TRIGRAM_CASE_EXOTIC = ("\u0130\u0131\u017f\u1c80\u1c81\u1c82\u1c83\u1c84\u1c85\u1c86\u1c87\u1e9e\u1fbe"
+                       "\u1fd3\u1fe3\u2126\u212a\u212b\u2c62\u2c64\u2c65\u2c66\u2c6d\u2c6e\u2c6f\u2c70"
+                       "\u2c7e\u2c7f\ua78d\ua7aa\ua7ab\ua7ac\ua7ad\ua7ae\ua7b0\ua7b1\ua7b2\ua7c5")
+_TRIGRAM_CASE_EXOTIC = re.compile("[" + TRIGRAM_CASE_EXOTIC + "]")
+_TRIGRAM_CASE_EXOTIC_BYTES = re.compile(b"|".join(char.encode("utf-8") for char in TRIGRAM_CASE_EXOTIC))
+TRIGRAM_CASE_MARK = 0x800080 # Never a trigram of text: a zero byte between two others
+
+
+def _trigrams(data):
+    """Distinct trigrams of folded bytes, packed little-endian into ints.
+
+    Words are read at every offset through arrays so that only the distinct
+    values are handled in Python. The padding adds trigrams containing a
+    zero byte, which never occur in text files.
+    """
+    data = data.translate(TRIGRAM_FOLD) + b"\0\0\0"
+    words = set()
+    for offset in range(4):
+        chunk = array("I", data[offset:offset + (len(data) - offset) // 4 * 4])
+        if sys.byteorder == "big":
+            chunk.byteswap()
+        words.update(chunk)
+    return set(map((0xFFFFFF).__and__, words))
+
+
+def _spawn_pool(workers):
+    """A process pool whose workers are spawned: forking a process that runs Tk and worker threads is not safe."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _call_batch(function, calls):
+    """Process pool worker: function(*args) for every args tuple of calls."""
+    return [function(*args) for args in calls]
+
+
+def _pool_batches(pool, function, calls, batch=32, ahead=8):
+    """Runs function(*args) for every args tuple of calls in pool, yielding the results in order.
+
+    Like pool.map with a chunksize, except that only ahead batches are queued
+    at a time: closing the generator (e.g. when an index is closed) cancels
+    them and leaves no backlog that the pool, or interpreter exit, would wait for.
+    """
+    batches = (calls[start:start + batch] for start in range(0, len(calls), batch))
+    pending = collections.deque(pool.submit(_call_batch, function, chunk)
+                                for chunk in itertools.islice(batches, ahead))
+    try:
+        while pending:
+            results = pending.popleft().result()
+            pending.extend(pool.submit(_call_batch, function, chunk) for chunk in itertools.islice(batches, 1))
+            yield from results
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _file_trigrams(path, max_bytes):
+    """Process pool worker: (path, trigram array), or (path, None) for files that are not indexed."""
+    data = _read_text_file(path, max_bytes)
+    if data is None:
+        return path, None
+    trigrams = _trigrams(data)
+    if _TRIGRAM_CASE_EXOTIC_BYTES.search(data):
+        trigrams.add(TRIGRAM_CASE_MARK)
+    return path, array("I", trigrams)
+
+
+def _search_files(paths, pattern, flags, max_bytes, max_hits):
+    """Process pool worker: [(path, [(line, column, length, text), ...])] for the files matching pattern."""
+    regex = re.compile(pattern, flags)
+    results = []
+    for path in paths:
+        data = _read_text_file(path, max_bytes)
+        if data is None:
+            continue
+        text = data.decode("utf-8", errors="replace")
+        hits = []
+        line, counted = 1, 0
+        for match in regex.finditer(text):
+            start = match.start()
+            line += text.count("\n", counted, start)
+            counted = start
+            line_start = text.rfind("\n", 0, start) + 1
+            line_end = text.find("\n", start)
+            if line_end == -1:
+                line_end = len(text)
+            preview = text[line_start:min(line_end, line_start + 200)].rstrip("\r")
+            hits.append((line, start - line_start, match.end() - start, preview))
+            if len(hits) >= max_hits:
+                break
+        if hits:
+            results.append((path, hits))
+    return results
+
+
+def _skip_regex_group(pattern, i):
+    """Index just past the class or group opening at pattern[i]."""
+    depth = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            i += 1
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        i += 1
+        if depth <= 0:
+            return i
+    return i
+
+
+def _required_literals(pattern, is_regex):
+    """Substrings that every match of the query must contain (empty when none are known).
+
+    Regexes are scanned conservatively: alternations, classes, groups and
+    optional characters end a literal run instead of being analysed.
+    """
+    if not is_regex:
+        return [pattern]
+    if re.compile(pattern).flags & re.VERBOSE:
+        return []
+    literals, current = [], []
+
+    def flush():
+        if len(current) >= 3:
+            literals.append("".join(current))
+        current.clear()
+
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            escaped = pattern[i + 1:i + 2]
+            if escaped and not escaped.isalnum():
+                current.append(escaped)
+            else:
+                flush() # \d, \w, \b, backreferences...
+            i += 2
+        elif char in "[(":
+            flush()
+            i = _skip_regex_group(pattern, i)
+        elif char == "|":
+            return [] # Either side may match alone
+        elif char in "*?{":
+            if current:
+                current.pop() # The quantified character may be absent
+            flush()
+            if char == "{":
+                close = pattern.find("}", i)
+                i = len(pattern) if close == -1 else close
+            i += 1
+        elif char in "+.^$)":
+            flush()
+            i += 1
+        else:
+            current.append(char)
+            i += 1
+    flush()
+    return literals
+
+
+class TrigramIndex:
+    """Trigram index of a project's text files, saved between sessions.
+
+    Each indexed file gets an id and postings map every trigram to the ids of
+    the files containing it. A changed or deleted file's old id is only
+    dropped from the live set; the postings are compacted once too many ids
+    are dead. update() re-stats the project and re-reads only the files whose
+    size or mtime changed since they were indexed, so it is cheap enough to
+    run before every search.
+    """
+
+    VERSION = 2
+    MAX_FILE_BYTES = 2 * 1024 * 1024 # Larger files are neither indexed nor searched
+    COMPACT_RATIO = 0.3 # Dead ids per live id that trigger a compaction
+
+    def __init__(self, root):
+        self.root = root
+        self.files = {} # path -> (size, mtime_ns, file id or None when not indexable)
+        self.paths = {} # live file id -> path
+        self.postings = {} # trigram -> array("I") of file ids
+        self.dead = 0
+        self.next_id = 0
+        self.complete = False
+        self.closed = False
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock() # One update() at a time
+        self.cache_path = _cache_file("search-index", root)
+
+    def load(self):
+        state = _load_cached_state(self.cache_path, self.VERSION, self.root)
+        if state is None:
+            return False
+        with self.lock:
+            self.files = state["files"]
+            self.postings = state["postings"]
+            self.next_id = state["next_id"]
+            self.paths = {entry[2]: path for path, entry in self.files.items() if entry[2] is not None}
+            self.dead = state["dead"]
+        return True
+
+    def save(self):
+        with self.lock:
+            state = {"version": self.VERSION, "root": self.root, "files": dict(self.files),
+                     "postings": self.postings, "next_id": self.next_id, "dead": self.dead}
+            data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        _write_cache(self.cache_path, data)
+
+    def update(self, pool, on_progress=None):
+        """Brings the index up to date with the files on disk (call from a worker thread)."""
+        with self.update_lock:
+            self._update(pool, on_progress)
+
+    def _update(self, pool, on_progress):
+        seen = {path: (size, mtime) for path, size, mtime in _walk_project_files(self.root)}
+        with self.lock:
+            stale = [path for path, entry in self.files.items() if seen.get(path) != entry[:2]]
+            for path in stale:
+                self._drop(path)
+        changed = [path for path in seen if path not in self.files]
+        results = _pool_batches(pool, _file_trigrams, [(path, self.MAX_FILE_BYTES) for path in changed])
+        for done, (path, trigrams) in enumerate(results, 1):
+            if self.closed:
+                results.close() # Cancels the batches not read yet
+                return
+            with self.lock:
+                self._add(path, seen[path], trigrams)
+            if on_progress is not None and done % 500 == 0:
+                on_progress(done, len(changed))
+        with self.lock:
+            if self.dead > self.COMPACT_RATIO * max(len(self.paths), 1):
+                self._compact()
+            self.complete = True
+        if stale or changed:
+            self.save()
+
+    def close(self):
+        self.closed = True
+
+    def update_file(self, path):
+        """Re-indexes one file (e.g. after the editor saved it)."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        trigrams = _file_trigrams(path, self.MAX_FILE_BYTES)[1]
+        with self.update_lock, self.lock:
+            if path in self.files:
+                self._drop(path)
+            self._add(path, (stat.st_size, stat.st_mtime_ns), trigrams)
+
+    def _add(self, path, stat, trigrams):
+        if trigrams is None:
+            self.files[path] = stat + (None,)
+            return
+        file_id = self.next_id
+        self.next_id += 1
+        self.files[path] = stat + (file_id,)
+        self.paths[file_id] = path
+        postings = self.postings
+        for trigram in trigrams:
+            ids = postings.get(trigram)
+            if ids is None:
+                postings[trigram] = array("I", (file_id,))
+            else:
+                ids.append(file_id)
+
+    def _drop(self, path):
+        file_id = self.files.pop(path)[2]
+        if file_id is not None:
+            del self.paths[file_id]
+            self.dead += 1
+
+    def _compact(self):
+        live = self.paths
+        for trigram, ids in list(self.postings.items()):
+            kept = array("I", [file_id for file_id in ids if file_id in live])
+            if kept:
+                self.postings[trigram] = kept
+            else:
+                del self.postings[trigram]
+        self.dead = 0
+
+    def searchable_files(self):
+        with self.lock:
+            return list(self.paths.values())
+
+    def candidates(self, literals, ignore_case=False):
+        """Indexed files that may contain every literal, or None when the index cannot narrow it down."""
+        if ignore_case:
+            literals = [piece for literal in literals for piece in _TRIGRAM_CASE_EXOTIC.split(literal)]
+        trigrams = set()
+        for literal in literals:
+            trigrams.update(trigram for trigram in _trigrams(literal.encode("utf-8"))
+                            if trigram & 0xFF and trigram & 0xFF00 and trigram & 0xFF0000)
+        if not trigrams:
+            return None
+        with self.lock:
+            postings = sorted((self.postings.get(trigram, ()) for trigram in trigrams), key=len)
+            ids = set(postings[0])
+            for other in postings[1:]:
+                if not ids:
+                    break
+                ids.intersection_update(other)
+            if ignore_case:
+                ids.update(self.postings.get(TRIGRAM_CASE_MARK, ()))
+            return [self.paths[file_id] for file_id in ids if file_id in self.paths]
+
+
+SYMBOL_LANGUAGES = {".py": "python", ".pyw": "python", ".js": "javascript", ".mjs": "javascript",
+                    ".jsx": "javascript", ".css": "css"}
+
+# Lightweight indexers for languages without a parser at hand: (pattern, kind), the name in group 1
+SYMBOL_PATTERNS = {
+    "python": [ # Fallback for source that does not parse (e.g. while typing)
+        (re.compile(r"^[ \t]*class\s+(\w+)", re.M), "clase"),
+        (re.compile(r"^[ \t]*(?:async\s+)?def\s+(\w+)", re.M), "función"),
+    ],
+    "javascript": [
+        (re.compile(r"^[ \t]*(?:export\s+)?(?:default\s+)?class\s+([A-Za-z_$][\w$]*)", re.M), "clase"),
+        (re.compile(r"^[ \t]*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)", re.M),
+         "función"),
+        (re.compile(r"^[ \t]*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?"
+                    r"(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)", re.M), "función"),
+        (re.compile(r"^[ \t]+(?:static\s+)?(?:async\s+)?(?!(?:if|for|while|switch|catch|function|return)\b)"
+                    r"([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*\{", re.M), "método"),
+    ],
+    "css": [
+        (re.compile(r"^[ \t]*(@[\w-]+[^{};]*?)\s*\{", re.M), "regla @"),
+        (re.compile(r"^[ \t]*([^\s@{}/][^{};]*?)\s*\{", re.M), "selector"),
+    ],
+}
+
+
+def _regex_symbols(source, patterns):
+    found = sorted((match.start(1), match.group(1), kind) for pattern, kind in patterns
+                   for match in pattern.finditer(source))
+    symbols = []
+    line, position = 1, 0
+    for start, name, kind in found:
+        line += source.count("\n", position, start)
+        position = start
+        symbols.append((name, kind, line, start - source.rfind("\n", 0, start) - 1, ""))
+    return symbols
+
+
+def _python_symbols(source):
+    """Classes, functions and module or class level names, from the AST (or regexes if it does not parse)."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return _regex_symbols(source, SYMBOL_PATTERNS["python"])
+    lines = source.split("\n")
+    symbols = []
+
+    def column(node):
+        # col_offset counts UTF-8 bytes; Tk counts characters
+        text = lines[node.lineno - 1]
+        return node.col_offset if text.isascii() else len(text.encode("utf-8")[:node.col_offset].decode("utf-8", "replace"))
+
+    def visit(nodes, container, scope):
+        for node in nodes:
+            if isinstance(node, ast.ClassDef):
+                symbols.append((node.name, "clase", node.lineno, column(node), container))
+                visit(node.body, f"{container}.{node.name}" if container else node.name, "class")
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = "método" if scope == "class" else "función"
+                symbols.append((node.name, kind, node.lineno, column(node), container))
+                visit(node.body, f"{container}.{node.name}" if container else node.name, "function")
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                if scope == "function":
+                    continue # Locals are not worth listing
+                for target in (node.targets if isinstance(node, ast.Assign) else [node.target]):
+                    if isinstance(target, ast.Name):
+                        symbols.append((target.id, "variable", target.lineno, column(target), container))
+            elif isinstance(node, (ast.stmt, ast.excepthandler)):
+                # if/try/with/for blocks: their definitions belong to the enclosing scope
+                for field in ("body", "orelse", "handlers", "finalbody"):
+                    visit(getattr(node, field, ()), container, scope)
+
+    visit(tree.body, "", "module")
+    return symbols
+
+
+def _source_symbols(source, language):
+    """(name, kind, line, column, container) of every symbol in source, in file order."""
+    if language == "python":
+        return _python_symbols(source)
+    return _regex_symbols(source, SYMBOL_PATTERNS[language])
+
+
+def _file_symbols(path, known_digest, max_bytes):
+    """(path, content hash, symbols) of a file; symbols is None when its hash is still known_digest."""
+    data = _read_text_file(path, max_bytes)
+    if data is None:
+        return path, None, []
+    digest = hashlib.sha1(data).hexdigest()
+    if digest == known_digest:
+        return path, digest, None
+    language = SYMBOL_LANGUAGES[os.path.splitext(path)[1].lower()]
+    return path, digest, _source_symbols(data.decode("utf-8", errors="replace"), language)
+
+
+class SymbolIndex:
+    """Symbols of a project's Python, JavaScript and CSS files, saved between sessions.
+
+    Entries are keyed by size and mtime. A file whose stat changed is hashed
+    again in a worker process, and only parsed again when its content hash
+    changed too. version is bumped on every change, so views built from the
+    index know when to rebuild. update() only stats the tree when nothing
+    changed, so it is run again whenever the project's symbols are asked for.
+    """
+
+    VERSION = 1
+    MAX_FILE_BYTES = 1024 * 1024
+
+    def __init__(self, root):
+        self.root = root
+        self.files = {} # path -> (size, mtime_ns, content hash, symbols)
+        self.version = 0
+        self.complete = False
+        self.closed = False
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock() # One update() at a time
+        self.cache_path = _cache_file("symbols", root)
+
+    def load(self):
+        state = _load_cached_state(self.cache_path, self.VERSION, self.root)
+        if state is None:
+            return False
+        with self.lock:
+            self.files = state["files"]
+            self.version += 1
+        return True
+
+    def save(self):
+        with self.lock:
+            data = pickle.dumps({"version": self.VERSION, "root": self.root, "files": dict(self.files)},
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        _write_cache(self.cache_path, data)
+
+    def update(self, pool, on_progress=None):
+        """Brings the index up to date with the files on disk (call from a worker thread)."""
+        with self.update_lock:
+            self._update(pool, on_progress)
+
+    def _update(self, pool, on_progress):
+        seen = {path: (size, mtime) for path, size, mtime in _walk_project_files(self.root)
+                if os.path.splitext(path)[1].lower() in SYMBOL_LANGUAGES}
+        with self.lock:
+            removed = [path for path in self.files if path not in seen]
+            for path in removed:
+                del self.files[path]
+            stale = [path for path, stat in seen.items() if path not in self.files or self.files[path][:2] != stat]
+            known = [self.files[path][2] if path in self.files else None for path in stale]
+            self.version += bool(removed)
+        results = _pool_batches(pool, _file_symbols, [(path, digest, self.MAX_FILE_BYTES)
+                                                      for path, digest in zip(stale, known)], batch=16)
+        for done, (path, digest, symbols) in enumerate(results, 1):
+            if self.closed:
+                results.close() # Cancels the batches not parsed yet
+                return
+            with self.lock:
+                if symbols is None: # Touched but not changed
+                    symbols = self.files[path][3]
+                self.files[path] = seen[path] + (digest, symbols)
+                self.version += 1
+            if on_progress is not None and done % 200 == 0:
+                on_progress(done, len(stale))
+        self.complete = True
+        if removed or stale:
+            self.save()
+
+    def update_file(self, path):
+        """Re-indexes one file (e.g. after the editor saved it)."""
+        if os.path.splitext(path)[1].lower() not in SYMBOL_LANGUAGES:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        path, digest, symbols = _file_symbols(path, None, self.MAX_FILE_BYTES)
+        with self.update_lock, self.lock:
+            self.files[path] = (stat.st_size, stat.st_mtime_ns, digest, symbols)
+            self.version += 1
+
+    def close(self):
+        self.closed = True
+
+    def symbols(self):
+        """{path: symbols} of every indexed file."""
+        with self.lock:
+            return {path: entry[3] for path, entry in self.files.items()}
+
+
+def _gitignore_rules(directory, relative):
+    """Compiled rules of directory/.gitignore as (regex, negated, dir_only) tuples.
+
+    The regexes match '/'-separated paths relative to the project root;
+    relative is the directory's own path from the root ('' for the root).
+    """
+    try:
+        with open(os.path.join(directory, ".gitignore"), encoding="utf-8", errors="replace") as source:
+            lines = source.read().splitlines()
+    except OSError:
+        return []
+    base = re.escape(relative + "/") if relative else ""
+    rules = []
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated or line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            continue
+        parts, i = [], 0
+        while i < len(line):
+            if line.startswith("**/", i):
+                parts.append("(?:.*/)?")
+                i += 3
+            elif line.startswith("**", i):
+                parts.append(".*")
+                i += 2
+            elif line[i] == "*":
+                parts.append("[^/]*")
+                i += 1
+            elif line[i] == "?":
+                parts.append("[^/]")
+                i += 1
+            elif line[i] == "[" and "]" in line[i + 2:]:
+                end = line.index("]", i + 2)
+                content = line[i + 1:end]
+                if content.startswith("!"):
+                    content = "^" + content[1:]
+                parts.append("[" + content.replace("\\", "\\\\") + "]")
+                i = end + 1
+            else:
+                parts.append(re.escape(line[i]))
+                i += 1
+        prefix = base if anchored else base + "(?:.*/)?"
+        rules.append((re.compile(prefix + "".join(parts) + r"\Z"), negated, dir_only))
+    return rules
+
+
+def _is_ignored(rules, relative, is_dir):
+    ignored = False
+    for regex, negated, dir_only in rules: # The last matching rule wins
+        if (is_dir or not dir_only) and regex.match(relative):
+            ignored = not negated
+    return ignored
+
+
+class ProjectFileList:
+    """Paths of a project's files relative to its root, honouring .gitignore.
+
+    The list is crawled in a background thread and saved in the TkCode cache,
+    so the previous session's list is available right away while a fresh
+    crawl runs. Paths are interned strings with '/' separators.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.paths = []
+        self.complete = False
+        self.crawled_at = 0.0
+        self.crawling = False
+        self.cache_path = _cache_file("file-list", root, ".txt")
+        data = _read_cache(self.cache_path)
+        if data is not None:
+            lines = data.decode("utf-8", "surrogateescape").split("\n")
+            self.paths = list(map(sys.intern, lines[1:])) # The first line is the root
+
+    def refresh(self):
+        """Starts a crawl unless one is running; self.paths is replaced when it finishes."""
+        if self.crawling:
+            return
+        self.crawling = True
+        threading.Thread(target=self._crawl, daemon=True).start()
+
+    def _crawl(self):
+        paths = []
+        stack = [(self.root, "", _gitignore_rules(self.root, ""))]
+        while stack:
+            directory, relative, rules = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = list(entries)
+            except OSError:
+                continue
+            for entry in entries:
+                child = relative + "/" + entry.name if relative else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir:
+                        if entry.name in SKIPPED_DIRS or _is_ignored(rules, child, True):
+                            continue
+                        stack.append((entry.path, child, rules + _gitignore_rules(entry.path, child)))
+                    elif entry.is_file() and not _is_ignored(rules, child, False):
+                        paths.append(sys.intern(child))
+                except OSError:
+                    continue
+        paths.sort()
+        self.paths = paths
+        self.complete = True
+        self.crawled_at = time.monotonic()
+        self.crawling = False
+        _write_cache(self.cache_path, "\n".join([self.root] + paths).encode("utf-8", "surrogateescape"))
+
+
+def _fuzzy_score(query, text):
+    """Higher is better: rewards contiguous matches, word starts and matches in the last path segment."""
+    name_start = text.rfind("/") + 1
+    found = text.find(query, name_start)
+    if found != -1:
+        return 1000 - found + name_start - len(text) + (100 if found == name_start else 0)
+    found = text.find(query)
+    if found != -1:
+        return 500 - len(text)
+    # Greedy subsequence, scanning the file name first when the query fits in it
+    score, position, previous = 0, 0, -2
+    for char in query:
+        position = text.find(char, position)
+        if position == -1:
+            return -len(text) # Matched by the filter through case folding only
+        if position == previous + 1:
+            score += 5
+        if position == 0 or text[position - 1] in "/_-. ":
+            score += 8
+        if position >= name_start:
+            score += 3
+        previous = position
+        position += 1
+    return score - len(text)
+
+
+class FuzzyMatcher:
+    """Filters and ranks a list of strings against fuzzy (subsequence) queries.
+
+    Items are kept sorted by length with a lowercased twin list. Filtering
+    runs one compiled regex per query over item indices, driven from C by
+    compress(); the indices matching recent queries are memoized, so typing
+    one more character only re-filters the previous query's matches. As the
+    matches stay sorted by length, only the first RANK_LIMIT are scored in
+    Python, plus up to RANK_LIMIT longer ones whose file name contains the
+    query (shortest names first), so a deep path to the file being looked
+    for is not cut off. Queries without capitals are case-insensitive.
+    """
+
+    CHUNK = 10000 # Items filtered between yields
+    RANK_LIMIT = 1000
+    MEMO_SIZE = 64
+
+    def __init__(self, items=()):
+        self.set_items(items)
+
+    def set_items(self, items):
+        self.items = sorted(items, key=len)
+        self.lowered = [item.lower() for item in self.items]
+        self._names = None # File name index, built for the first query with more than RANK_LIMIT matches
+        self._memo = collections.OrderedDict()
+
+    def match(self, query, limit=50):
+        """Generator returning the best limit items for query, yielding between filtered chunks."""
+        query = query.replace(" ", "")
+        if not query:
+            return self.items[:limit]
+        folded = query == query.lower()
+        texts = self.lowered if folded else self.items
+        memo = self._memo
+        if query in memo:
+            memo.move_to_end(query)
+            matches = memo[query]
+        else:
+            pool = range(len(texts))
+            for end in range(len(query) - 1, 0, -1): # Longest memoized prefix
+                if query[:end] in memo:
+                    pool = memo[query[:end]]
+                    break
+            # a[^b]*b[^c]*c: each gap stops at the first candidate, so there is no backtracking
+            search = re.compile(re.escape(query[0]) + "".join(
+                f"[^{re.escape(char)}]*{re.escape(char)}" for char in query[1:])).search
+            matches = []
+            for start in range(0, len(pool), self.CHUNK):
+                chunk = pool[start:start + self.CHUNK]
+                matches.extend(itertools.compress(chunk, map(search, map(texts.__getitem__, chunk))))
+                yield
+            memo[query] = matches
+            if len(memo) > self.MEMO_SIZE:
+                memo.popitem(last=False)
+        ranked = matches[:self.RANK_LIMIT]
+        if len(matches) > self.RANK_LIMIT:
+            if self._names is None:
+                yield from self._index_names()
+            shorter = set(ranked)
+            ranked += [i for i in self._name_hits(query, folded) if i not in shorter]
+        best = heapq.nlargest(limit, ranked, key=lambda i: _fuzzy_score(query, texts[i]))
+        return [self.items[i] for i in best]
+
+
+    def _index_names(self):
+        """Generator joining the file names, shortest first, into one string per case, so that
+        finding those that contain a query is a few str.find calls."""
+        names = []
+        for start in range(0, len(self.items), self.CHUNK):
+            names.extend(item.rpartition("/")[2] for item in self.items[start:start + self.CHUNK])
+            yield
+        self._name_order = sorted(range(len(names)), key=list(map(len, names)).__getitem__)
+        names = list(map(names.__getitem__, self._name_order))
+        self._name_starts = list(itertools.accumulate(map((1).__add__, map(len, names)), initial=0))
+        self._names = "\n".join(names)
+        self._lowered_names = self._names.lower()
+
+    def _name_hits(self, query, folded):
+        """Up to RANK_LIMIT items whose file name contains query, shortest names first.
+
+        They all match query, as it is in their path.
+        """
+        names = self._lowered_names if folded else self._names
+        starts = self._name_starts
+        hits = []
+        found = names.find(query)
+        while found != -1 and len(hits) < self.RANK_LIMIT:
+            name = bisect.bisect_right(starts, found) - 1
+            hits.append(self._name_order[name])
+            found = names.find(query, starts[name + 1]) # The next name that contains it
+        return hits
+
+
+class Palette:
+    """A reusable popup with a query entry over a ranked list (quick open, go to...).
+
+    search(query) returns the list of (label, value) pairs to show, or a
+    generator that yields while working and returns that list; on_choose(value)
+    is called for the selected one. Typing only calls on_query_changed; the
+    owner runs refresh(), which returns a generator job, when it sees fit.
+    """
+
+    ROWS = 15
+
+    def __init__(self, master, on_query_changed):
+        self.master = master
+        self.on_query_changed = on_query_changed
+        self.search = None
+        self.on_choose = None
+        self.values = []
+        self.window = tk.Toplevel(master, bg='#21252b')
+        self.window.withdraw()
+        self.window.overrideredirect(True)
+        self.window.transient(master)
+        self.entry = tk.Entry(self.window, bg='#282c34', fg='#abb2bf', insertbackground='white',
+                              relief=tk.FLAT, font=("Consolas", 11))
+        self.entry.pack(fill=tk.X, padx=4, pady=4)
+        self.status = tk.Label(self.window, text="", bg='#21252b', fg='#6a737d', anchor=tk.W, font=("Segoe UI", 8))
+        self.status.pack(fill=tk.X, padx=4)
+        self.listbox = tk.Listbox(self.window, height=self.ROWS, bg='#21252b', fg='#abb2bf', bd=0,
+                                  highlightthickness=0, selectbackground='#007acc', selectforeground='white',
+                                  activestyle='none', font=("Consolas", 10))
+        self.listbox.pack(fill=tk.BOTH, expand=True, padx=4, pady=(0, 4))
+        self.entry.bind("<KeyRelease>", self._on_key)
+        self.entry.bind("<Return>", self.choose)
+        self.entry.bind("<Escape>", lambda event: self.hide())
+        self.entry.bind("<Down>", lambda event: self._move(1))
+        self.entry.bind("<Up>", lambda event: self._move(-1))
+        self.entry.bind("<FocusOut>", lambda event: self.hide())
+        self.listbox.bind("<ButtonRelease-1>", self.choose)
+
+    def show(self, search, on_choose, placeholder=""):
+        self.search = search
+        self.on_choose = on_choose
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, placeholder)
+        width = max(self.master.winfo_width() // 2, 400)
+        x = self.master.winfo_rootx() + (self.master.winfo_width() - width) // 2
+        self.window.geometry(f"{width}x{self.ROWS * 18 + 60}+{x}+{self.master.winfo_rooty() + 40}")
+        self.window.deiconify()
+        self.window.lift()
+        self.entry.focus_force()
+        self.on_query_changed()
+
+    def hide(self):
+        self.window.withdraw()
+        self.search = None
+
+    def visible(self):
+        return self.search is not None
+
+    def set_status(self, text):
+        self.status.config(text=text)
+
+    def _on_key(self, event):
+        if event.keysym not in ("Up", "Down", "Return", "Escape"):
+            self.on_query_changed()
+
+    def refresh(self):
+        if self.search is None:
+            return None
+        return self._refresh(self.search, self.entry.get())
+
+    def _refresh(self, search, query):
+        items = search(query)
+        if hasattr(items, "__next__"):
+            items = yield from items
+        if self.search is not search:
+            return # Hidden or reused while the search was running
+        self.values = [value for _label, value in items]
+        self.listbox.delete(0, tk.END)
+        if items:
+            self.listbox.insert(0, *[label for label, _value in items]) # One Tcl call for all rows
+            self.listbox.selection_set(0)
+
+    def _move(self, delta):
+        if not self.values:
+            return "break"
+        current = self.listbox.curselection()
+        index = max(0, min((current[0] if current else 0) + delta, len(self.values) - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return "break"
+
+    def choose(self, event=None):
+        current = self.listbox.curselection()
+        if current and current[0] < len(self.values):
+            on_choose, value = self.on_choose, self.values[current[0]]
+            self.hide()
+            on_choose(value)
+        return "break"
+
+
+class CompletionPopup:
+    """The list of completions shown under the identifier being typed.
+
+    It never takes the focus: the editor forwards the keys it needs (Up,
+    Down, Tab, Return, Escape) from the text widget while it is visible.
+    """
+
+    ROWS = 8
+
+    def __init__(self, master, on_choose):
+        self.items = []
+        self.window = tk.Toplevel(master, bg='#21252b')
+        self.window.withdraw()
+        self.window.overrideredirect(True)
+        self.window.transient(master)
+        self.listbox = tk.Listbox(self.window, height=self.ROWS, bg='#21252b', fg='#abb2bf', bd=1,
+                                  highlightthickness=0, selectbackground='#007acc', selectforeground='white',
+                                  activestyle='none', font=("Consolas", 11))
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        self.listbox.bind("<Button-1>", lambda event: self._click(event, on_choose))
+
+    def _click(self, event, on_choose):
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(self.listbox.nearest(event.y))
+        on_choose()
+        return "break" # The Listbox class binding would take the focus from the text
+
+    def show(self, x, y, items):
+        self.items = items
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(0, *items) # One Tcl call for all rows
+        self.listbox.config(height=min(len(items), self.ROWS), width=max(map(len, items)) + 2)
+        self.listbox.selection_set(0)
+        self.window.geometry(f"+{x}+{y}")
+        self.window.deiconify()
+        self.window.lift()
+
+    def hide(self):
+        if self.items:
+            self.items = []
+            self.window.withdraw()
+
+    def visible(self):
+        return bool(self.items)
+
+    def move(self, delta):
+        current = self.listbox.curselection()
+        index = max(0, min((current[0] if current else 0) + delta, len(self.items) - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+
+    def selected(self):
+        current = self.listbox.curselection()
+        return self.items[current[0]] if current and current[0] < len(self.items) else None
+
+
+class ShellProcess:
+    """A shell command run in the background, its stdout and stderr read by worker threads.
+
+    Output waits in pending as (text, tag) chunks until the UI takes it with
+    drain(). When the UI falls behind, the oldest pending chunks are dropped
+    so at most MAX_PENDING characters are held, however much is printed.
+    listener(text, tag), when given, still sees every chunk (from the
+    reader threads).
+    """
+
+    MAX_PENDING = 256 * 1024 # Characters
+
+    def __init__(self, command, cwd, listener=None):
+        if os.name == "nt":
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {"start_new_session": True} # Its own process group, so Ctrl+C reaches the children too
+        self.process = subprocess.Popen(command, shell=True, cwd=cwd, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, **group)
+        self.listener = listener
+        self.pending = collections.deque()
+        self.pending_chars = 0
+        self.dropped = 0 # Characters dropped since the last drain()
+        self.interrupted = False
+        self.lock = threading.Lock()
+        self.readers = [threading.Thread(target=self._read, args=(stream, tag), daemon=True)
+                        for stream, tag in ((self.process.stdout, None), (self.process.stderr, "error"))]
+        for reader in self.readers:
+            reader.start()
+
+    def _read(self, stream, tag):
+        # Worker thread: read1 returns whatever is available, so output shows up before the pipe buffer fills
+        decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace")
+        try:
+            while True:
+                data = stream.read1(65536)
+                if not data:
+                    break
+                self._push(decoder.decode(data), tag)
+        except (OSError, ValueError):
+            pass
+        self._push(decoder.decode(b"", final=True), tag)
+        stream.close()
+
+    def _push(self, text, tag):
+        if not text:
+            return
+        text = text.replace("\r\n", "\n")
+        if self.listener is not None:
+            self.listener(text, tag)
+        with self.lock:
+            self.pending.append((text, tag))
+            self.pending_chars += len(text)
+            while self.pending_chars > self.MAX_PENDING and len(self.pending) > 1:
+                dropped = len(self.pending.popleft()[0])
+                self.pending_chars -= dropped
+                self.dropped += dropped
+
+    def drain(self):
+        """Returns (chunks, dropped characters) printed since the last call."""
+        with self.lock:
+            chunks, dropped = list(self.pending), self.dropped
+            self.pending.clear()
+            self.pending_chars = self.dropped = 0
+        return chunks, dropped
+
+    def write(self, line):
+        """Sends a line to the command's standard input."""
+        try:
+            self.process.stdin.write((line + "\n").encode(locale.getpreferredencoding(False), errors="replace"))
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            pass # The command closed its input or already exited
+
+    def interrupt(self):
+        """The first call sends Ctrl+C to the command; later calls kill it."""
+        if self.process.poll() is not None:
+            return
+        try:
+            if self.interrupted:
+                if os.name == "nt":
+                    self.process.kill()
+                else:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+            elif os.name == "nt":
+                self.process.send_signal(signal.CTRL_BREAK_EVENT)
+            else:
+                os.killpg(self.process.pid, signal.SIGINT)
+        except OSError:
+            pass # Exited in the meantime
+        self.interrupted = True
+
+    def finished(self):
+        return self.process.poll() is not None and not any(reader.is_alive() for reader in self.readers)
+
+
+class OutputSink:
+    """Buffered appends to a read-only Text log (terminal, output panel...).
+
+    write() only queues the text; everything queued within a frame is added
+    by one insert, with the widget unlocked once. Only the last max_lines
+    lines are kept, and the view follows new output only while it is
+    already scrolled to the bottom.
+    """
+
+    FLUSH_MS = 16
+
+    def __init__(self, widget, max_lines=5000):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.pending = [] # Alternating text and tags, ready for Text.insert
+        self.pending_lines = 0
+        self._flush_job = None
+        self._stamp_second = None
+        self._stamp = ""
+
+    def timestamp(self):
+        """"[HH:MM:SS] ", formatted once per second."""
+        second = int(time.time())
+        if second != self._stamp_second:
+            self._stamp_second = second
+            self._stamp = time.strftime("[%H:%M:%S] ", time.localtime(second))
+        return self._stamp
+
+    def write(self, text, tag=None, stamp=False):
+        """Queues text (include the newlines); stamp prefixes it with the time."""
+        if stamp:
+            text = self.timestamp() + text
+        self.pending += [text, tag or ()]
+        self.pending_lines += text.count("\n")
+        if self.pending_lines > 2 * self.max_lines:
+            self._drop_pending()
+        if self._flush_job is None:
+            self._flush_job = self.widget.after(self.FLUSH_MS, self.flush)
+
+    def _drop_pending(self):
+        # Whole chunks that would be trimmed right after the insert anyway
+        lines, keep = 0, len(self.pending)
+        while keep > 0 and lines < self.max_lines:
+            keep -= 2
+            lines += self.pending[keep].count("\n")
+        del self.pending[:keep]
+        self.pending_lines = lines
+
+    def flush(self):
+        if self._flush_job is not None:
+            self.widget.after_cancel(self._flush_job)
+            self._flush_job = None
+        if not self.pending:
+            return
+        widget = self.widget
+        at_bottom = widget.yview()[1] >= 1.0
+        widget.config(state='normal')
+        widget.insert(tk.END, *self.pending) # One Tcl call for every queued chunk
+        excess = int(widget.index("end-1c").split(".")[0]) - self.max_lines
+        if excess > 0:
+            widget.delete("1.0", f"{excess + 1}.0")
+        widget.config(state='disabled')
+        if at_bottom:
+            widget.see(tk.END)
+        self.pending = []
+        self.pending_lines = 0
+
+    def clear(self):
+        self.pending = []
+        self.pending_lines = 0
+        self.widget.config(state='normal')
+        self.widget.delete("1.0", tk.END)
+        self.widget.config(state='disabled')
+
+
+class Problem:
+    """A diagnostic shown in the Problems panel."""
+
+    __slots__ = ("severity", "path", "line", "column", "message", "document")
+
+    def __init__(self, severity, path, line, column, message, document=None):
+        self.severity = severity # 'error' or 'warning'
+        self.path = path
+        self.line = line
+        self.column = column # 0-based, like Text indices
+        self.message = message
+        self.document = document # The open Document it was found in, for diagnostics of a buffer
+
+
+TRACEBACK_FRAME = re.compile(r'\s*File "(?P<path>[^"]+)", line (?P<line>\d+)')
+# Printed between the tracebacks of chained exceptions
+TRACEBACK_CHAIN = ("During handling of the above exception, another exception occurred:",
+                   "The above exception was the direct cause of the following exception:")
+# path:line: message or path:line:column: message (gcc, flake8, mypy, pytest...)
+DIAGNOSTIC_LINE = re.compile(r'(?P<path>(?:[A-Za-z]:)?[^\s:"][^:"]*):(?P<line>\d+)(?::(?P<column>\d+))?:\s*(?P<message>\S.*)')
+
+
+class _TracebackState:
+    """What an OutputParser has read so far of the traceback in one stream."""
+
+    __slots__ = ("frame", "own_frame", "pending")
+
+    def __init__(self):
+        self.frame = None # Innermost traceback frame seen so far as (path, line)
+        self.own_frame = None # Same, restricted to files below cwd
+        self.pending = None # Problem of the last exception line, until it is known not to be chained
+
+
+class OutputParser:
+    """Finds Python tracebacks and file:line diagnostics in a command's output on a worker thread.
+
+    feed() hands over output as it arrives, with lines possibly split
+    between chunks of the same stream. Each parsed batch is put in results as (token, problems),
+    and (token, None) marks the end once close() was called. Only paths of
+    existing files are reported, so stray "x:1:" text is not a problem.
+    Each stream is parsed on its own, so stdout printed while a traceback
+    is written to stderr does not cut it short. Of chained exceptions only
+    the last one, the exception actually raised, is reported.
+    """
+
+    def __init__(self, cwd, results, token):
+        self.cwd = cwd
+        self.results = results
+        self.token = token
+        self.chunks = queue.Queue()
+        self.partial = {} # Stream tag -> its unterminated last line
+        self.tracebacks = {} # Stream tag -> _TracebackState of the traceback being read from it
+        self._is_file = {} # path -> whether it exists, checked once
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def feed(self, text, tag=None):
+        """Queues a chunk of the stream tag (None for stdout); may be called from any thread."""
+        self.chunks.put((text, tag))
+
+    def close(self):
+        self.chunks.put(None)
+
+    def _run(self):
+        done = False
+        while not done:
+            chunks = [self.chunks.get()]
+            while True: # Parse whatever is queued in one go
+                try:
+                    chunks.append(self.chunks.get_nowait())
+                except queue.Empty:
+                    break
+            if chunks[-1] is None:
+                done = True
+                chunks.pop()
+            problems = []
+            for text, tag in chunks:
+                lines = (self.partial.get(tag, "") + text).split("\n")
+                self.partial[tag] = lines.pop()
+                state = self.tracebacks.setdefault(tag, _TracebackState())
+                for line in lines:
+                    problems += self._parse_line(line, state)
+            if done: # The unterminated last line of every stream, then an exception line that was its last output
+                for tag, line in self.partial.items():
+                    state = self.tracebacks[tag]
+                    problems += self._parse_line(line, state)
+                    if state.pending is not None:
+                        problems.append(state.pending)
+            if problems:
+                self.results.put((self.token, problems))
+        self.results.put((self.token, None))
+
+    def _path(self, path):
+        path = os.path.normpath(os.path.join(self.cwd, path))
+        exists = self._is_file.get(path)
+        if exists is None:
+            exists = self._is_file[path] = os.path.isfile(path)
+        return path if exists else None
+
+    def _parse_line(self, line, state):
+        """Problems completed by one line of a stream whose traceback state is state."""
+        line = line.rstrip("\r")
+        problems = []
+        if state.pending is not None and line.strip():
+            if line.strip() in TRACEBACK_CHAIN:
+                state.pending = None # Only the cause of the exception that follows
+                return problems
+            problems.append(state.pending)
+            state.pending = None
+        match = TRACEBACK_FRAME.match(line)
+        if match:
+            path = self._path(match.group("path"))
+            if path is not None:
+                state.frame = (path, int(match.group("line")))
+                if path.startswith(os.path.join(self.cwd, "")):
+                    state.own_frame = state.frame
+            return problems
+        if state.frame is not None and line and not line[0].isspace() and not line.startswith("Traceback"):
+            # The exception line ends the traceback; point at the innermost frame of the project's own
+            # code. It is held back until the next line shows whether another exception is chained to it.
+            path, number = state.own_frame or state.frame
+            state.frame = state.own_frame = None
+            state.pending = Problem("error", path, number, 0, line.strip())
+            return problems
+        match = DIAGNOSTIC_LINE.match(line)
+        if match:
+            path = self._path(match.group("path"))
+            if path is not None:
+                message = match.group("message")
+                column = int(match.group("column")) - 1 if match.group("column") else 0
+                severity = "warning" if "warning" in message.lower() else "error"
+                problems.append(Problem(severity, path, int(match.group("line")), max(column, 0), message))
+        return problems
+
+
+
+# pyflakes messages that are certain to fail at run time; the rest are warnings
+PYFLAKES_ERRORS = {"UndefinedName", "UndefinedLocal", "UndefinedExport", "DuplicateArgument",
+                   "ReturnOutsideFunction", "YieldOutsideFunction", "ContinueOutsideLoop", "BreakOutsideLoop"}
+
+
+def _check_python(source, filename):
+    """Process pool worker: [(severity, line, column, message)] for Python source.
+
+    Syntax errors come from compile(); source that parses is also run
+    through pyflakes when it is installed.
+    """
+    try:
+        tree = compile(source, filename, "exec", ast.PyCF_ONLY_AST, dont_inherit=True)
+    except SyntaxError as e:
+        return [("error", e.lineno or 1, max((e.offset or 1) - 1, 0), e.msg)]
+    except ValueError as e: # Null bytes
+        return [("error", 1, 0, str(e))]
+    try:
+        from pyflakes import checker
+    except ImportError:
+        return []
+    results = [("error" if type(message).__name__ in PYFLAKES_ERRORS else "warning",
+                message.lineno, message.col, message.message % message.message_args)
+               for message in checker.Checker(tree, filename=filename).messages]
+    results.sort(key=lambda result: result[1:3])
+    return results
+
+
+class VirtualList:
+    """Canvas list that only draws its visible rows, so it stays fast with any number of items.
+
+    Items are (text, color) pairs; like LineNumberGutter, the rows are a pool
+    of canvas text items that are relabelled on scroll. on_click(index) is
+    called with the index of the item clicked.
+    """
+
+    ROW_HEIGHT = 18 # Pixels
+
+    def __init__(self, parent, on_click, font=("Consolas", 10), bg='#1e1e1e'):
+        self.on_click = on_click
+        self.font = tkfont.Font(family=font[0], size=font[1])
+        self.frame = tk.Frame(parent, bg=bg)
+        self.scrollbar = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.frame, bg=bg, highlightthickness=0)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.selection = self.canvas.create_rectangle(0, 0, 0, 0, fill='#094771', outline='', state="hidden")
+        self.items = []
+        self.top = 0 # Index of the first visible item
+        self.selected = None
+        self.rows = [] # Pooled canvas text items
+        self.labels = [] # (text, color) currently shown by each pooled item
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda event: self.yview("scroll", -event.delta // 120 * 3, "units"))
+        self.canvas.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+        self.canvas.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+
+    def set_items(self, items):
+        self.items = items
+        self.selected = None
+        self.top = 0
+        self.redraw()
+
+    def append(self, items):
+        self.items.extend(items)
+        self.redraw()
+
+    def _visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.ROW_HEIGHT)
+
+    def yview(self, *args):
+        """Scrollbar protocol: ("moveto", fraction) or ("scroll", count, "units" or "pages")."""
+        rows = self._visible_rows()
+        if args[0] == "moveto":
+            top = int(float(args[1]) * len(self.items))
+        else:
+            top = self.top + int(args[1]) * (rows if args[2] == "pages" else 1)
+        top = max(0, min(top, len(self.items) - rows))
+        if top != self.top:
+            self.top = top
+            self.redraw()
+
+    def redraw(self):
+        rows = self._visible_rows()
+        shown = self.items[self.top:self.top + rows]
+        for k, label in enumerate(shown):
+            if k == len(self.rows):
+                self.rows.append(self.canvas.create_text(4, k * self.ROW_HEIGHT + 1, anchor="nw", text=label[0],
+                                                         fill=label[1], font=self.font))
+                self.labels.append(label)
+            elif self.labels[k] != label:
+                self.canvas.itemconfigure(self.rows[k], text=label[0], fill=label[1], state="normal")
+                self.labels[k] = label
+        for k in range(len(shown), len(self.rows)):
+            if self.labels[k] is not None:
+                self.canvas.itemconfigure(self.rows[k], state="hidden")
+                self.labels[k] = None
+        if self.selected is not None and self.top <= self.selected < self.top + rows:
+            y = (self.selected - self.top) * self.ROW_HEIGHT
+            self.canvas.coords(self.selection, 0, y, self.canvas.winfo_width(), y + self.ROW_HEIGHT)
+            self.canvas.itemconfigure(self.selection, state="normal")
+        else:
+            self.canvas.itemconfigure(self.selection, state="hidden")
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items), (self.top + len(shown)) / len(self.items))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_click(self, event):
+        index = self.top + event.y // self.ROW_HEIGHT
+        if index < len(self.items):
+            self.selected = index
+            self.redraw()
+            self.on_click(index)
+
+
+# Reading the umask means setting it, which is not safe once other threads create files: read it once at import
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+def _write_file_atomically(path, text):
+    """Writes text to path through an fsynced temporary file renamed over it; returns the new os.stat().
+
+    A crash or a full disk leaves either the old or the new content, never
+    a truncated file. Newlines are written the platform's way, as before.
+    """
+    target = os.path.realpath(path) # Replace a symlink's target, not the link
+    folder = os.path.dirname(target)
+    try:
+        mode = os.stat(target).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK # What open() would have created
+    descriptor, temp = tempfile.mkstemp(prefix="." + os.path.basename(target) + ".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as output_file:
+            output_file.write(text)
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        os.chmod(temp, mode) # mkstemp creates it private
+        os.replace(temp, target)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    if os.name != "nt":
+        try: # Make the rename itself durable
+            folder_descriptor = os.open(folder, os.O_RDONLY)
+            try:
+                os.fsync(folder_descriptor)
+            finally:
+                os.close(folder_descriptor)
+        except OSError:
+            pass # Not supported by every file system
+    return os.stat(target)
+
+
+class EditJournal:
+    """Append-only log of unsaved edits and open tabs, replayed after a crash or on the next start.
+
+    Each line is a JSON array:
+      ["base", id, path, text, digest]
+                                document id holds text from here on, or the file at
+                                path when text is null (clean or just saved); digest
+                                is then the SHA-1 of that file's text, so edits are
+                                not replayed on a file changed since
+      ["i", id, index, text]    text inserted at a Text index
+      ["d", id, first, last]    text deleted between two Text indices
+      ["tabs", [[id, path, cursor, yview], ...], active id]
+    Records are buffered and appended by a background thread at most every
+    interval_ms, typing runs merged into one record. Once the file outgrows
+    max_bytes, on_full() is called to rewrite() it from the live buffers.
+    """
+
+    def __init__(self, master, path, interval_ms, max_bytes):
+        self.master = master
+        self.path = path
+        self.interval_ms = interval_ms
+        self.limit = max_bytes
+        self.max_bytes = max_bytes
+        self.pending = []
+        self.before_flush = None # Called by flush() so the owner can add its tabs record
+        self.on_full = None
+        try:
+            self.size = os.path.getsize(path)
+        except OSError:
+            self.size = 0
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._job = None
+
+    def record(self, entry):
+        pending = self.pending
+        last = pending[-1] if pending else None
+        if last is not None and last[:2] == entry[:2]:
+            if entry[0] == "i" and "\n" not in last[3] and entry[2] == _shift_index(last[2], len(last[3])):
+                last[3] += entry[3] # Typing
+                return
+            if entry[0] == "d" and entry[3] == last[2] and entry[2].split(".")[0] == last[2].split(".")[0]:
+                last[2] = entry[2] # Backspace
+                return
+        pending.append(entry)
+        self.touch()
+
+    def touch(self):
+        """Schedules a flush (e.g. after the open tabs changed)."""
+        if self._job is None:
+            self._job = self.master.after(self.interval_ms, self.flush)
+
+    def flush(self):
+        if self._job is not None:
+            self.master.after_cancel(self._job)
+            self._job = None
+        if self.before_flush is not None:
+            self.before_flush()
+        if not self.pending:
+            return
+        data = self._encode(self.pending)
+        self.pending = []
+        self.size += len(data)
+        self.writer.submit(self._append, data)
+        if self.size > self.limit and self.on_full is not None:
+            self.on_full()
+
+    def rewrite(self, entries):
+        """Replaces the journal with entries (compaction); pending records are dropped."""
+        if self._job is not None:
+            self.master.after_cancel(self._job)
+            self._job = None
+        self.pending = []
+        data = self._encode(entries)
+        self.size = len(data)
+        self.limit = max(self.max_bytes, 2 * self.size) # Buffers bigger than the budget must not compact every flush
+        self.writer.submit(self._replace, data)
+
+    def discard(self):
+        """Stops journaling and deletes the file once queued writes are done."""
+        if self._job is not None:
+            self.master.after_cancel(self._job)
+            self._job = None
+        self.pending = []
+        self.writer.submit(self._delete)
+        self.writer.shutdown(wait=False)
+
+    def close(self):
+        """Waits for the queued writes (e.g. on exit)."""
+        self.writer.shutdown(wait=True)
+
+    @staticmethod
+    def _encode(entries):
+        return "".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in entries)
+
+    def _append(self, data):
+        try:
+            with open(self.path, "a", encoding="utf-8") as journal:
+                journal.write(data)
+        except OSError:
+            pass # Losing a journal write is better than interrupting the editor
+
+    def _replace(self, data):
+        try:
+            _write_file_atomically(self.path, data)
+        except OSError:
+            pass
+
+    def _delete(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def read(path):
+        """(tabs, active id, {id: (path, base text or None, edits, base digest)}) saved in a journal file."""
+        tabs, active, chains = [], None, {}
+        try:
+            with open(path, encoding="utf-8") as journal:
+                lines = journal.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return tabs, active, chains
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # Cut short by a crash
+            if entry[0] == "base":
+                chains[entry[1]] = (entry[2], entry[3], [], entry[4] if len(entry) > 4 else None)
+            elif entry[0] in ("i", "d"):
+                if entry[1] in chains:
+                    chains[entry[1]][2].append(entry)
+            elif entry[0] == "tabs":
+                tabs, active = entry[1], entry[2]
+        return tabs, active, chains
+
+
+def _shift_index(index, columns):
+    line, column = index.split(".")
+    return f"{line}.{int(column) + columns}"
+
+
+class _Fenwick:
+    """Prefix sums over a list of counts, with O(log n) point updates and searches."""
+
+    def __init__(self, counts):
+        self.size = len(counts)
+        tree = [0]
+        tree.extend(counts)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, index, delta):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, count):
+        """Sum of the first count counts."""
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def search(self, target):
+        """(index, remainder) of the count holding unit number target (0-based)."""
+        index = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            following = index + step
+            if following <= self.size and self.tree[following] <= target:
+                index = following
+                target -= self.tree[following]
+            step >>= 1
+        return index, target
+
+
+class TextChange:
+    """An edit seen by the text proxy.
+
+    start/end are the Tk indices of the replaced range before the edit
+    (start is None when it has no single range, e.g. a multi-range delete)
+    and text is what was inserted there. Lines first_line..old_last_line
+    became first_line..new_last_line; version is the buffer version after
+    the edit (None for documents without a TextBuffer).
+    """
+
+    __slots__ = ("start", "end", "text", "first_line", "old_last_line", "new_last_line", "version")
+
+    def __init__(self, start, end, text, first_line, old_last_line, new_last_line):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.first_line = first_line
+        self.old_last_line = old_last_line
+        self.new_last_line = new_last_line
+        self.version = None
+
+
+class TextSnapshot:
+    """Immutable text of a TextBuffer at one version; safe to read from any thread."""
+
+    __slots__ = ("chunks", "version", "line_count", "_text")
+
+    def __init__(self, chunks, version, line_count):
+        self.chunks = chunks
+        self.version = version
+        self.line_count = line_count
+        self._text = None
+
+    def text(self):
+        if self._text is None:
+            self._text = "\n".join(itertools.chain.from_iterable(self.chunks))
+        return self._text
+
+    def lines(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+
+class TextBuffer:
+    """Python copy of a document's text, kept in sync with its widget by the edit hook.
+
+    Lines live in immutable chunks (tuples of up to MAX_CHUNK lines) with
+    Fenwick trees over their line and character counts, so lookups and edits
+    cost O(log n) plus the size of one chunk. A snapshot shares the chunks,
+    so handing the text to a worker does not copy it. Listeners are called
+    with the TextChange of every edit once the buffer reflects it.
+    """
+
+    CHUNK_LINES = 256 # Lines per chunk when chunks are (re)built
+    MAX_CHUNK = 1024 # A chunk growing past this is split again
+
+    def __init__(self, text=""):
+        self.listeners = []
+        self.version = 0
+        self.chunks = []
+        self.reset(text)
+
+    def reset(self, text):
+        self._rechunk(0, len(self.chunks), text.split("\n"))
+        self.version += 1
+
+    def _rechunk(self, first, last, lines):
+        """Replaces chunks first..last-1 with lines cut into new chunks, and rebuilds the indexes."""
+        step = self.CHUNK_LINES
+        self.chunks[first:last] = [tuple(lines[i:i + step]) for i in range(0, len(lines), step)]
+        self.line_counts = _Fenwick([len(chunk) for chunk in self.chunks])
+        self.char_counts = _Fenwick([sum(map(len, chunk)) + len(chunk) for chunk in self.chunks])
+        self.line_count = self.line_counts.prefix(len(self.chunks))
+        self.char_count = self.char_counts.prefix(len(self.chunks)) - 1 # No newline after the last line
+
+    def _locate(self, line):
+        """(chunk, position in chunk) of a 1-based line."""
+        return self.line_counts.search(line - 1)
+
+    def line(self, line):
+        chunk, position = self._locate(line)
+        return self.chunks[chunk][position]
+
+    def lines(self, first, last):
+        """Lines first..last (1-based, inclusive) as a list."""
+        chunk, position = self._locate(first)
+        result = []
+        wanted = last - first + 1
+        while len(result) < wanted and chunk < len(self.chunks):
+            result.extend(self.chunks[chunk][position:position + wanted - len(result)])
+            chunk, position = chunk + 1, 0
+        return result
+
+    def offset(self, line, column):
+        """Character offset of a 1-based line and a column."""
+        chunk, position = self._locate(line)
+        lines = self.chunks[chunk]
+        return self.char_counts.prefix(chunk) + sum(map(len, lines[:position])) + position + column
+
+    def position(self, offset):
+        """(line, column) of a character offset."""
+        offset = max(0, min(offset, self.char_count))
+        chunk, remainder = self.char_counts.search(offset)
+        chunk = min(chunk, len(self.chunks) - 1) # The offset right after the last character
+        line = self.line_counts.prefix(chunk) + 1
+        for text in self.chunks[chunk]:
+            if remainder <= len(text):
+                break
+            remainder -= len(text) + 1
+            line += 1
+        return line, remainder
+
+    def replace_lines(self, first, last, lines):
+        """Replaces lines first..last (1-based, inclusive) with a non-empty list of lines."""
+        chunk, position = self._locate(first)
+        last_chunk, last_position = self._locate(last)
+        old = self.chunks[chunk]
+        if chunk == last_chunk and len(old) - (last_position - position + 1) + len(lines) <= self.MAX_CHUNK:
+            removed = old[position:last_position + 1]
+            self.chunks[chunk] = old[:position] + tuple(lines) + old[last_position + 1:]
+            line_delta = len(lines) - len(removed)
+            char_delta = sum(map(len, lines)) - sum(map(len, removed)) + line_delta
+            self.line_counts.add(chunk, line_delta)
+            self.char_counts.add(chunk, char_delta)
+            self.line_count += line_delta
+            self.char_count += char_delta
+        else: # Spans chunks or overflows one: re-cut the chunks involved
+            merged = list(old[:position])
+            merged.extend(lines)
+            merged.extend(self.chunks[last_chunk][last_position + 1:])
+            self._rechunk(chunk, last_chunk + 1, merged)
+        self.version += 1
+
+    def apply(self, change, text):
+        """Puts text (the new content of change's lines) in place and notifies the listeners."""
+        self.replace_lines(change.first_line, change.old_last_line, text.split("\n"))
+        change.version = self.version
+        for listener in self.listeners:
+            listener(change)
+
+    def snapshot(self):
+        return TextSnapshot(tuple(self.chunks), self.version, self.line_count)
+
+
+class IconAtlas:
+    """Icons for the icon bar and the explorer, served from one pre-resized PNG in the cache.
+
+    get() hands out an empty PhotoImage at once; load() fills every icon
+    asked for so far by copying its region out of the atlas. On a miss
+    (new, changed or missing source PNGs, or other sizes) the atlas is
+    rebuilt with Pillow on a worker thread, and the icons are filled in
+    when it is ready. Pillow is only imported then.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, master, directories):
+        self.master = master
+        self.directories = directories # Searched in order for <name>.png
+        self.images = {} # (name, (width, height)) -> PhotoImage
+        base = os.path.join(_cache_dir("icons"), "atlas")
+        self.png_path, self.meta_path = base + ".png", base + ".json"
+        self._results = queue.Queue()
+
+    def get(self, name, size):
+        image = self.images.get((name, size))
+        if image is None:
+            image = self.images[(name, size)] = tk.PhotoImage(master=self.master, width=size[0], height=size[1])
+        return image
+
+    def _sources(self, names):
+        """name -> (path, size, mtime_ns) of each icon file found; each directory is listed once."""
+        found = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        name, ext = os.path.splitext(entry.name)
+                        if ext.lower() == ".png" and name in names and name not in found:
+                            stat = entry.stat()
+                            found[name] = (entry.path, stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        return found
+
+    def load(self):
+        wanted = sorted(self.images)
+        sources = self._sources({name for name, size in wanted})
+        for name in sorted({name for name, size in wanted} - sources.keys()):
+            print(f"Advertencia: El icono '{name}.png' no se encontró en 'icons/' ni en la carpeta raíz. Asegúrate de que existe.")
+        key = hashlib.sha1(repr([(name, size, sources.get(name)) for name, size in wanted]).encode()).hexdigest()
+        try:
+            with open(self.meta_path, encoding="utf-8") as meta:
+                cached = json.load(meta)
+            if cached["key"] == key and os.path.exists(self.png_path):
+                self._fill(cached["regions"])
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+        threading.Thread(target=self._build, args=(key, wanted, sources), daemon=True).start()
+        self.master.after(self.POLL_MS, self._poll)
+
+    def _build(self, key, wanted, sources):
+        # Worker thread: Pillow only, no Tk
+        try:
+            from PIL import Image # Imported here so that startup does not pay for it
+            atlas = Image.new("RGBA", (max(1, sum(size[0] for name, size in wanted)),
+                                       max([1] + [size[1] for name, size in wanted])), (0, 0, 0, 0))
+            regions = {}
+            x = 0
+            for name, size in wanted:
+                if name in sources:
+                    try:
+                        with Image.open(sources[name][0]) as image:
+                            atlas.paste(image.convert("RGBA").resize(size, Image.Resampling.LANCZOS), (x, 0))
+                    except Exception as e:
+                        print(f"Error al cargar el icono '{name}.png': {e}")
+                        continue
+                    regions[f"{name}:{size[0]}x{size[1]}"] = x
+                x += size[0]
+            # Metadata last: a crash in between leaves a key that no longer matches
+            atlas.save(self.png_path + ".tmp", "PNG")
+            os.replace(self.png_path + ".tmp", self.png_path)
+            with open(self.meta_path + ".tmp", "w", encoding="utf-8") as meta:
+                json.dump({"key": key, "regions": regions}, meta)
+            os.replace(self.meta_path + ".tmp", self.meta_path)
+            self._results.put(regions)
+        except Exception as e:
+            self._results.put(e)
+
+    def _poll(self):
+        try:
+            result = self._results.get_nowait()
+        except queue.Empty:
+            self.master.after(self.POLL_MS, self._poll)
+            return
+        if isinstance(result, ImportError):
+            print("Advertencia: Pillow no está instalado; los iconos se muestran vacíos.")
+        elif isinstance(result, Exception):
+            print(f"Error al crear la caché de iconos: {result}")
+        else:
+            self._fill(result)
+
+    def _fill(self, regions):
+        try:
+            atlas = tk.PhotoImage(master=self.master, file=self.png_path)
+        except tk.TclError as e:
+            print(f"Error al cargar la caché de iconos: {e}")
+            return
+        for (name, (width, height)), image in self.images.items():
+            x = regions.get(f"{name}:{width}x{height}")
+            if x is not None:
+                image.tk.call(image, "copy", atlas, "-from", x, 0, x + width, height, "-to", 0, 0)
+
+
+class StartupProfile:
+    """Wall-clock time of each startup phase, printed by --profile-startup."""
+
+    FIRST_FRAME_BUDGET_MS = 300
+
+    def __init__(self, start):
+        self.start = self.last = start
+        self.phases = [] # (name, milliseconds)
+        self.first_frame = None # Milliseconds from start to the first painted frame
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000))
+        self.last = now
+        return now
+
+    def report(self):
+        lines = ["Arranque de TkCode (ms):"]
+        lines += [f"  {name:<20}{ms:8.1f}" for name, ms in self.phases]
+        lines.append(f"  {'total':<20}{(self.last - self.start) * 1000:8.1f}")
+        if self.first_frame is not None:
+            verdict = "dentro del" if self.first_frame <= self.FIRST_FRAME_BUDGET_MS else "FUERA DEL"
+            lines.append(f"Primer fotograma: {self.first_frame:.1f} ms ({verdict} presupuesto de {self.FIRST_FRAME_BUDGET_MS} ms)")
+        return "\n".join(lines)
+
+
+class _CountingTcl:
+    """Stands in for the Tcl interpreter of the widgets, counting the calls that reach Tcl."""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.calls = 0
+        self.commands = collections.Counter() # Widget subcommand or Tcl command -> calls
+
+    def call(self, *args):
+        self.calls += 1
+        command = args[0] if len(args) == 1 and isinstance(args[0], tuple) else args
+        if command:
+            name = str(command[0])
+            self.commands[str(command[1]) if name.startswith(".") and len(command) > 1 else name] += 1
+        return self.interpreter.call(*args)
+
+    def eval(self, script):
+        self.calls += 1
+        self.commands["eval"] += 1
+        return self.interpreter.eval(script)
+
+    def __getattr__(self, name):
+        return getattr(self.interpreter, name)
+
+
+def _set_interpreter(widget, interpreter):
+    """Points widget and all its descendants at interpreter; new children inherit it from their master."""
+    widget.tk = interpreter
+    for child in widget.children.values():
+        _set_interpreter(child, interpreter)
+
+
+def _percentile(values, fraction):
+    """The value below which fraction of the (sorted) values fall."""
+    if not values:
+        return 0.0
+    return values[min(max(int(len(values) * fraction + 0.5) - 1, 0), len(values) - 1)] # Nearest rank
+
+
+class PerfMonitor:
+    """Opt-in instrumentation of the editor, switched with --perf or the terminal's perf command.
+
+    Nothing is hooked while it is disabled. enable() replaces the methods
+    given to it with timed wrappers, routes the widgets' Tcl calls through
+    a counter, times the scheduler's jobs, measures keystroke to paint
+    latency of the watched widgets and starts an after() loop that records
+    how late it runs (event loop lag). disable() puts everything back.
+    Spans and samples are kept in bounded rings for export as Chrome trace
+    events (chrome://tracing or ui.perfetto.dev).
+    """
+
+    LAG_INTERVAL_MS = 50
+    MAX_EVENTS = 200000 # Trace events kept; older ones are dropped
+    SAMPLES = 1000 # Latencies kept for the percentiles
+    KEY_TAG = "TkCodePerf" # Bind tag put first on watched widgets
 
-class CodeEditor:
     def __init__(self, master):
         self.master = master
+        self.enabled = False
+        self.methods = [] # (owner, name) of the methods to time
+        self.scheduler = None
+        self.tcl = None
+        self.watched = weakref.WeakSet()
+        self._originals = []
+        self._lag_job = None
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.perf_counter()
+        self.timers = {} # Span name -> [calls, total seconds, max seconds]
+        self.events = collections.deque(maxlen=self.MAX_EVENTS) # (phase, name, category, start, duration or value, thread)
+        self.key_latencies = collections.deque(maxlen=self.SAMPLES) # Milliseconds
+        self.lags = collections.deque(maxlen=self.SAMPLES) # Milliseconds
+        self.max_lag = 0.0
+        for owner, name in self.methods:
+            original = owner.__dict__[name]
+            self._originals.append((owner, name, original))
+            setattr(owner, name, self._timed(f"{owner.__name__}.{name}", original))
+        self.tcl = _CountingTcl(self.master.tk)
+        _set_interpreter(self.master, self.tcl)
+        if self.scheduler is not None:
+            self.scheduler.tracer = lambda kind, start, end: self.record("planificador:" + kind, start, end, "scheduler")
+        self.master.bind_class(self.KEY_TAG, "<KeyPress>", self._on_key)
+        for widget in self._live_watched():
+            widget.bindtags((self.KEY_TAG,) + tuple(widget.bindtags()))
+        self._lag_due = time.perf_counter() + self.LAG_INTERVAL_MS / 1000
+        self._lag_job = self.master.after(self.LAG_INTERVAL_MS, self._lag_tick)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for owner, name, original in self._originals:
+            setattr(owner, name, original)
+        self._originals = []
+        _set_interpreter(self.master, self.tcl.interpreter)
+        if self.scheduler is not None:
+            self.scheduler.tracer = None
+        self.master.unbind_class(self.KEY_TAG, "<KeyPress>")
+        for widget in self._live_watched():
+            widget.bindtags(tuple(tag for tag in widget.bindtags() if tag != self.KEY_TAG))
+        self.master.after_cancel(self._lag_job)
+        self._lag_job = None
+
+    def watch(self, widget):
+        """Measures keystroke to paint latency of widget (e.g. each document's Text) while enabled."""
+        self.watched.add(widget)
+        if self.enabled:
+            widget.bindtags((self.KEY_TAG,) + tuple(widget.bindtags()))
+
+    def _live_watched(self):
+        return [widget for widget in self.watched if widget.winfo_exists()]
+
+    def _timed(self, name, function):
+        record = self.record
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, started, perf_counter())
+        return timed
+
+    def record(self, name, start, end, category="function"):
+        duration = end - start
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0.0, 0.0]
+        timer[0] += 1
+        timer[1] += duration
+        timer[2] = max(timer[2], duration)
+        self.events.append(("X", name, category, start, duration, threading.get_ident()))
+
+    def _on_key(self, event):
+        started = time.perf_counter()
+        # The widget redraws from an idle callback queued while the key is handled, after this
+        # one; an idle callback queued from an idle callback only runs in the next idle round
+        self.master.after_idle(lambda: self.master.after_idle(self._key_painted, started))
+
+    def _key_painted(self, started):
+        if self.enabled:
+            ended = time.perf_counter()
+            self.key_latencies.append((ended - started) * 1000)
+            self.events.append(("X", "tecla → pintado", "input", started, ended - started, threading.get_ident()))
+
+    def _lag_tick(self):
+        now = time.perf_counter()
+        lag = max((now - self._lag_due) * 1000, 0.0)
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        self.events.append(("C", "retraso del bucle (ms)", "loop", now, lag, threading.get_ident()))
+        self.events.append(("C", "llamadas a Tcl", "tcl", now, self.tcl.calls, threading.get_ident()))
+        self._lag_due = now + self.LAG_INTERVAL_MS / 1000
+        self._lag_job = self.master.after(self.LAG_INTERVAL_MS, self._lag_tick)
+
+    def key_percentiles(self):
+        """(p50, p99) keystroke to paint latency in milliseconds."""
+        latencies = sorted(self.key_latencies)
+        return _percentile(latencies, 0.5), _percentile(latencies, 0.99)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        key_p50, key_p99 = self.key_percentiles()
+        lags = sorted(self.lags)
+        lines = [f"Rendimiento (medido durante {elapsed:.1f} s):",
+                 f" Tecla → pintado: p50 {key_p50:.1f} ms, p99 {key_p99:.1f} ms ({len(self.key_latencies)} teclas)",
+                 f" Retraso del bucle: p50 {_percentile(lags, 0.5):.1f} ms, p99 {_percentile(lags, 0.99):.1f} ms, "
+                 f"máx {self.max_lag:.1f} ms",
+                 f" Llamadas a Tcl: {self.tcl.calls} ({self.tcl.calls / max(elapsed, 1e-9):.0f}/s); más frecuentes: "
+                 + ", ".join(f"{name} {count}" for name, count in self.tcl.commands.most_common(5)),
+                 " Tiempos:"]
+        for name, (calls, total, longest) in sorted(self.timers.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  - {name}: {calls} llamadas, total {total * 1000:.1f} ms, "
+                         f"media {total * 1000 / calls:.2f} ms, máx {longest * 1000:.1f} ms")
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Writes the recorded spans and counters as a Chrome trace event file."""
+        pid = os.getpid()
+        events = []
+        for phase, name, category, start, value, thread in list(self.events):
+            event = {"name": name, "cat": category, "ph": phase, "ts": (start - self.started) * 1e6,
+                     "pid": pid, "tid": thread}
+            if phase == "X":
+                event["dur"] = value * 1e6
+            else:
+                event["args"] = {"valor": value}
+            events.append(event)
+        with open(path, "w", encoding="utf-8") as trace:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace)
+        return len(events)
+
+
+def _find_all(text, pattern, first_line=1):
+    """(line, column, end_line, end_column) of every non-empty match of pattern in text.
+
+    text starts at line first_line of its buffer.
+    """
+    matches = []
+    line, position = first_line, 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue # Empty matches (e.g. "^" or "a*") can be neither shown nor replaced usefully
+        line += text.count("\n", position, start)
+        position = start
+        end_line = line + text.count("\n", start, end)
+        matches.append((line, start - text.rfind("\n", 0, start) - 1, end_line, end - text.rfind("\n", 0, end) - 1))
+    return matches
+
+
+def _replace_all(text, pattern, replacement, is_regex):
+    """Replaces every non-empty match of pattern in text.
+
+    Returns (first_line, last_line, new text of those lines, count), covering
+    the lines from the first match to the last, or None without matches.
+    """
+    first = last = None
+    count = 0
+
+    def substitute(match):
+        nonlocal first, last, count
+        if match.start() == match.end():
+            return ""
+        if first is None:
+            first = match.start()
+        last = match.end()
+        count += 1
+        return match.expand(replacement) if is_regex else replacement
+
+    new_text = pattern.sub(substitute, text)
+    if first is None:
+        return None
+    line_start = text.rfind("\n", 0, first) + 1
+    line_end = text.find("\n", last)
+    suffix = len(text) - line_end if line_end != -1 else 0
+    first_line = text.count("\n", 0, first) + 1
+    last_line = first_line + text.count("\n", first, last)
+    return first_line, last_line, new_text[line_start:len(new_text) - suffix], count
+
+
+class BufferSearch:
+    """Matches of one pattern in a TextBuffer, as sorted (line, column, end_line, end_column) tuples.
+
+    The whole buffer is searched once from a snapshot on a worker thread.
+    After that, an edit only rescans the lines it touched (plus one on each
+    side) and shifts the matches below it, so the index stays current while
+    typing in large files. A match that spans further than that around an
+    edit is picked up again by the next full search.
+    """
+
+    def __init__(self, buffer, pattern):
+        self.buffer = buffer
+        self.pattern = pattern
+        self.matches = []
+        self.version = None # Buffer version the matches belong to; None until the first search is done
+
+    def on_edit(self, change):
+        if self.version is None:
+            return # The worker's result will be stale and searched again
+        first = max(change.first_line - 1, 1)
+        old_last = change.old_last_line + 1
+        new_last = min(change.new_last_line + 1, self.buffer.line_count)
+        matches = self.matches
+        i = bisect.bisect_left(matches, (first,))
+        if i > 0 and matches[i - 1][2] >= change.first_line:
+            i -= 1 # A match running into the edited lines
+        j = bisect.bisect_left(matches, (old_last + 1,))
+        found = _find_all("\n".join(self.buffer.lines(first, new_last)), self.pattern, first)
+        matches[i:j] = found
+        delta = change.new_last_line - change.old_last_line
+        if delta:
+            tail = i + len(found)
+            matches[tail:] = [(line + delta, column, end_line + delta, end_column)
+                              for line, column, end_line, end_column in matches[tail:]]
+        self.version = self.buffer.version
+
+    def index_at(self, line, column):
+        """Index of the first match starting at or after line.column (len(matches) if none)."""
+        return bisect.bisect_left(self.matches, (line, column))
+
+
+_IDENTIFIER = re.compile(r"\b[^\W\d]\w{2,}") # Shorter identifiers are not worth completing
+_IDENTIFIER_END = re.compile(r"\b[^\W\d]\w*$") # The identifier being typed, ending at the cursor
+
+
+class IdentifierIndex:
+    """Identifiers of a TextBuffer with their counts, for completion.
+
+    names is a sorted array of (name.lower(), name) pairs, so the names
+    starting with a prefix, ignoring case, are one bisect away. lines holds the identifiers
+    of each line: an edit only re-reads the lines it touched and applies the
+    difference in counts, inserting or deleting a name in the array when
+    its count goes from or to zero. version is None until build() has
+    indexed the whole buffer. Without a buffer, reset() fills the index
+    from a Counter (e.g. the project's symbols).
+    """
+
+    SCAN_LIMIT = 200 # Names looked at per query; longer prefixes narrow the range first
+
+    def __init__(self, buffer=None):
+        self.buffer = buffer
+        self.counts = {}
+        self.names = []
+        self.lines = []
+        self.version = None
+
+    def reset(self, counts):
+        self.counts = dict(counts)
+        self.names = sorted((name.lower(), name) for name in self.counts)
+
+    def build(self, snapshot):
+        """Generator indexing a snapshot of the buffer from scratch, yielding between chunks."""
+        lines = []
+        counts = collections.Counter()
+        findall = _IDENTIFIER.findall
+        for chunk in snapshot.chunks:
+            words = [tuple(findall(line)) for line in chunk]
+            lines.extend(words)
+            counts.update(itertools.chain.from_iterable(words))
+            yield
+        if self.buffer.version != snapshot.version:
+            return # Edited meanwhile: the editor starts again once the edits settle
+        self.reset(counts)
+        self.lines = lines
+        self.version = snapshot.version
+
+    def on_edit(self, change):
+        if self.version is None:
+            return
+        first, old_last = change.first_line, change.old_last_line
+        findall = _IDENTIFIER.findall
+        new = [tuple(findall(line)) for line in self.buffer.lines(first, change.new_last_line)]
+        delta = collections.Counter(itertools.chain.from_iterable(new))
+        delta.subtract(itertools.chain.from_iterable(self.lines[first - 1:old_last]))
+        self.lines[first - 1:old_last] = new
+        counts, names = self.counts, self.names
+        for name, count in delta.items():
+            if not count:
+                continue
+            old = counts.get(name, 0)
+            if old + count > 0:
+                counts[name] = old + count
+                if not old:
+                    bisect.insort(names, (name.lower(), name))
+            else:
+                del counts[name]
+                del names[bisect.bisect_left(names, (name.lower(), name))]
+        self.version = change.version
+
+    def complete(self, prefix):
+        """(name, count) of the names starting with prefix, ignoring case, in alphabetical order."""
+        folded = prefix.lower()
+        names = self.names
+        start = bisect.bisect_left(names, (folded,))
+        result = []
+        for key, name in names[start:start + self.SCAN_LIMIT]:
+            if not key.startswith(folded):
+                break
+            result.append((name, self.counts[name]))
+        return result
+
+
+class Document:
+    """An open file (or untitled buffer) and the editor state that belongs to it.
+
+    The document's Text widget is its cache: it keeps the text, undo stack,
+    marks and highlight tags, so switching tabs only re-packs it. An evicted
+    document has no widget; it remembers its cursor and scroll position and
+    is reloaded from disk when its tab is selected again.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.text = None # ScrolledText while loaded
+        self.buffer = None # TextBuffer mirroring the widget, except in large file mode
+        self.highlighter = None
+        self.loader = None
+        self.viewer = None
+        self.large_file_mode = False
+        self.cursor = "1.0"
+        self.yview = 0.0
+        self.restore_view = False # Put cursor and yview back once the reload finishes
+        self.pending_goto = None # (line, column, length) to select once the load finishes
+        self.diagnostics = [] # Problems found in the text by the diagnostics service
+        self.checked_digest = None # Hash of the text the last diagnostics run was started for
+        self.checked_version = None # Buffer version of that text
+        self.symbols = [] # (name, kind, line, column, container) found in the text, for the outline
+        self.symbols_digest = None # Hash of the text the symbols were (or are being) parsed from
+        self.symbols_version = None # Buffer version of that text
+        self.words = None # IdentifierIndex of the buffer, for completion
+        self.check_future = None # Diagnostics run in progress
+        self.saved = None # (path, content hash, (size, mtime_ns)) of the last save
+        self.journal_id = None # Identifies the document in the EditJournal
+        self.journal_base = False # Whether the journal holds a base its edits can be replayed on
+        self.journal_digest = None # Hash of the file text a null journal base stands for
+        self.size = 0 # Characters, measured when the document was last deactivated
+        self.last_used = 0.0
+
+    def name(self):
+        return os.path.basename(self.path) if self.path else "Sin título"
+
+    def modified(self):
+        return self.text is not None and bool(self.text.edit_modified())
+
+
+def _active_document_attribute(name):
+    """A CodeEditor property forwarding to the active document's attribute."""
+    return property(lambda self: getattr(self.doc, name),
+                    lambda self, value: setattr(self.doc, name, value))
+
+
+class CodeEditor:
+    EXPLORER_BATCH = 256 # Entries per batch sent by a directory listing worker
+    EXPLORER_INSERTS_PER_TICK = 400 # Max Treeview inserts per drain tick
+    EXPLORER_TICK_MS = 16
+    SYMBOL_INDEX_DELAY_MS = 3000 # The project is indexed for go to symbol this long after opening it
+    SYMBOL_PALETTE_POLL_MS = 500
+    FIND_DELAY_MS = 150 # Typing pause before the find bar searches
+    PERF_REPORT_MS = 500 # Refresh of the status bar latency readout while profiling
+    # Hot paths timed by the performance instrumentation (scheduler jobs are timed as well)
+    PERF_TIMED = ("update_line_numbers", "open_file_by_path", "populate_tree",
+                  "on_folder_open", "save_file", "print_to_terminal", "_drain_terminal")
+    # Highlighting runs as scheduler slices; these time the work inside each slice
+    PERF_TIMED_HIGHLIGHT = ("refresh", "_lex", "_paint")
+    COMPLETION_MIN_PREFIX = 2 # Characters typed before completions pop up on their own
+    COMPLETION_LIMIT = 50
+    STARTUP_FALLBACK_MS = 500 # Second startup phase if the window never reports being drawn
+    LARGE_FILE_THRESHOLD = 16 * 1024 * 1024 # Bytes; larger files open without highlighting or undo
+    HUGE_FILE_THRESHOLD = 256 * 1024 * 1024 # Bytes; larger files open in the read-only viewer
+    SEARCH_BATCH = 64 # Files per project search task sent to the process pool
+    SEARCH_HITS_PER_FILE = 100
+    SEARCH_MAX_HITS = 5000
+    FILE_LIST_MAX_AGE = 30 # Seconds before quick open re-crawls the project
+    DOCUMENT_CACHE_CHARS = 32 * 1024 * 1024 # Text kept in the widgets of inactive tabs
+    DOCUMENT_CACHE_COUNT = 20 # Inactive tabs that keep their widget
+    TERMINAL_MAX_LINES = 5000 # Scrollback kept by the terminal; older lines are deleted
+    TERMINAL_TICK_MS = 16
+    OUTPUT_MAX_LINES = 20000 # Lines kept by the Output panel
+    TASK_TICK_MS = 16
+    DIAGNOSTICS_DELAY_MS = 500 # Quiet time after the last edit before the buffer is checked
+    DIAGNOSTICS_MAX_CHARS = 1024 * 1024 # Larger buffers are not checked
+    DIAGNOSTICS_CACHE_SIZE = 64 # Results kept by content hash
+    SAVE_POLL_MS = 30
+    JOURNAL_INTERVAL_MS = 2000 # How often buffered unsaved edits are appended to the journal
+    JOURNAL_MAX_BYTES = 4 * 1024 * 1024 # Journal size that triggers a compaction
+    # Commands that run a file with F5, by extension
+    FILE_RUNNERS = {".py": '"{python}" -u "{path}"', ".js": 'node "{path}"'}
+
+    # Editor state that belongs to the active document (see Document)
+    text_area = _active_document_attribute("text")
+    highlighter = _active_document_attribute("highlighter")
+    current_file = _active_document_attribute("path")
+    loader = _active_document_attribute("loader")
+    viewer = _active_document_attribute("viewer")
+    large_file_mode = _active_document_attribute("large_file_mode")
+
+    def __init__(self, master, profile_startup=False, perf=False):
+        self.master = master
+        self.startup = StartupProfile(_STARTED)
+        self.startup.mark("importar y Tk")
+        self.profile_startup = profile_startup
         master.title("TkCode - Editor de Código")
         master.geometry("1200x800") # Increased height for bottom panel
 
-        self.current_file = None
         self.project_root = None # To track the root of the open folder
-        self.icons = {} # Dictionary to hold PhotoImage objects to prevent garbage collection
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.icon_atlas = IconAtlas(master, [os.path.join(here, "icons"), here]) # 'icons' subfolder, then the root
 
         # --- Main Layout Frames ---
         self.main_frame = tk.Frame(master)
@@ -48,54 +3633,88 @@ class CodeEditor:
         self.editor_area_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
         
-        self.text_area = scrolledtext.ScrolledText(
-            self.editor_area_frame,
-            wrap='none',
-            bg='#21252b',
-            fg='#abb2bf',
-            insertbackground='#528bff',
-            selectbackground='#3a3f4a',
-            font=("Consolas", 12),
-            undo=True,
-            autoseparators=True,
-            maxundo=-1
-        )
-        self.text_area.pack(fill=tk.BOTH, expand=True)
-
-       
-        self.text_area.vbar.config(command=self.on_vertical_scroll)
-
-        
-        self.line_numbers_canvas = tk.Canvas(
-            self.line_numbers_frame,
-            width=30,
-            bg='#282c34',
-            highlightthickness=0
-        )
+        # One tab per open document; only the active document's widget is packed
+        self.tab_bar = tk.Frame(self.editor_area_frame, bg='#21252b')
+        self.tab_bar.pack(side=tk.TOP, fill=tk.X)
+        self._tabs = {} # Document -> (frame, label, close button, last style shown)
+        self.documents = []
+        self.doc = None # The active Document
+        self.journal = None # EditJournal of the project, for hot exit and crash recovery
+        self._journal_ids = itertools.count(1)
+        self._journal_restoring = False
+
+        self.gutter = LineNumberGutter(self.line_numbers_frame)
+        self.line_numbers_canvas = self.gutter.canvas
         self.line_numbers_canvas.pack(side=tk.LEFT, fill=tk.Y)
 
-    
-        self.text_area.tag_configure("keyword", foreground="#c678dd")
-        self.text_area.tag_configure("string", foreground="#98c379")
-        self.text_area.tag_configure("comment", foreground="#5c6370")
-        self.text_area.tag_configure("function", foreground="#61afef")
-        self.text_area.tag_configure("number", foreground="#d19a66")
-        self.text_area.tag_configure("operator", foreground="#c678dd")
-
-        self.keywords = ["import", "from", "def", "class", "return", "if", "else", "elif",
-                         "for", "while", "break", "continue", "try", "except", "finally",
-                         "with", "as", "True", "False", "None", "and", "or", "not", "in", "is"]
-
-     
-        self.text_area.bind("<KeyRelease>", self.on_key_release)
-        self.text_area.bind("<MouseWheel>", self.on_vertical_scroll)
-        self.text_area.bind("<Configure>", self.update_line_numbers)
+        # All redraws go through the scheduler so bursts of events coalesce into one run
+        self.scheduler = RefreshScheduler(master)
+        self.scheduler.register("gutter", self.update_line_numbers, 10)
+        self.scheduler.register("highlight", lambda: self.highlighter.run(), 30)
+        self.scheduler.register("status", self.update_status_bar, 100)
+        self.perf = PerfMonitor(master) # Hooks nothing until enabled
+        self.perf.methods = ([(CodeEditor, name) for name in self.PERF_TIMED]
+                             + [(IncrementalHighlighter, name) for name in self.PERF_TIMED_HIGHLIGHT]
+                             + [(OutputSink, "flush")])
+        self.perf.scheduler = self.scheduler
+        self.status_bar_perf_label = None
+        self._perf_job = None
+        self.scheduler.register("diagnostics", self.run_diagnostics, self.DIAGNOSTICS_DELAY_MS, debounce=True)
+        self.diagnostics_pool = None # Worker process for the checks, started on first use
+        self._diagnostics_cache = collections.OrderedDict() # Content hash -> results of _check_python
+        self._diagnostics_queue = queue.Queue()
+        self._diagnostics_poll_job = None
+
+        # Saves are written in order by one background thread
+        self.save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save")
+        self._save_queue = queue.Queue()
+        self._saves_pending = 0
+        self._save_poll_job = None
+
+        # Quick open: fuzzy file finder over a cached list of the project's files
+        self.palette = Palette(master, lambda: self.scheduler.mark_dirty("palette"))
+        self.scheduler.register("palette", self.palette.refresh, 16)
+        self.project_files = None # ProjectFileList of project_root, crawled on first use
+        self.file_matcher = FuzzyMatcher()
+
+        # Find/replace in the active document; the bar itself is built on first use
+        self.find_bar = None
+        self.find_visible = False
+        self.find = None # BufferSearch of the active document for the query in the bar
+        self._find_doc = None # Document the matches (and their tags) belong to
+        self._find_query = None # (text, regex, case) of self.find
+        self._find_pending = None # Navigation or replace waiting for the search to finish
+        self._find_results = queue.Queue()
+        self._find_poll_job = None
+        self.scheduler.register("find", self._start_find, self.FIND_DELAY_MS, debounce=True)
+        self.scheduler.register("find_tags", self._paint_find_matches, 16)
+
+        # Symbols: the active buffer's feed the outline, the project's index feeds go to symbol
+        self.symbol_index = None # SymbolIndex of project_root, built in the background
+        self.symbol_matcher = FuzzyMatcher()
+        self._symbol_items = {} # Label in the project symbol palette -> (path, line, column)
+        self._symbol_matcher_key = None # What symbol_matcher was built from
+        self._symbols_generation = 0 # Bumped whenever a buffer's symbols change
+        self._symbol_cache = collections.OrderedDict() # Content hash -> symbols of a buffer
+        self._symbol_queue = queue.Queue()
+        self._symbols_pending = 0
+        self._symbol_poll_job = None
+        self.outline_view = None
+        self.scheduler.register("symbols", self.run_symbols, self.DIAGNOSTICS_DELAY_MS, debounce=True)
+
+        # Completion: identifiers of the open buffers, the project's symbols and the grammar's keywords
+        self.completion = None # CompletionPopup, built on first use
+        self._completion_start = None # (line, column) where the identifier being completed starts
+        self.project_words = IdentifierIndex()
+        self._project_words_key = None # What project_words was built from
+        self.scheduler.register("words", self.run_word_index, self.DIAGNOSTICS_DELAY_MS, debounce=True)
+
+        self.activate_document(self._create_document(None))
 
         
         self.bottom_panel_frame = tk.Frame(self.editor_bottom_wrapper, height=200, bg='#1e1e1e')
         self.bottom_panel_frame.pack(side=tk.BOTTOM, fill=tk.X)
         self.bottom_panel_visible = True
-        self.create_bottom_panel()
 
       
         self.create_menu()
@@ -104,29 +3723,45 @@ class CodeEditor:
         self.status_bar = tk.Frame(master, bd=1, relief=tk.SUNKEN, bg='#007acc') # VS Code blue
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         self.create_status_bar()
-
+        if perf:
+            self.set_perf(True)
+        self.startup.mark("ventana")
+        self.icon_atlas.load() # From the cache when it is current, else filled in later
+        self.startup.mark("iconos")
+
+        # Everything else waits until the window has been drawn once
+        self._started = False
+        self.main_frame.bind("<Expose>", self._on_first_expose)
+        self.master.after(self.STARTUP_FALLBACK_MS, self._finish_startup) # In case no Expose arrives (e.g. withdrawn)
         self.master.after(100, self.update_line_numbers) 
         self.master.after(100, self.update_status_bar) 
 
+    def _on_first_expose(self, event=None):
+        self.main_frame.unbind("<Expose>")
+        self.master.after_idle(self._finish_startup) # Runs after the redraws queued by the Expose
+
+    def _finish_startup(self):
+        """Second startup phase: the hidden sidebar view, the bottom panel and the initial folder."""
+        if self._started:
+            return
+        self._started = True
+        self.startup.first_frame = (self.startup.mark("primer fotograma") - self.startup.start) * 1000
+        self.create_search_panel()
+        self.create_bottom_panel()
+        self.startup.mark("paneles")
+
+        # Load an initial directory (e.g., current working directory) and the tabs left open in it
+        self.open_folder(os.getcwd())
+        self.startup.mark("carpeta")
+
+        self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
+        if self.profile_startup:
+            print(self.startup.report())
+            self.master.after_idle(self.on_closing)
+
     def load_icon(self, icon_name, size=(24, 24)):
-        """Loads an icon image and returns a PhotoImage object."""
-        try:
-            image_path = os.path.join(os.path.dirname(__file__), "icons", f"{icon_name}.png") # Assumes 'icons' subfolder
-            if not os.path.exists(image_path): # Fallback to root if not in subfolder
-                 image_path = os.path.join(os.path.dirname(__file__), f"{icon_name}.png")
-
-            img = Image.open(image_path)
-            img = img.resize(size, Image.Resampling.LANCZOS)
-            photo_img = ImageTk.PhotoImage(img)
-            self.icons[icon_name] = photo_img # Store reference to prevent garbage collection
-            return photo_img
-        except FileNotFoundError:
-            print(f"Advertencia: El icono '{icon_name}.png' no se encontró en 'icons/' ni en la carpeta raíz. Asegúrate de que existe.")
-            # Return a blank image to avoid crashes if an icon is missing
-            return ImageTk.PhotoImage(Image.new('RGBA', size, (0, 0, 0, 0)))
-        except Exception as e:
-            print(f"Error al cargar el icono '{icon_name}.png': {e}")
-            return ImageTk.PhotoImage(Image.new('RGBA', size, (0, 0, 0, 0)))
+        """Returns the PhotoImage of an icon; it stays blank until the icon atlas is loaded."""
+        return self.icon_atlas.get(icon_name, tuple(size))
 
     def create_icon_bar(self):
         """Creates the icon bar with placeholder buttons."""
@@ -135,13 +3770,13 @@ class CodeEditor:
 
         # Files icon
         files_icon = self.load_icon("files")
-        btn_files = tk.Button(self.icon_bar_frame, image=files_icon, command=self.toggle_sidebar,
+        btn_files = tk.Button(self.icon_bar_frame, image=files_icon, command=lambda: self.show_sidebar_view("explorer"),
                               bg='#333333', activebackground='#444444', bd=0, relief=tk.FLAT)
         btn_files.pack(pady=5, padx=5)
 
         # Search icon
         search_icon = self.load_icon("search")
-        btn_search = tk.Button(self.icon_bar_frame, image=search_icon, command=lambda: self.show_message("Buscar"),
+        btn_search = tk.Button(self.icon_bar_frame, image=search_icon, command=lambda: self.show_sidebar_view("search"),
                                bg='#333333', activebackground='#444444', bd=0, relief=tk.FLAT)
         btn_search.pack(pady=5, padx=5)
 
@@ -176,15 +3811,18 @@ class CodeEditor:
         else:
             self.sidebar_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 1))
         self.sidebar_visible = not self.sidebar_visible
-        self.master.after(10, self.update_line_numbers) # Update line numbers after layout change
+        self.scheduler.mark_dirty("gutter") # Update line numbers after layout change
 
     def create_file_explorer(self):
         """Creates the file explorer treeview and context menu."""
-        file_explorer_header = tk.Label(self.sidebar_frame, text="EXPLORADOR", bg='#282c34', fg='#abb2bf', font=("Segoe UI", 9, "bold"), anchor=tk.W, padx=5)
+        self.explorer_view = tk.Frame(self.sidebar_frame, bg='#282c34')
+        self.explorer_view.pack(fill=tk.BOTH, expand=True)
+        self.sidebar_view = "explorer"
+        file_explorer_header = tk.Label(self.explorer_view, text="EXPLORADOR", bg='#282c34', fg='#abb2bf', font=("Segoe UI", 9, "bold"), anchor=tk.W, padx=5)
         file_explorer_header.pack(fill=tk.X, pady=(0, 5))
 
         # Buttons for New File/Folder at the top of the explorer
-        explorer_buttons_frame = tk.Frame(self.sidebar_frame, bg='#282c34')
+        explorer_buttons_frame = tk.Frame(self.explorer_view, bg='#282c34')
         explorer_buttons_frame.pack(fill=tk.X, pady=(0, 5))
 
         new_file_icon = self.load_icon("new_file", size=(16,16)) # You'll need these icons
@@ -217,7 +3855,7 @@ class CodeEditor:
                   background=[('active', '#3e4451')])
 
 
-        self.tree = ttk.Treeview(self.sidebar_frame, show='tree', selectmode='browse',
+        self.tree = ttk.Treeview(self.explorer_view, show='tree', selectmode='browse',
                                  height=20) # No specific style name needed here as we configured "Treeview" directly
         self.tree.pack(fill=tk.BOTH, expand=True)
 
@@ -231,88 +3869,236 @@ class CodeEditor:
         self.tree.bind("<Button-3>", self.show_explorer_context_menu) # Right-click
         self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
         self.tree.bind("<Double-1>", self.open_file_from_explorer) # Double-click to open
+        self.tree.bind('<<TreeviewOpen>>', lambda event: self.on_folder_open(event)) # Looked up per call, so it can be timed
 
-        # Load an initial directory (e.g., current working directory)
-        self.open_folder(os.getcwd())
+        # Directories are listed on worker threads and streamed back through a queue
+        self.explorer_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="explorer")
+        self._explorer_queue = queue.Queue()
+        self._explorer_pending = collections.deque() # Batches taken off the queue, not yet inserted
+        self._explorer_loading = {} # Folder node -> its "Cargando…" placeholder
+        self._explorer_active = 0 # Directory listings not finished yet
+        self._explorer_drain_job = None
+        self.explorer_index = ExplorerIndex()
+        self._reveal_target = None # Path to select once its folders have been listed
+        # Loaded folders are watched, so external changes update the tree in place
+        self.watcher = DirectoryWatcher(self.master, self.explorer_pool, self._on_directory_changes)
 
 
     def open_folder(self, path):
         if not path: # Handle cancel dialog
             return
+        self._close_search_index()
+        self._close_symbol_index()
+        self.master.after(self.SYMBOL_INDEX_DELAY_MS, self._ensure_symbol_index)
+        self.project_files = None
         self.project_root = path
+        self.terminal_cwd = None
+        self.task_command = self._load_task_command()
         self.master.title(f"TkCode - {os.path.basename(path)}")
         self.populate_tree(self.project_root)
         self.status_bar_file_info_label.config(text=f"Carpeta: {os.path.basename(path)}")
+        self._open_journal(path)
 
     def populate_tree(self, root_path):
         """Populates the Treeview with files and folders."""
+        self.watcher.unwatch_all()
+        self.explorer_index.clear()
         for iid in self.tree.get_children():
             self.tree.delete(iid) # Clear existing items
 
         # root node for the project folder
         folder_name = os.path.basename(root_path)
-        root_node = self.tree.insert('', 'end', text=folder_name, open=True, values=[root_path])
+        root_node = self.tree.insert('', 'end', text=folder_name, open=True, values=[root_path, 'folder'])
+        self.explorer_index.add(root_path, root_node, 'folder').loaded = True
         self._populate_tree_recursive(root_node, root_path)
 
     def _populate_tree_recursive(self, parent_node, path):
-        for item in os.listdir(path):
-            item_path = os.path.join(path, item)
-            if os.path.isdir(item_path):
-                folder_node = self.tree.insert(parent_node, 'end', text=item, open=False, values=[item_path, 'folder'])
-                # Add a dummy child to enable the folder expansion icon
-                self.tree.insert(folder_node, 'end', text="dummy")
-                self.tree.item(folder_node, tags=('folder',)) # Tag for styling or context
-            elif os.path.isfile(item_path):
-                file_node = self.tree.insert(parent_node, 'end', text=item, values=[item_path, 'file'])
-                self.tree.item(file_node, tags=('file',)) # Tag for styling or context
-        self.tree.bind('<<TreeviewOpen>>', self.on_folder_open)
-
-    def on_folder_open(self, event):
-        """Dynamically loads subfolders when a folder is expanded."""
-        item_id = self.tree.focus()
-        item_data = self.tree.item(item_id, "values")
-        if not item_data or item_data[1] != 'folder':
+        """Lists path on a worker thread; entries are added to parent_node as they arrive."""
+        placeholder = self.tree.insert(parent_node, 'end', text="Cargando…", tags=('loading',))
+        self._explorer_loading[parent_node] = placeholder
+        self._explorer_active += 1
+        self.explorer_pool.submit(self._scan_directory, parent_node, path)
+        if self._explorer_drain_job is None:
+            self._explorer_drain_job = self.master.after(self.EXPLORER_TICK_MS, self._drain_explorer_queue)
+
+    def _scan_directory(self, node, path):
+        # Runs on a worker thread: never touch Tk here, only the queue.
+        # DirEntry.is_dir()/is_file() use the d_type cached by scandir, so no extra stat calls.
+        # The snapshot of what was listed lets the watcher diff later changes against it.
+        batch = []
+        snapshot = {}
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            kind = 'folder'
+                        elif entry.is_file():
+                            kind = 'file'
+                        else:
+                            continue
+                        snapshot[entry.name] = (entry.inode(), kind)
+                    except OSError:
+                        continue
+                    batch.append((entry.name, entry.path, kind))
+                    if len(batch) >= self.EXPLORER_BATCH:
+                        self._explorer_queue.put((node, path, batch, None, None))
+                        batch = []
+        except OSError as e:
+            self._explorer_queue.put((node, path, batch, e, None))
             return
+        self._explorer_queue.put((node, path, batch, None, snapshot))
+
+    def _drain_explorer_queue(self):
+        """Inserts queued directory entries, at most EXPLORER_INSERTS_PER_TICK per call."""
+        self._explorer_drain_job = None
+        budget = self.EXPLORER_INSERTS_PER_TICK
+        while budget > 0:
+            if not self._explorer_pending:
+                try:
+                    self._explorer_pending.append(self._explorer_queue.get_nowait())
+                except queue.Empty:
+                    break
+            node, path, entries, error, snapshot = self._explorer_pending.popleft()
+            done = error is not None or snapshot is not None
+            if not self.tree.exists(node): # The tree was repopulated meanwhile
+                if done:
+                    self._explorer_active -= 1
+                continue
+            if len(entries) > budget:
+                self._explorer_pending.appendleft((node, path, entries[budget:], error, snapshot))
+                entries, done = entries[:budget], False
+            budget -= len(entries)
+            for name, item_path, kind in entries:
+                self._insert_explorer_item(node, name, item_path, kind)
+            if done and snapshot is not None:
+                self.watcher.watch(path, node, snapshot)
+                if self._reveal_target is not None:
+                    self.reveal_in_explorer(self._reveal_target)
+            if entries or done:
+                placeholder = self._explorer_loading.pop(node, None)
+                if placeholder is not None and self.tree.exists(placeholder):
+                    self.tree.delete(placeholder)
+            if done:
+                self._explorer_active -= 1
+                if error is not None:
+                    self.status_bar_file_info_label.config(text=f"No se pudo leer la carpeta: {error}")
+
+        if self._explorer_active or self._explorer_pending or not self._explorer_queue.empty():
+            self._explorer_drain_job = self.master.after(self.EXPLORER_TICK_MS, self._drain_explorer_queue)
+
+    def _insert_explorer_item(self, parent_node, name, item_path, kind):
+        item = self.tree.insert(parent_node, 'end', text=name, open=False, values=[item_path, kind], tags=(kind,))
+        entry = self.explorer_index.add(item_path, item, kind, os.path.dirname(item_path))
+        if kind == 'folder':
+            # Add a dummy child to enable the folder expansion icon
+            entry.dummy = self.tree.insert(item, 'end', text="dummy")
+        return item
+
+    def _delete_explorer_item_node(self, item_path):
+        node = self.explorer_index.node(item_path)
+        if node is not None and self.tree.exists(node):
+            self.tree.delete(node)
+        self.explorer_index.remove(item_path)
+
+    def _on_directory_changes(self, node, path, added, removed, renamed):
+        """Applies a watched directory's changes as minimal Treeview edits."""
+        if not self.tree.exists(node):
+            self.watcher.unwatch(path)
+            return
+        for name, kind in removed:
+            item_path = os.path.join(path, name)
+            self._delete_explorer_item_node(item_path)
+            if kind == 'folder':
+                self.watcher.unwatch(item_path)
+        for old_name, new_name, kind in renamed:
+            # Renaming in place keeps the node's expansion state and selection
+            old_path, new_path = os.path.join(path, old_name), os.path.join(path, new_name)
+            if self.explorer_index.get(old_path) is None:
+                added.append((new_name, kind))
+                continue
+            for entry in self.explorer_index.rename(old_path, new_path):
+                self.tree.item(entry.iid, values=[entry.path, entry.kind])
+            self.tree.item(self.explorer_index.node(new_path), text=new_name)
+            if kind == 'folder':
+                self.watcher.rename(old_path, new_path)
+        for name, kind in added:
+            item_path = os.path.join(path, name)
+            if self.explorer_index.get(item_path) is None:
+                self._insert_explorer_item(node, name, item_path, kind)
+        self.explorer_index.invalidate(path)
+
+    def reveal_in_explorer(self, path):
+        """Selects path in the tree, listing its ancestor folders first if needed."""
+        entry = self.explorer_index.get(path)
+        if entry is not None:
+            self._reveal_target = None
+            self.tree.see(entry.iid)
+            self.tree.selection_set(entry.iid)
+            self.tree.focus(entry.iid)
+            return
+        root = self.project_root
+        if not root or os.path.relpath(path, root).startswith(os.pardir):
+            self.status_bar_file_info_label.config(text="El archivo no está dentro de la carpeta abierta.")
+            return
+        # Open the deepest folder already in the tree; this resumes when its listing arrives
+        self._reveal_target = path
+        folder = os.path.dirname(path)
+        while folder != root and self.explorer_index.get(folder) is None:
+            folder = os.path.dirname(folder)
+        folder_entry = self.explorer_index.get(folder)
+        if folder_entry is None:
+            self._reveal_target = None
+            return
+        self.tree.item(folder_entry.iid, open=True)
+        if not folder_entry.loaded:
+            self._load_folder(folder_entry)
+        elif folder != os.path.dirname(path):
+            self._reveal_target = None # Listed, but the next folder down is gone
 
-        folder_path = item_data[0]
-        # Remove dummy child
-        if self.tree.get_children(item_id) and self.tree.item(self.tree.get_children(item_id)[0])['text'] == "dummy":
-            self.tree.delete(self.tree.get_children(item_id)[0])
-        else:
-            return # Already loaded or no dummy child
+    def reveal_current_file(self):
+        if self.current_file:
+            self.reveal_in_explorer(self.current_file)
 
-        # Load actual children
-        for item in os.listdir(folder_path):
-            item_path = os.path.join(folder_path, item)
-            if os.path.isdir(item_path):
-                new_folder_node = self.tree.insert(item_id, 'end', text=item, open=False, values=[item_path, 'folder'])
-                self.tree.insert(new_folder_node, 'end', text="dummy") # Add new dummy for its children
-                self.tree.item(new_folder_node, tags=('folder',))
-            elif os.path.isfile(item_path):
-                new_file_node = self.tree.insert(item_id, 'end', text=item, values=[item_path, 'file'])
-                self.tree.item(new_file_node, tags=('file',))
+    def on_folder_open(self, event):
+        """Dynamically loads subfolders when a folder is expanded."""
+        entry = self.explorer_index.by_node(self.tree.focus())
+        if entry is None or entry.kind != 'folder' or entry.loaded:
+            return # Not a folder, or already loaded
+        self._load_folder(entry)
+
+    def _load_folder(self, entry):
+        # Remove dummy child and load actual children in the background
+        entry.loaded = True
+        if entry.dummy is not None and self.tree.exists(entry.dummy):
+            self.tree.delete(entry.dummy)
+        entry.dummy = None
+        self._populate_tree_recursive(entry.iid, entry.path)
 
     def show_explorer_context_menu(self, event):
         """Displays the context menu for the file explorer."""
         # Identify the item under the cursor, so context menu actions apply to it
-        self.tree.identify_row(event.y)
+        row = self.tree.identify_row(event.y)
+        if row:
+            self.tree.selection_set(row)
+            self.tree.focus(row)
         try:
             self.explorer_context_menu.tk_popup(event.x_root, event.y_root)
         finally:
             self.explorer_context_menu.grab_release()
 
+    def _selected_folder(self):
+        """Folder the explorer actions apply to: the selected folder or the selected file's folder."""
+        entry = self.explorer_index.by_node(self.tree.focus())
+        if entry is None:
+            return self.project_root # Default to project root if nothing is selected
+        if entry.kind == 'file': # If a file is selected, use its parent directory
+            return os.path.dirname(entry.path)
+        return entry.path # If a folder is selected, use that folder
+
     def create_new_file(self):
-        selected_item = self.tree.focus()
-        base_path = self.project_root # Default to project root if nothing is selected
-
-        if selected_item:
-            item_data = self.tree.item(selected_item, "values")
-            if item_data:
-                if item_data[1] == 'file': # If a file is selected, use its parent directory
-                    base_path = os.path.dirname(item_data[0])
-                else: # If a folder is selected, use that folder
-                    base_path = item_data[0]
-        
+        base_path = self._selected_folder()
+
         if not base_path or not os.path.isdir(base_path):
             messagebox.showwarning("Advertencia", "No se puede crear un archivo. Por favor, abre una carpeta o selecciona una carpeta válida en el explorador.")
             return
@@ -323,22 +4109,13 @@ class CodeEditor:
             try:
                 with open(new_file_path, 'w') as f:
                     f.write("") # Create empty file
-                self.populate_tree(self.project_root) # Refresh tree
+                self.watcher.check_now(base_path) # Refresh just that folder
                 self.status_bar_file_info_label.config(text=f"Archivo '{new_file_name}' creado.")
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo crear el archivo: {e}")
 
     def create_new_folder(self):
-        selected_item = self.tree.focus()
-        base_path = self.project_root # Default to project root if nothing is selected
-
-        if selected_item:
-            item_data = self.tree.item(selected_item, "values")
-            if item_data:
-                if item_data[1] == 'file': # If a file is selected, use its parent directory
-                    base_path = os.path.dirname(item_data[0])
-                else: # If a folder is selected, use that folder
-                    base_path = item_data[0]
+        base_path = self._selected_folder()
 
         if not base_path or not os.path.isdir(base_path):
             messagebox.showwarning("Advertencia", "No se puede crear una carpeta. Por favor, abre una carpeta o selecciona una carpeta válida en el explorador.")
@@ -349,7 +4126,7 @@ class CodeEditor:
             new_folder_path = os.path.join(base_path, new_folder_name)
             try:
                 os.makedirs(new_folder_path)
-                self.populate_tree(self.project_root) # Refresh tree
+                self.watcher.check_now(base_path) # Refresh just that folder
                 self.status_bar_file_info_label.config(text=f"Carpeta '{new_folder_name}' creada.")
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo crear la carpeta: {e}")
@@ -360,13 +4137,15 @@ class CodeEditor:
             messagebox.showinfo("Eliminar", "Selecciona un archivo o carpeta para eliminar.")
             return
 
-        item_data = self.tree.item(selected_item, "values")
-        if not item_data: # If selected item is the root of the treeview (e.g. "my_project_folder")
+        entry = self.explorer_index.by_node(selected_item)
+        if entry is None:
+            return
+        if entry.parent is None: # If selected item is the root of the treeview (e.g. "my_project_folder")
             messagebox.showwarning("Advertencia", "No puedes eliminar la raíz del proyecto directamente.")
             return
 
-        item_path = item_data[0]
-        item_type = item_data[1]
+        item_path = entry.path
+        item_type = entry.kind
         item_name = os.path.basename(item_path)
 
         if messagebox.askyesno("Confirmar Eliminación", f"¿Estás seguro de que quieres eliminar '{item_name}' ({item_type})? Esta acción es irreversible."):
@@ -376,7 +4155,7 @@ class CodeEditor:
                 elif item_type == 'folder':
                     # Use shutil.rmtree for non-empty directories, be cautious!
                     shutil.rmtree(item_path)
-                self.populate_tree(self.project_root) # Refresh tree
+                self.watcher.check_now(os.path.dirname(item_path)) # Refresh just the parent folder
                 self.status_bar_file_info_label.config(text=f"'{item_name}' eliminado.")
             except OSError as e:
                 messagebox.showerror("Error de Eliminación", f"No se pudo eliminar '{item_name}': {e}")
@@ -385,13 +4164,8 @@ class CodeEditor:
 
 
     def on_tree_select(self, event):
-        selected_item = self.tree.focus()
-        if selected_item:
-            item_data = self.tree.item(selected_item, "values")
-            if item_data:
-                # Update status bar or show info about selected item
-                # No need to update status bar on select, only on opening
-                pass
+        # No need to update status bar on select, only on opening
+        pass
 
 
     def open_file_from_explorer(self, event):
@@ -399,28 +4173,1324 @@ class CodeEditor:
         if not selected_item:
             return
 
-        item_data = self.tree.item(selected_item, "values")
-        if item_data and item_data[1] == 'file':
-            filepath = item_data[0]
-            if os.path.exists(filepath) and os.path.isfile(filepath):
+        entry = self.explorer_index.by_node(selected_item)
+        if entry is not None and entry.kind == 'file':
+            filepath = entry.path
+            if os.path.isfile(filepath):
                 self.open_file_by_path(filepath)
             else:
                 messagebox.showerror("Error", "El archivo no existe o no es un archivo válido.")
 
     def open_file_by_path(self, filepath):
-        self.text_area.delete(1.0, tk.END)
-        try:
-            with open(filepath, "r", encoding="utf-8") as input_file:
-                text = input_file.read()
-                self.text_area.insert(tk.END, text)
-            self.current_file = filepath
-            self.master.title(f"TkCode - {os.path.basename(filepath)}")
-            self.status_bar_file_info_label.config(text=f"Archivo: {os.path.basename(filepath)}") # Update file info on status bar
-            self.update_status_bar() # Update other status bar elements
-            self.update_line_numbers()
-            self.highlight_syntax()
+        doc = self._find_document(filepath)
+        if doc is not None:
+            self.activate_document(doc) # Already open: just switch to its tab
+            return
+        try:
+            huge = os.path.getsize(filepath) > self.HUGE_FILE_THRESHOLD
+        except OSError as e:
+            messagebox.showerror("Error al abrir archivo", f"No se pudo abrir el archivo:\n{e}")
+            return
+        if huge:
+            self.open_file_in_viewer(filepath)
+            return
+        self._load_document(self._blank_document(), filepath)
+
+    def _load_document(self, doc, filepath):
+        """Streams filepath into doc's widget; doc must be the active document."""
+        try:
+            loader = StreamingFileLoader(doc.text, filepath)
+        except Exception as e:
+            if doc.restore_view: # Reloading an evicted tab: its file is gone, so is the tab
+                doc.restore_view = False
+                doc.path = None
+            self._discard_blank(doc)
+            messagebox.showerror("Error al abrir archivo", f"No se pudo abrir el archivo:\n{e}")
+            return
+
+        doc.large_file_mode = loader.size > self.LARGE_FILE_THRESHOLD
+        doc.text.config(state="normal", undo=False) # Loading is not an undoable edit
+        doc.text.delete(1.0, tk.END)
+        self._attach_buffer(doc)
+        doc.path = filepath
+        doc.highlighter.set_grammar(PLAIN_TEXT if doc.large_file_mode else grammar_for_path(filepath))
+        self.master.title(f"TkCode - {doc.name()}")
+        doc.loader = loader
+        self._update_tabs()
+        loader.start(lambda done, total: self._on_load_progress(doc, done, total),
+                     lambda: self._on_load_done(doc), lambda error: self._on_load_error(doc, error))
+
+    def open_file_in_viewer(self, filepath=None):
+        """Shows a file read-only through a memory map, materializing only the visible lines."""
+        if filepath is None:
+            filepath = filedialog.askopenfilename(title="Abrir en visor de solo lectura")
+            if not filepath:
+                return
+        doc = self._find_document(filepath)
+        if doc is not None and doc.viewer is not None:
+            self.activate_document(doc)
+            return
+        doc = self._blank_document()
+        try:
+            viewer = HugeFileViewer(doc.text, doc.text.vbar, filepath)
         except Exception as e:
+            self._discard_blank(doc)
             messagebox.showerror("Error al abrir archivo", f"No se pudo abrir el archivo:\n{e}")
+            return
+        doc.viewer = viewer
+        doc.path = filepath
+        doc.large_file_mode = True
+        self._attach_buffer(doc)
+        doc.text.config(undo=False)
+        doc.highlighter.set_grammar(PLAIN_TEXT)
+        doc.text.vbar.config(command=viewer.scrollbar_command)
+        self.master.title(f"TkCode - {doc.name()} [solo lectura]")
+        self._update_tabs()
+        viewer.open(lambda status: self._on_viewer_status(doc, status))
+        self.scheduler.mark_dirty("gutter")
+
+    def _on_viewer_status(self, doc, status):
+        if doc is self.doc:
+            self.status_bar_file_info_label.config(text=f"Visor: {doc.name()} · {status}")
+
+    def close_viewer(self, doc=None):
+        doc = doc or self.doc
+        if doc.viewer is None:
+            return
+        doc.viewer.close()
+        doc.viewer = None
+        if doc.text is not None:
+            doc.text.vbar.config(command=doc.text.yview)
+            doc.text.config(state="normal", undo=True)
+            doc.text.delete(1.0, tk.END)
+        doc.large_file_mode = False
+        if doc.text is not None:
+            self._attach_buffer(doc)
+
+    def goto_line(self, event=None):
+        line = simpledialog.askinteger("Ir a línea", "Número de línea:", parent=self.master, minvalue=1)
+        if line is None:
+            return
+        if self.viewer is not None:
+            self.viewer.goto_line(line)
+        else:
+            self.text_area.mark_set(tk.INSERT, f"{line}.0")
+            self.text_area.see(tk.INSERT)
+        self.scheduler.mark_dirty("status")
+        return "break"
+
+    def search_in_viewer(self, event=None):
+        """Byte search forward from the cursor in the huge file viewer."""
+        if self.viewer is None:
+            self.status_bar_file_info_label.config(text="La búsqueda por bytes solo está disponible en el visor.")
+            return
+        needle = simpledialog.askstring("Buscar en visor", "Texto a buscar:", parent=self.master)
+        if not needle:
+            return
+        encoded = needle.encode("utf-8")
+
+        def show(result):
+            if result is None:
+                self.status_bar_file_info_label.config(text=f"No se encontró '{needle}'")
+                return
+            line, column, offset = result
+            start = self.viewer.goto_line(line, column)
+            self.text_area.tag_remove("sel", "1.0", tk.END)
+            self.text_area.tag_add("sel", start, f"{start}+{len(needle)}c")
+            self.status_bar_file_info_label.config(text=f"'{needle}' en línea {line}, byte {offset}")
+
+        self.viewer.search(encoded, show)
+
+    def create_find_bar(self):
+        """Creates the find/replace bar above the editor (built on first use)."""
+        self.find_bar = tk.Frame(self.editor_area_frame, bg='#252526')
+        find_row = tk.Frame(self.find_bar, bg='#252526')
+        find_row.pack(fill=tk.X, padx=5, pady=(4, 2))
+        self.find_entry = tk.Entry(find_row, bg='#3c3c3c', fg='#d4d4d4', insertbackground='white',
+                                   relief=tk.FLAT, font=("Consolas", 10), width=40)
+        self.find_entry.pack(side=tk.LEFT, padx=(0, 4))
+        self.find_regex = tk.BooleanVar(value=False)
+        self.find_case = tk.BooleanVar(value=False)
+        for label, variable in ((".*", self.find_regex), ("Aa", self.find_case)):
+            tk.Checkbutton(find_row, text=label, variable=variable, bg='#252526', fg='#abb2bf',
+                           selectcolor='#3c3c3c', activebackground='#252526', activeforeground='white',
+                           command=lambda: self.scheduler.mark_dirty("find", 0)).pack(side=tk.LEFT)
+        self.find_count_label = tk.Label(find_row, text="", bg='#252526', fg='#abb2bf', width=16, anchor=tk.W)
+        self.find_count_label.pack(side=tk.LEFT, padx=4)
+        for label, command in (("↑", self.find_previous), ("↓", self.find_next), ("✕", self.close_find_bar)):
+            tk.Button(find_row, text=label, command=command, bg='#252526', fg='#abb2bf', bd=0,
+                      activebackground='#3e4451', relief=tk.FLAT).pack(side=tk.LEFT, padx=2)
+
+        self.replace_row = tk.Frame(self.find_bar, bg='#252526')
+        self.replace_entry = tk.Entry(self.replace_row, bg='#3c3c3c', fg='#d4d4d4', insertbackground='white',
+                                      relief=tk.FLAT, font=("Consolas", 10), width=40)
+        self.replace_entry.pack(side=tk.LEFT, padx=(0, 4))
+        for label, command in (("Reemplazar", self.replace_current), ("Reemplazar todo", self.replace_all)):
+            tk.Button(self.replace_row, text=label, command=command, bg='#3e4451', fg='#abb2bf', bd=0,
+                      activebackground='#528bff', relief=tk.FLAT, padx=6).pack(side=tk.LEFT, padx=2)
+
+        self.find_entry.bind("<KeyRelease>", self._on_find_query_key)
+        self.find_entry.bind("<Return>", self.find_next)
+        self.find_entry.bind("<Shift-Return>", self.find_previous)
+        self.replace_entry.bind("<Return>", self.replace_current)
+        for entry in (self.find_entry, self.replace_entry):
+            entry.bind("<Escape>", self.close_find_bar) # Before the window's Escape (cancel load)
+
+    def open_find_bar(self, event=None, replace=False):
+        """Ctrl+F / Ctrl+H: shows the find (and replace) bar, seeded with the selection."""
+        if self.viewer is not None:
+            return self.search_in_viewer()
+        if self.find_bar is None:
+            self.create_find_bar()
+        if not self.find_visible:
+            self.find_bar.pack(side=tk.TOP, fill=tk.X, after=self.tab_bar)
+            self.find_visible = True
+        if replace:
+            self.replace_row.pack(fill=tk.X, padx=5, pady=(0, 4))
+        else:
+            self.replace_row.pack_forget()
+        try:
+            selected = self.text_area.get("sel.first", "sel.last")
+        except tk.TclError:
+            selected = ""
+        if selected and "\n" not in selected:
+            self.find_entry.delete(0, tk.END)
+            self.find_entry.insert(0, selected)
+        self.find_entry.focus_set()
+        self.find_entry.select_range(0, tk.END)
+        self.scheduler.mark_dirty("find", 0)
+        return "break"
+
+    def close_find_bar(self, event=None):
+        if self.find_visible:
+            self.find_bar.pack_forget()
+            self.find_visible = False
+            self._clear_find()
+            if self.doc.text is not None:
+                self.doc.text.focus_set()
+        return "break"
+
+    def _clear_find(self):
+        if self._find_doc is not None and self._find_doc.text is not None:
+            self._find_doc.text.tag_remove("find_match", "1.0", tk.END)
+            self._find_doc.text.tag_remove("find_current", "1.0", tk.END)
+        self.find = self._find_doc = self._find_query = self._find_pending = None
+
+    def _on_find_query_key(self, event=None):
+        if event is None or event.keysym not in ("Return", "Escape"):
+            self.scheduler.mark_dirty("find")
+
+    def _start_find(self):
+        """Searches the active document for the bar's query on a worker thread (also after a tab switch)."""
+        if not self.find_visible:
+            return
+        doc = self.doc
+        query = (self.find_entry.get(), self.find_regex.get(), self.find_case.get())
+        if self.find is not None and doc is self._find_doc and query == self._find_query:
+            if self.find.buffer is doc.buffer:
+                return # Still current: edits keep it up to date
+        self._clear_find()
+        if not query[0]:
+            self.find_count_label.config(text="")
+            return
+        if doc.buffer is None or doc.loader is not None:
+            self.find_count_label.config(text="No disponible")
+            return
+        try:
+            pattern = re.compile(query[0] if query[1] else re.escape(query[0]),
+                                 re.MULTILINE | (0 if query[2] else re.IGNORECASE))
+        except re.error:
+            self.find_count_label.config(text="Regex no válida")
+            return
+        self.find = BufferSearch(doc.buffer, pattern)
+        self._find_doc, self._find_query = doc, query
+        self.find_count_label.config(text="Buscando…")
+        self._search_snapshot(self.find)
+
+    def _search_snapshot(self, search):
+        snapshot = search.buffer.snapshot()
+        threading.Thread(target=lambda: self._find_results.put(
+            (search, snapshot.version, _find_all(snapshot.text(), search.pattern))), daemon=True).start()
+        if self._find_poll_job is None:
+            self._find_poll_job = self.master.after(self.TASK_TICK_MS, self._poll_find)
+
+    def _poll_find(self):
+        self._find_poll_job = None
+        while True:
+            try:
+                search, version, matches = self._find_results.get_nowait()
+            except queue.Empty:
+                break
+            if search is not self.find:
+                continue # Another query or document since
+            if version != search.buffer.version:
+                self._search_snapshot(search) # Edited while searching
+                continue
+            search.matches, search.version = matches, version
+            self._update_find_count()
+            self.scheduler.mark_dirty("find_tags", 0)
+            action, self._find_pending = self._find_pending, None
+            if action is not None:
+                action() # Enter (or a replace) pressed before the search had finished
+        if self.find is not None and self.find.version is None:
+            self._find_poll_job = self.master.after(self.TASK_TICK_MS, self._poll_find)
+
+    def _current_match(self):
+        """Index of the match at (or else after) the cursor, wrapping around; None without matches."""
+        matches = self.find.matches if self.find is not None else []
+        if not matches:
+            return None
+        line, column = map(int, self.text_area.index("insert").split("."))
+        i = self.find.index_at(line, column)
+        if i > 0 and matches[i - 1][2:] >= (line, column):
+            i -= 1 # The cursor is inside (or at the end of) the previous match
+        return i % len(matches)
+
+    def _update_find_count(self):
+        if self.find is None or self.find.version is None:
+            return
+        current = self._current_match()
+        if current is None:
+            self.find_count_label.config(text="Sin resultados")
+        else:
+            self.find_count_label.config(text=f"{current + 1} de {len(self.find.matches)}")
+
+    def _paint_find_matches(self):
+        """Tags the matches in the viewport with one tag add call (plus the current match)."""
+        search, doc = self.find, self._find_doc
+        if search is None or search.version is None or doc is not self.doc:
+            return
+        first, last = doc.highlighter.visible_range()
+        matches = search.matches
+        ranges = []
+        for i in range(search.index_at(first + 1, 0), bisect.bisect_left(matches, (last + 2,))):
+            line, column, end_line, end_column = matches[i]
+            ranges += (f"{line}.{column}", f"{end_line}.{end_column}")
+        widget, call = doc.text._w, doc.text.tk.call
+        call(widget, "tag", "remove", "find_match", "1.0", "end")
+        call(widget, "tag", "remove", "find_current", "1.0", "end")
+        if ranges:
+            call(widget, "tag", "add", "find_match", *ranges)
+        current = self._current_match()
+        if current is not None:
+            line, column, end_line, end_column = matches[current]
+            call(widget, "tag", "add", "find_current", f"{line}.{column}", f"{end_line}.{end_column}")
+        self._update_find_count()
+
+    def _select_match(self, i):
+        line, column, end_line, end_column = self.find.matches[i]
+        text = self.text_area
+        text.tag_remove("sel", "1.0", tk.END)
+        text.tag_add("sel", f"{line}.{column}", f"{end_line}.{end_column}")
+        text.mark_set(tk.INSERT, f"{end_line}.{end_column}")
+        text.see(f"{line}.{column}")
+        self.scheduler.mark_dirty("find_tags", 0)
+        self.scheduler.mark_dirty("status")
+
+    def _ready_find(self, action):
+        """The up-to-date search of the active document, or None.
+
+        While the search is still running, action is called again once it has finished.
+        """
+        if not self.find_visible:
+            self.open_find_bar()
+        self.scheduler.run_now("find")
+        if self.find is not None and self.find.version is None:
+            self._find_pending = action
+            return None
+        if self.find is None or not self.find.matches:
+            return None
+        return self.find
+
+    def find_next(self, event=None):
+        """Enter / F3: selects the next match after the cursor (or the selection)."""
+        search = self._ready_find(self.find_next)
+        if search is not None:
+            line, column = map(int, self.text_area.index("insert").split("."))
+            self._select_match(search.index_at(line, column) % len(search.matches))
+        return "break"
+
+    def find_previous(self, event=None):
+        """Shift+Enter / Shift+F3: selects the match before the selection (or the cursor)."""
+        search = self._ready_find(self.find_previous)
+        if search is not None:
+            try:
+                start = self.text_area.index("sel.first")
+            except tk.TclError:
+                start = self.text_area.index("insert")
+            line, column = map(int, start.split("."))
+            self._select_match((search.index_at(line, column) - 1) % len(search.matches))
+        return "break"
+
+    def _replacement(self, match):
+        return match.expand(self.replace_entry.get()) if self._find_query[1] else self.replace_entry.get()
+
+    def replace_current(self, event=None):
+        """Replaces the selected match (selecting the next one first if none is) as one edit."""
+        search = self._ready_find(self.replace_current)
+        if search is None:
+            return "break"
+        text = self.text_area
+        i = self._current_match()
+        line, column, end_line, end_column = search.matches[i]
+        try:
+            selected = (text.index("sel.first"), text.index("sel.last")) == (f"{line}.{column}", f"{end_line}.{end_column}")
+        except tk.TclError:
+            selected = False
+        if not selected:
+            self._select_match(i)
+            return "break"
+        # Match again in context, so lookarounds and groups see the same text as the search
+        source = "\n".join(search.buffer.lines(max(line - 1, 1), min(end_line + 1, search.buffer.line_count)))
+        offset = len(search.buffer.line(line - 1)) + 1 + column if line > 1 else column
+        match = search.pattern.match(source, offset)
+        if match is None:
+            return "break"
+        text.replace(f"{line}.{column}", f"{end_line}.{end_column}", self._replacement(match))
+        if search.matches:
+            self._select_match(search.index_at(*map(int, text.index("insert").split("."))) % len(search.matches))
+        self._update_find_count()
+        return "break"
+
+    def replace_all(self, event=None):
+        """Replaces every match on a worker thread, then applies the result as one edit and one undo step."""
+        search = self._ready_find(self.replace_all)
+        if search is None:
+            return "break"
+        doc, snapshot = self._find_doc, search.buffer.snapshot()
+        replacement, is_regex = self.replace_entry.get(), self._find_query[1]
+        if is_regex:
+            try:
+                search.pattern.sub(replacement, "") # Checks the template (e.g. unknown groups) up front
+            except (re.error, IndexError):
+                self.find_count_label.config(text="Reemplazo no válido")
+                return "break"
+        self.find_count_label.config(text="Reemplazando…")
+
+        def work():
+            try:
+                result = _replace_all(snapshot.text(), search.pattern, replacement, is_regex)
+            except (re.error, IndexError) as e:
+                result = e
+            self.master.after(0, lambda: self._apply_replace_all(doc, search, snapshot.version, result))
+        threading.Thread(target=work, daemon=True).start()
+        return "break"
+
+    def _apply_replace_all(self, doc, search, version, result):
+        if search is not self.find or doc.buffer is not search.buffer:
+            return
+        if doc.buffer.version != version:
+            self.replace_all() # Edited meanwhile: start over from the current text
+            return
+        if isinstance(result, Exception) or result is None:
+            self.find_count_label.config(text="Reemplazo no válido" if result else "Sin resultados")
+            return
+        first_line, last_line, lines, count = result
+        text = doc.text
+        cursor = text.index(tk.INSERT)
+        search.version = None # Searched again below rather than rescanning every replaced line here
+        text.config(autoseparators=False)
+        text.edit_separator()
+        text.replace(f"{first_line}.0", f"{last_line}.end", lines)
+        text.edit_separator()
+        text.config(autoseparators=True)
+        text.mark_set(tk.INSERT, cursor)
+        self.status_bar_file_info_label.config(text=f"{count} reemplazos")
+        self._search_snapshot(search)
+
+    def _on_load_progress(self, doc, done, total):
+        if doc is not self.doc:
+            return
+        percent = 100 * done // total if total else 100
+        self.status_bar_file_info_label.config(
+            text=f"Cargando {os.path.basename(doc.loader.path)}… {percent}% (Esc para cancelar)")
+        self.scheduler.mark_dirty("gutter")
+
+    def _on_load_done(self, doc):
+        doc.journal_digest = doc.loader.hash.hexdigest()
+        # Saving the text as loaded can be skipped, as after a save
+        doc.saved = (doc.path, doc.journal_digest, (doc.loader.stat.st_size, doc.loader.stat.st_mtime_ns))
+        doc.loader = None
+        self._journal_record(doc, ["base", doc.journal_id, doc.path, None, doc.journal_digest]) # Edits now apply to the file
+        doc.text.config(state="normal", undo=not doc.large_file_mode)
+        doc.text.edit_reset()
+        doc.text.edit_modified(False)
+        if doc.restore_view: # Reloaded after eviction: back to where the user was
+            doc.restore_view = False
+            doc.text.mark_set(tk.INSERT, doc.cursor)
+            doc.text.yview_moveto(doc.yview)
+        else:
+            doc.text.mark_set(tk.INSERT, "1.0")
+            doc.text.see("1.0")
+        self._update_tabs()
+        if doc is not self.doc:
+            return
+        self.update_status_bar() # Update other status bar elements
+        if doc.large_file_mode:
+            self.status_bar_file_info_label.config(text=f"Archivo: {doc.name()} (modo archivo grande: sin resaltado ni deshacer)")
+        else:
+            self.status_bar_file_info_label.config(text=f"Archivo: {doc.name()}") # Update file info on status bar
+        self.update_line_numbers()
+        self.scheduler.run_now("highlight")
+        self.scheduler.mark_dirty("diagnostics", 0)
+        self.scheduler.mark_dirty("symbols", 0)
+        self.scheduler.mark_dirty("words", 0)
+        if doc.pending_goto is not None:
+            self._apply_pending_goto(doc)
+
+    def _on_load_error(self, doc, error):
+        self._abort_file_load(doc)
+        messagebox.showerror("Error al abrir archivo", f"No se pudo abrir el archivo:\n{error}")
+
+    def cancel_file_load(self, event=None):
+        """Stops the active document's load and leaves it as an empty, untitled buffer."""
+        if self.loader is None:
+            return
+        self.loader.cancel()
+        self._abort_file_load(self.doc)
+        self.status_bar_file_info_label.config(text="Carga cancelada")
+
+    def _abort_file_load(self, doc):
+        # A partially loaded buffer must never be saved over the original file
+        doc.loader = None
+        doc.pending_goto = None
+        doc.restore_view = False
+        doc.text.config(state="normal", undo=True)
+        doc.text.delete(1.0, tk.END)
+        doc.text.edit_reset()
+        doc.text.edit_modified(False)
+        doc.path = None
+        doc.large_file_mode = False
+        self._attach_buffer(doc)
+        doc.highlighter.set_grammar(grammar_for_path(None))
+        self._update_tabs()
+        if doc is self.doc:
+            self.master.title("TkCode - Sin título")
+            self.update_line_numbers()
+
+    def _create_document(self, path):
+        doc = Document(path)
+        doc.journal_id = next(self._journal_ids)
+        self.documents.append(doc)
+        return doc
+
+    def _create_text_widget(self, doc):
+        doc.text = scrolledtext.ScrolledText(
+            self.editor_area_frame,
+            wrap='none',
+            bg='#21252b',
+            fg='#abb2bf',
+            insertbackground='#528bff',
+            selectbackground='#3a3f4a',
+            font=("Consolas", 12),
+            undo=True,
+            autoseparators=True,
+            maxundo=-1
+        )
+        # Every scroll (scrollbar, wheel, keyboard, see()) reports through yscrollcommand
+        doc.text.config(yscrollcommand=lambda first, last: self.on_vertical_scroll(doc, first, last))
+
+        doc.text.tag_configure("keyword", foreground="#c678dd")
+        doc.text.tag_configure("string", foreground="#98c379")
+        doc.text.tag_configure("comment", foreground="#5c6370")
+        doc.text.tag_configure("function", foreground="#61afef")
+        doc.text.tag_configure("number", foreground="#d19a66")
+        doc.text.tag_configure("operator", foreground="#c678dd")
+        for severity, color in (("error", '#f14c4c'), ("warning", '#cca700')):
+            try:
+                doc.text.tag_configure("diagnostic_" + severity, underline=True, underlinefg=color)
+            except tk.TclError: # Tk < 8.6.11 cannot colour underlines
+                doc.text.tag_configure("diagnostic_" + severity, underline=True)
+        doc.text.tag_configure("find_match", background='#613a1d')
+        doc.text.tag_configure("find_current", background='#9e6a03')
+        doc.text.tag_raise("sel")
+
+        # Syntax highlighting follows every edit made to the widget (typing, paste, undo...)
+        doc.highlighter = IncrementalHighlighter(doc.text, grammar_for_path(doc.path))
+        self._install_edit_hook(doc)
+        self._attach_buffer(doc)
+        self.perf.watch(doc.text)
+
+        doc.text.bind("<KeyRelease>", self.on_key_release)
+        doc.text.bind("<Configure>", lambda event: self.scheduler.mark_dirty("gutter"))
+        doc.text.bind("<<Modified>>", lambda event: self._update_tabs())
+        doc.text.bind("<Control-p>", self.quick_open) # Before the Text class binding (cursor up)
+        doc.text.bind("<Control-t>", self.goto_symbol_in_project) # Text class: transpose characters
+        doc.text.bind("<Control-f>", self.open_find_bar) # Text class: cursor right
+        doc.text.bind("<Control-h>", lambda event: self.open_find_bar(replace=True)) # Text class: backspace
+        # While completions are shown these keys drive the list instead of the text
+        doc.text.bind("<Control-space>", lambda event: self.update_completion(force=True) or "break")
+        doc.text.bind("<Down>", lambda event: self._move_completion(1))
+        doc.text.bind("<Up>", lambda event: self._move_completion(-1))
+        doc.text.bind("<Tab>", self.accept_completion)
+        doc.text.bind("<Return>", self.accept_completion)
+        doc.text.bind("<Escape>", self.hide_completion) # Before the window's Escape (cancel load)
+        doc.text.bind("<FocusOut>", self.hide_completion)
+        doc.text.bind("<Button-1>", self.hide_completion)
+
+    def _attach_buffer(self, doc):
+        """Gives doc a TextBuffer mirroring its widget; in large file mode only the widget holds the text."""
+        if doc.large_file_mode:
+            doc.buffer = None
+        elif doc.buffer is None:
+            doc.buffer = TextBuffer(doc.text.get("1.0", "end-1c"))
+            doc.buffer.listeners.append(lambda change: self.on_text_edit(doc, change))
+            doc.checked_version = None
+        doc.words = IdentifierIndex(doc.buffer) if doc.buffer is not None else None
+        doc.highlighter.buffer = doc.buffer
+
+    def _text_snapshot(self, doc):
+        """doc's current text as a TextSnapshot (copied out of the widget in large file mode)."""
+        if doc.buffer is not None:
+            return doc.buffer.snapshot()
+        return TextBuffer(doc.text.get("1.0", "end-1c")).snapshot()
+
+    def _find_document(self, path):
+        for doc in self.documents:
+            if doc.path is not None and os.path.abspath(doc.path) == os.path.abspath(path):
+                return doc
+        return None
+
+    def _blank_document(self):
+        """The active document if it is an empty untitled buffer, else a new active document."""
+        doc = self.doc
+        if (doc.path is None and doc.loader is None and not doc.modified()
+                and doc.text.compare("end-1c", "==", "1.0")):
+            return doc
+        doc = self._create_document(None)
+        self.activate_document(doc)
+        return doc
+
+    def _discard_blank(self, doc):
+        # A tab created for a file that could not be opened goes away again
+        if doc.path is None and len(self.documents) > 1 and not doc.modified():
+            self.close_document(doc)
+
+    def activate_document(self, doc):
+        """Makes doc the visible tab, reloading it from disk if it was evicted."""
+        old = self.doc
+        if old is not doc and old is not None and old.text is not None:
+            old.cursor = old.text.index(tk.INSERT)
+            old.yview = old.text.yview()[0]
+            if old.buffer is not None:
+                old.size = old.buffer.char_count
+            else:
+                old.size = int(old.text.tk.call(old.text._w, "count", "-chars", "1.0", "end"))
+            old.text.pack_forget()
+        self.doc = doc
+        doc.last_used = time.monotonic()
+        if doc.text is None:
+            self._create_text_widget(doc)
+            doc.text.pack(fill=tk.BOTH, expand=True)
+            if doc.path is not None:
+                doc.restore_view = True
+                self._load_document(doc, doc.path)
+        elif old is not doc:
+            doc.text.pack(fill=tk.BOTH, expand=True)
+        doc.text.focus_set()
+        suffix = " [solo lectura]" if doc.viewer is not None else ""
+        self.master.title(f"TkCode - {doc.name()}{suffix}")
+        self.gutter.set_text(doc.text)
+        self._update_tabs()
+        self.scheduler.mark_dirty("gutter", 0)
+        self.scheduler.mark_dirty("highlight")
+        self.scheduler.mark_dirty("status")
+        self.scheduler.mark_dirty("diagnostics", 0)
+        if self.find_visible:
+            self.scheduler.mark_dirty("find", 0)
+        self.scheduler.mark_dirty("symbols", 0)
+        self.scheduler.mark_dirty("words", 0)
+        self._refresh_outline() # The last symbols parsed for doc until the new run finishes
+        if self.completion is not None:
+            self.completion.hide()
+        self._evict_documents()
+
+    def _evict_documents(self):
+        """Drops the widgets of the least recently used unmodified tabs beyond the cache budget."""
+        cached = sorted((doc for doc in self.documents if doc.text is not None and doc is not self.doc),
+                        key=lambda doc: doc.last_used)
+        total = sum(doc.size for doc in cached)
+        count = len(cached)
+        for doc in cached:
+            if total <= self.DOCUMENT_CACHE_CHARS and count <= self.DOCUMENT_CACHE_COUNT:
+                break
+            if doc.path is None or doc.loader is not None or doc.viewer is not None or doc.modified():
+                continue # Unsaved or loading content only exists in the widget; viewers are cheap
+            self._unload_document(doc)
+            total -= doc.size
+            count -= 1
+
+    def _unload_document(self, doc):
+        """Destroys doc's widget; the document keeps its path and view position."""
+        if doc.loader is not None:
+            doc.loader.cancel()
+            doc.loader = None
+        self.close_viewer(doc)
+        if doc.text is None:
+            return
+        widget = doc.text._w
+        doc.text.frame.destroy()
+        self.master.tk.deletecommand(widget) # The edit hook proxy outlives the Tk widget
+        doc.text = None
+        doc.buffer = None
+        doc.words = None
+        doc.highlighter = None
+        doc.checked_digest = doc.checked_version = None # Squiggles are gone with the widget; recheck (from the cache) on reload
+        doc.symbols_version = None
+
+    def close_document(self, doc=None):
+        """Closes a tab (the active one by default), offering to save unsaved changes."""
+        doc = doc or self.doc
+        if doc.modified():
+            answer = messagebox.askyesnocancel("Cerrar", f"¿Guardar los cambios de {doc.name()}?")
+            if answer is None:
+                return "break"
+            if answer:
+                self.save_file(doc)
+                if doc.modified():
+                    return "break" # Save As was cancelled; a failed background save reopens the text
+        self._unload_document(doc)
+        self.documents.remove(doc)
+        if doc.check_future is not None:
+            doc.check_future.cancel()
+        if doc.diagnostics:
+            doc.diagnostics = []
+            self._show_problems()
+        if doc is self.doc:
+            self.doc = None
+            remaining = max(self.documents, key=lambda other: other.last_used, default=None)
+            self.activate_document(remaining or self._create_document(None))
+        else:
+            self._update_tabs()
+        return "break"
+
+    def next_document(self, event=None):
+        index = self.documents.index(self.doc)
+        self.activate_document(self.documents[(index + 1) % len(self.documents)])
+        return "break"
+
+    def _update_tabs(self):
+        """Syncs the tab strip: one label per document, the active one highlighted.
+
+        Each document keeps its tab widgets while it is open; only tabs whose label or
+        style changed are reconfigured. Documents are only ever appended or removed, so
+        packing a new tab at the end keeps the strip in order."""
+        if self.journal is not None:
+            self.journal.touch() # The journal's list of tabs is out of date
+        for doc in [doc for doc in self._tabs if doc not in self.documents]:
+            self._tabs.pop(doc)[0].destroy()
+        for doc in self.documents:
+            active = doc is self.doc
+            style = ("● " if doc.modified() else "") + doc.name(), active, doc.text is None
+            tab = self._tabs.get(doc)
+            if tab is None:
+                frame = tk.Frame(self.tab_bar)
+                frame.pack(side=tk.LEFT, padx=(0, 1))
+                label = tk.Label(frame, padx=8, pady=3)
+                label.pack(side=tk.LEFT)
+                close = tk.Label(frame, text="×", padx=4)
+                close.pack(side=tk.LEFT)
+                for widget in (frame, label):
+                    widget.bind("<Button-1>", lambda event, doc=doc: self.activate_document(doc))
+                    widget.bind("<Button-2>", lambda event, doc=doc: self.close_document(doc))
+                close.bind("<Button-1>", lambda event, doc=doc: self.close_document(doc))
+            elif tab[3] == style:
+                continue
+            else:
+                frame, label, close, _ = tab
+            text, active, unloaded = style
+            bg = '#282c34' if active else '#21252b'
+            fg = '#ffffff' if active else '#9da5b4'
+            frame.configure(bg=bg)
+            label.configure(text=text, bg=bg, fg=fg, font=("Segoe UI", 9, "italic" if unloaded else "normal"))
+            close.configure(bg=bg, fg=fg)
+            self._tabs[doc] = frame, label, close, style
+
+    def create_search_panel(self):
+        """Creates the project-wide search view of the sidebar (hidden until selected)."""
+        self.search_view = tk.Frame(self.sidebar_frame, bg='#282c34')
+        tk.Label(self.search_view, text="BUSCAR", bg='#282c34', fg='#abb2bf', font=("Segoe UI", 9, "bold"),
+                 anchor=tk.W, padx=5).pack(fill=tk.X, pady=(0, 5))
+
+        self.search_entry = tk.Entry(self.search_view, bg='#21252b', fg='#abb2bf', insertbackground='white',
+                                     relief=tk.FLAT, font=("Consolas", 10))
+        self.search_entry.pack(fill=tk.X, padx=5)
+        self.search_entry.bind("<Return>", self.run_project_search)
+
+        options = tk.Frame(self.search_view, bg='#282c34')
+        options.pack(fill=tk.X, padx=5, pady=2)
+        self.search_regex = tk.BooleanVar(value=False)
+        self.search_case = tk.BooleanVar(value=False)
+        for label, variable in (("Regex", self.search_regex), ("Aa", self.search_case)):
+            tk.Checkbutton(options, text=label, variable=variable, bg='#282c34', fg='#abb2bf',
+                           selectcolor='#21252b', activebackground='#282c34', bd=0).pack(side=tk.LEFT)
+
+        self.search_status = tk.Label(self.search_view, text="", bg='#282c34', fg='#6a737d',
+                                      font=("Segoe UI", 8), anchor=tk.W, padx=5)
+        self.search_status.pack(fill=tk.X)
+
+        self.search_results = ttk.Treeview(self.search_view, show='tree', selectmode='browse')
+        self.search_results.pack(fill=tk.BOTH, expand=True)
+        self.search_results.bind("<<TreeviewSelect>>", self.open_search_result)
+
+        self.search_index = None # TrigramIndex of the project, loaded on first use
+        self.search_pool = None # Process pool shared by indexing and searching
+        self._search_queue = queue.Queue()
+        self._search_generation = 0 # Results of older searches are dropped
+        self._search_futures = []
+        self._search_pending = 0 # Batches of the current search not reported yet
+        self._search_submitted = True # False while a worker is still submitting batches
+        self._search_scanned = 0
+        self._search_files = {} # Result file path -> its node
+        self._search_hits = {} # Result node -> (path, line, column, length)
+        self._search_hit_count = 0
+        self._search_drain_job = None
+        self.master.bind("<Control-F>", lambda event: self.show_sidebar_view("search", toggle=False))
+
+    def show_sidebar_view(self, name, toggle=True):
+        """Shows a sidebar view ("explorer", "search" or "outline"); with toggle, a second click hides the sidebar."""
+        if name == "outline" and self.outline_view is None:
+            self.create_outline_panel()
+        views = {"explorer": self.explorer_view, "search": self.search_view, "outline": self.outline_view}
+        if self.sidebar_visible and self.sidebar_view == name:
+            if toggle:
+                self.toggle_sidebar()
+        else:
+            views[self.sidebar_view].pack_forget()
+            views[name].pack(fill=tk.BOTH, expand=True)
+            self.sidebar_view = name
+            if not self.sidebar_visible:
+                self.toggle_sidebar()
+        if name == "search" and self.sidebar_visible:
+            self._ensure_search_index()
+            self.search_entry.focus_set()
+            self.search_entry.select_range(0, tk.END)
+        if name == "outline":
+            self.scheduler.run_now("symbols")
+            self._refresh_outline()
+
+    def _close_search_index(self):
+        """Stops searching and indexing the current project (e.g. before opening another folder)."""
+        self._cancel_project_search()
+        for iid in self.search_results.get_children():
+            self.search_results.delete(iid)
+        self.search_status.config(text="")
+        if self.search_index is not None:
+            self.search_index.close()
+            self.search_index = None
+
+    def _ensure_search_index(self):
+        if self.search_index is not None or not self.project_root:
+            return
+        self._project_pool()
+        self.search_index = TrigramIndex(self.project_root)
+        threading.Thread(target=self._index_worker, args=(self.search_index,), daemon=True).start()
+        self._schedule_search_drain()
+
+    def _index_worker(self, index):
+        # Worker thread: load the saved index, then re-read whatever changed on disk
+        index.load()
+        progress = lambda done, total: self._search_queue.put(("index", index, f"Indexando… {done}/{total} archivos"))
+        try:
+            index.update(self.search_pool, progress)
+        except Exception as e: # e.g. a worker process died
+            self._search_queue.put(("index", index, f"Error al indexar: {e}"))
+            return
+        self._search_queue.put(("index", index, f"Índice listo: {len(index.paths)} archivos"))
+
+    def run_project_search(self, event=None):
+        query = self.search_entry.get()
+        self._cancel_project_search()
+        for iid in self.search_results.get_children():
+            self.search_results.delete(iid)
+        if not query or not self.project_root:
+            self.search_status.config(text="")
+            return
+        flags = 0 if self.search_case.get() else re.IGNORECASE
+        if self.search_regex.get():
+            try:
+                re.compile(query, flags)
+            except re.error as e:
+                self.search_status.config(text=f"Expresión regular no válida: {e}")
+                return
+            pattern = query
+        else:
+            pattern = re.escape(query)
+        self._ensure_search_index()
+        self._search_submitted = False
+        self.search_status.config(text="Buscando…")
+        literals = _required_literals(query, self.search_regex.get())
+        ignore_case = bool(re.compile(pattern, flags).flags & re.IGNORECASE) # Also set by (?i) in the regex
+        threading.Thread(target=self._search_worker, daemon=True, args=(
+            self._search_generation, self.search_index, pattern, flags, literals, ignore_case)).start()
+        self._schedule_search_drain()
+
+    def _search_worker(self, generation, index, pattern, flags, literals, ignore_case):
+        # Worker thread: pick candidate files and fan them out to the process pool in batches
+        if index.complete:
+            try:
+                index.update(self.search_pool) # Files changed outside the editor (checkout, builds...)
+            except Exception:
+                pass # e.g. a worker process died; search what is indexed
+            if generation != self._search_generation:
+                return
+            paths = index.candidates(literals, ignore_case)
+            if paths is None:
+                paths = index.searchable_files()
+        else: # Index still being built: scan everything so nothing is missed
+            paths = [path for path, size, _mtime in _walk_project_files(index.root)
+                     if size <= TrigramIndex.MAX_FILE_BYTES]
+        futures = []
+        for start in range(0, len(paths), self.SEARCH_BATCH):
+            if generation != self._search_generation:
+                return
+            future = self.search_pool.submit(_search_files, paths[start:start + self.SEARCH_BATCH], pattern,
+                                             flags, TrigramIndex.MAX_FILE_BYTES, self.SEARCH_HITS_PER_FILE)
+            future.add_done_callback(lambda done: self._search_queue.put(("hits", generation, done)))
+            futures.append(future)
+        self._search_queue.put(("submitted", generation, futures, len(paths)))
+
+    def _cancel_project_search(self):
+        self._search_generation += 1
+        for future in self._search_futures:
+            future.cancel()
+        self._search_futures = []
+        self._search_pending = 0
+        self._search_files = {}
+        self._search_hits = {}
+        self._search_hit_count = 0
+        self._search_submitted = True
+
+    def _schedule_search_drain(self):
+        if self._search_drain_job is None:
+            self._search_drain_job = self.master.after(self.EXPLORER_TICK_MS, self._drain_search_queue)
+
+    def _drain_search_queue(self):
+        """Inserts streamed search results into the panel, a bounded number of rows per tick."""
+        self._search_drain_job = None
+        inserted = 0
+        while inserted < self.EXPLORER_INSERTS_PER_TICK:
+            try:
+                message = self._search_queue.get_nowait()
+            except queue.Empty:
+                break
+            kind, generation = message[0], message[1]
+            if kind == "index":
+                if generation is self.search_index and not self._search_files and self._search_submitted:
+                    self.search_status.config(text=message[2])
+                continue
+            if generation != self._search_generation:
+                continue # A newer search replaced this one
+            if kind == "submitted":
+                self._search_futures = message[2]
+                self._search_pending += len(message[2])
+                self._search_submitted = True
+                self._search_scanned = message[3]
+            else:
+                self._search_pending -= 1
+                future = message[2]
+                if not future.cancelled() and future.exception() is None:
+                    for path, hits in future.result():
+                        inserted += self._add_search_hits(path, hits)
+            if self._search_hit_count >= self.SEARCH_MAX_HITS:
+                self._cancel_project_search()
+                self.search_status.config(text=f"Más de {self.SEARCH_MAX_HITS} resultados; refina la búsqueda")
+                break
+            if self._search_submitted:
+                files = len(self._search_files)
+                status = f"{self._search_hit_count} resultados en {files} archivos"
+                if self._search_pending > 0:
+                    status += f" · buscando en {self._search_scanned} candidatos…"
+                self.search_status.config(text=status)
+        if not self._search_queue.empty() or self._search_pending > 0 or not self._search_submitted \
+                or (self.search_index is not None and not self.search_index.complete):
+            self._search_drain_job = self.master.after(self.EXPLORER_TICK_MS, self._drain_search_queue)
+
+    def _add_search_hits(self, path, hits):
+        node = self._search_files.get(path)
+        if node is None:
+            name = os.path.relpath(path, self.project_root) if self.project_root else path
+            node = self.search_results.insert('', 'end', text=name, open=True)
+            self._search_files[path] = node
+        for line, column, length, preview in hits:
+            iid = self.search_results.insert(node, 'end', text=f"{line}: {preview.strip()}")
+            self._search_hits[iid] = (path, line, column, length)
+        self._search_hit_count += len(hits)
+        return len(hits) + 1
+
+    def open_search_result(self, event=None):
+        hit = self._search_hits.get(self.search_results.focus())
+        if hit is not None:
+            self.open_file_at(*hit)
+
+    def open_file_at(self, path, line, column=0, length=0):
+        """Opens path (unless it is already shown) and selects length characters at line.column."""
+        if path != self.current_file:
+            self.open_file_by_path(path)
+            if path != self.current_file:
+                return # The file could not be opened
+        self.doc.pending_goto = (line, column, length)
+        if self.loader is None:
+            self._apply_pending_goto(self.doc) # Otherwise applied when the load finishes
+
+    def _apply_pending_goto(self, doc):
+        line, column, length = doc.pending_goto
+        doc.pending_goto = None
+        if doc.viewer is not None:
+            start = doc.viewer.goto_line(line, column)
+        else:
+            start = f"{line}.{column}"
+            doc.text.mark_set(tk.INSERT, start)
+            doc.text.see(start)
+        doc.text.tag_remove("sel", "1.0", tk.END)
+        doc.text.tag_add("sel", start, f"{start}+{length}c")
+        self.scheduler.mark_dirty("status")
+
+    def _on_file_saved(self, path):
+        if self.search_index is not None and self.search_index.complete:
+            threading.Thread(target=self.search_index.update_file, args=(path,), daemon=True).start()
+        if self.symbol_index is not None and self.symbol_index.complete:
+            threading.Thread(target=self.symbol_index.update_file, args=(path,), daemon=True).start()
+
+    def quick_open(self, event=None):
+        """Ctrl+P: fuzzy finder over the files of the open folder."""
+        if not self.project_root:
+            self.status_bar_file_info_label.config(text="Abre una carpeta para usar la apertura rápida.")
+            return "break"
+        if self.project_files is None:
+            self.project_files = ProjectFileList(self.project_root) # Starts from the cached list
+            self.file_matcher.set_items(self.project_files.paths)
+        files = self.project_files
+        if not files.crawling and time.monotonic() - files.crawled_at > self.FILE_LIST_MAX_AGE:
+            files.refresh()
+            self._poll_project_files(files)
+        root = self.project_root
+        self.palette.show(self._quick_open_items,
+                          lambda relative: self.open_file_by_path(os.path.join(root, *relative.split("/"))))
+        self._update_palette_status()
+        return "break"
+
+    def _quick_open_items(self, query):
+        paths = yield from self.file_matcher.match(query)
+        return [(path, path) for path in paths]
+
+    def _poll_project_files(self, files):
+        if files is not self.project_files:
+            return # Another folder was opened
+        if files.crawling:
+            self.master.after(200, self._poll_project_files, files)
+            return
+        self.file_matcher.set_items(files.paths)
+        self._update_palette_status()
+        self.scheduler.mark_dirty("palette")
+
+    def _update_palette_status(self):
+        files = self.project_files
+        status = f"{len(self.file_matcher.items)} archivos"
+        if files is not None and files.crawling:
+            status += " · actualizando la lista…"
+        self.palette.set_status(status)
+
+    def _project_pool(self):
+        """The process pool shared by project indexing and searching, started on first use."""
+        if self.search_pool is None:
+            self.search_pool = _spawn_pool(max(1, min(4, os.cpu_count() or 1)))
+        return self.search_pool
+
+    def _buffer_pool(self):
+        """The worker process that checks and parses the active buffer, started on first use."""
+        if self.diagnostics_pool is None:
+            self.diagnostics_pool = _spawn_pool(1)
+        return self.diagnostics_pool
+
+    def _ensure_symbol_index(self):
+        """Starts the project's symbol index, or brings a built one up to date with the files on disk."""
+        if not self.project_root:
+            return
+        index = self.symbol_index
+        if index is not None:
+            if index.complete and not index.update_lock.locked(): # Files changed outside the editor
+                threading.Thread(target=self._update_symbol_index, args=(index, self._project_pool()),
+                                 daemon=True).start()
+            return
+        index = self.symbol_index = SymbolIndex(self.project_root)
+        threading.Thread(target=self._update_symbol_index, args=(index, self._project_pool(), True),
+                         daemon=True).start()
+
+    def _update_symbol_index(self, index, pool, load=False):
+        # Worker thread: load the saved index, then re-parse whatever changed on disk
+        if load:
+            index.load()
+        try:
+            index.update(pool)
+        except Exception: # e.g. a worker process died; what was indexed is still usable
+            index.complete = True
+
+    def _close_symbol_index(self):
+        if self.symbol_index is not None:
+            self.symbol_index.close()
+            self.symbol_index = None
+
+    def run_symbols(self):
+        """Parses the active buffer's symbols in the worker process; the same text is answered from a cache."""
+        doc = self.doc
+        language = SYMBOL_LANGUAGES.get(os.path.splitext(doc.path or "")[1].lower())
+        if doc.buffer is None or doc.loader is not None or language is None:
+            if doc.symbols:
+                doc.symbols = []
+                self._refresh_outline()
+            return
+        buffer = doc.buffer
+        if buffer.version == doc.symbols_version:
+            return
+        doc.symbols_version = buffer.version
+        source = buffer.snapshot().text()
+        digest = hashlib.sha1(source.encode("utf-8", "surrogatepass")).hexdigest()
+        if digest == doc.symbols_digest:
+            return
+        doc.symbols_digest = digest
+        cached = self._symbol_cache.get(digest)
+        if cached is not None:
+            self._symbol_cache.move_to_end(digest)
+            self._set_symbols(doc, cached)
+            return
+        try:
+            future = self._buffer_pool().submit(_source_symbols, source, language)
+        except RuntimeError: # The worker died; start a new one on the next run
+            self.diagnostics_pool = None
+            doc.symbols_digest = doc.symbols_version = None
+            return
+        self._symbols_pending += 1
+        future.add_done_callback(lambda done: self._symbol_queue.put((doc, digest, done)))
+        if self._symbol_poll_job is None:
+            self._symbol_poll_job = self.master.after(self.TASK_TICK_MS, self._poll_symbols)
+
+    def _poll_symbols(self):
+        self._symbol_poll_job = None
+        while True:
+            try:
+                doc, digest, future = self._symbol_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._symbols_pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                continue
+            self._symbol_cache[digest] = future.result()
+            if len(self._symbol_cache) > self.DIAGNOSTICS_CACHE_SIZE:
+                self._symbol_cache.popitem(last=False)
+            if digest == doc.symbols_digest and doc in self.documents:
+                self._set_symbols(doc, future.result())
+        if self._symbols_pending > 0:
+            self._symbol_poll_job = self.master.after(self.TASK_TICK_MS, self._poll_symbols)
+
+    def _set_symbols(self, doc, symbols):
+        doc.symbols = symbols
+        self._symbols_generation += 1
+        if doc is self.doc:
+            self._refresh_outline()
+
+    def create_outline_panel(self):
+        """Creates the outline view of the sidebar (built the first time it is shown)."""
+        self.outline_view = tk.Frame(self.sidebar_frame, bg='#282c34')
+        tk.Label(self.outline_view, text="ESQUEMA", bg='#282c34', fg='#abb2bf', font=("Segoe UI", 9, "bold"),
+                 anchor=tk.W, padx=5).pack(fill=tk.X, pady=(0, 5))
+        self.outline_tree = ttk.Treeview(self.outline_view, show='tree', selectmode='browse')
+        self.outline_tree.pack(fill=tk.BOTH, expand=True)
+        self.outline_tree.bind("<<TreeviewSelect>>", self.open_outline_symbol)
+        self._outline_positions = {} # Tree item -> (line, column)
+
+    def _refresh_outline(self):
+        """Rebuilds the outline from the active document's symbols, if the outline is showing."""
+        if not (self.sidebar_visible and self.sidebar_view == "outline"):
+            return
+        tree = self.outline_tree
+        tree.delete(*tree.get_children())
+        self._outline_positions = {}
+        parents = {"": ""}
+        for name, kind, line, column, container in self.doc.symbols:
+            item = tree.insert(parents.get(container, ""), "end", text=f"{name}  · {kind}", open=True)
+            parents[f"{container}.{name}" if container else name] = item
+            self._outline_positions[item] = (line, column)
+
+    def open_outline_symbol(self, event=None):
+        selection = self.outline_tree.selection()
+        if selection and selection[0] in self._outline_positions:
+            self._goto_in_document(self.doc, *self._outline_positions[selection[0]])
+
+    def _goto_in_document(self, doc, line, column):
+        doc.pending_goto = (line, column, 0)
+        if doc.loader is None:
+            self._apply_pending_goto(doc)
+        doc.text.focus_set()
+
+    @staticmethod
+    def _symbol_label(symbol):
+        name, kind, line, column, container = symbol
+        return f"{container}.{name}" if container else name, kind
+
+    def goto_symbol_in_file(self, event=None):
+        """Ctrl+Shift+O: fuzzy finder over the active document's symbols."""
+        doc = self.doc
+        self.scheduler.run_now("symbols") # Answered from the last parse; a new one updates the outline
+        items = {}
+        for symbol in doc.symbols:
+            qualified, kind = self._symbol_label(symbol)
+            items[f"{qualified} ({kind})  :{symbol[2]}"] = symbol[2:4]
+        matcher = FuzzyMatcher(items)
+
+        def search(query):
+            labels = yield from matcher.match(query)
+            return [(label, items[label]) for label in labels]
+        self.palette.show(search, lambda position: self._goto_in_document(doc, *position), "")
+        self.palette.set_status(f"{len(items)} símbolos en {doc.name()}")
+        return "break"
+
+    def goto_symbol_in_project(self, event=None):
+        """Ctrl+T: fuzzy finder over the symbols of every file in the open folder."""
+        if not self.project_root:
+            self.status_bar_file_info_label.config(text="Abre una carpeta para buscar símbolos del proyecto.")
+            return "break"
+        self._ensure_symbol_index()
+        self._update_symbol_matcher()
+        self.palette.show(self._project_symbol_items, lambda target: self.open_file_at(*target))
+        self._poll_symbol_palette(self.symbol_index)
+        return "break"
+
+    def _update_symbol_matcher(self):
+        """Rebuilds the project symbol list if the index or an open buffer's symbols changed."""
+        index = self.symbol_index
+        key = (index, index.version, self._symbols_generation)
+        if key == self._symbol_matcher_key:
+            return
+        self._symbol_matcher_key = key
+        files = index.symbols()
+        for doc in self.documents:
+            if doc.path is not None and doc.symbols_digest is not None:
+                files[doc.path] = doc.symbols # Open buffers are newer than the files on disk
+        items = {}
+        for path, symbols in files.items():
+            relative = os.path.relpath(path, self.project_root)
+            for symbol in symbols:
+                qualified, kind = self._symbol_label(symbol)
+                items[f"{qualified} ({kind})  {relative}:{symbol[2]}"] = (path, symbol[2], symbol[3])
+        self._symbol_items = items
+        self.symbol_matcher.set_items(items)
+
+    def _project_symbol_items(self, query):
+        labels = yield from self.symbol_matcher.match(query)
+        items = self._symbol_items
+        return [(label, items[label]) for label in labels if label in items]
+
+    def _poll_symbol_palette(self, index):
+        """Refreshes the open project symbol palette while the index is still being built."""
+        if index is not self.symbol_index or not self.palette.visible() \
+                or self.palette.search != self._project_symbol_items:
+            return
+        self._update_symbol_matcher()
+        status = f"{len(self._symbol_items)} símbolos"
+        if not index.complete or index.update_lock.locked():
+            status += " · indexando…"
+            self.master.after(self.SYMBOL_PALETTE_POLL_MS, self._poll_symbol_palette, index)
+        self.palette.set_status(status)
+        self.scheduler.mark_dirty("palette")
+
+    def run_word_index(self):
+        """Scheduler job: indexes the active buffer's identifiers if needed, and the project's symbol names."""
+        index = self.symbol_index
+        key = (index, index.version) if index is not None else None
+        if key != self._project_words_key:
+            self._project_words_key = key
+            names = collections.Counter()
+            if index is not None:
+                for symbols in index.symbols().values():
+                    names.update(symbol[0] for symbol in symbols if _IDENTIFIER.fullmatch(symbol[0]))
+            self.project_words.reset(names)
+        doc = self.doc
+        if doc.words is None or doc.loader is not None or doc.words.version == doc.buffer.version:
+            return None
+        return doc.words.build(doc.buffer.snapshot())
+
+    def _completions(self, prefix):
+        """Up to COMPLETION_LIMIT names starting with prefix, best first."""
+        doc = self.doc
+        scores = collections.Counter()
+        # Uses in the active buffer weigh most, then project definitions, other buffers and keywords
+        for name, count in doc.words.complete(prefix):
+            scores[name] += 4 * count
+        for name, count in self.project_words.complete(prefix):
+            scores[name] += 2 * count
+        for other in self.documents:
+            if other is not doc and other.words is not None:
+                for name, count in other.words.complete(prefix):
+                    scores[name] += count
+        folded = prefix.lower()
+        for keyword in doc.highlighter.grammar.keywords:
+            if keyword.lower().startswith(folded):
+                scores[keyword] += 1
+        scores.pop(prefix, None) # The identifier as typed so far
+        return heapq.nsmallest(self.COMPLETION_LIMIT, scores, key=lambda name: (
+            not name.startswith(prefix), -scores[name], len(name), name))
+
+    def update_completion(self, force=False):
+        """Shows the completions of the identifier before the cursor, or hides the list if there are none."""
+        doc = self.doc
+        if doc.words is None or doc.loader is not None or doc.words.version is None:
+            if doc.words is not None and doc.loader is None:
+                self.scheduler.mark_dirty("words", 0) # Not indexed yet: complete from the next keystroke on
+            self.hide_completion()
+            return
+        if self.symbol_index is not None and self._project_words_key != (self.symbol_index, self.symbol_index.version):
+            self.scheduler.mark_dirty("words")
+        line, column = map(int, doc.text.index(tk.INSERT).split("."))
+        match = _IDENTIFIER_END.search(doc.buffer.line(line), 0, column)
+        prefix = match.group() if match else ""
+        items = self._completions(prefix) if len(prefix) >= (1 if force else self.COMPLETION_MIN_PREFIX) else []
+        bbox = doc.text.bbox(f"{line}.{match.start()}") if items else None
+        if bbox is None:
+            self.hide_completion()
+            return
+        if self.completion is None:
+            self.completion = CompletionPopup(self.master, self.accept_completion)
+        self._completion_start = (line, match.start())
+        self.completion.show(doc.text.winfo_rootx() + bbox[0], doc.text.winfo_rooty() + bbox[1] + bbox[3], items)
+
+    def hide_completion(self, event=None):
+        if self.completion is None or not self.completion.visible():
+            return None
+        self.completion.hide()
+        return "break" if event is not None and event.keysym == "Escape" else None
+
+    def _move_completion(self, delta):
+        if self.completion is None or not self.completion.visible():
+            return None
+        self.completion.move(delta)
+        return "break"
+
+    def accept_completion(self, event=None):
+        """Replaces the identifier being typed with the selected completion."""
+        if self.completion is None or not self.completion.visible():
+            return None
+        name = self.completion.selected()
+        self.completion.hide()
+        if name is None:
+            return "break"
+        line, column = self._completion_start
+        text = self.text_area
+        text.replace(f"{line}.{column}", tk.INSERT, name)
+        text.mark_set(tk.INSERT, f"{line}.{column + len(name)}")
+        text.see(tk.INSERT)
+        text.focus_set()
+        return "break"
+
+    def _on_completion_key(self, event):
+        if event.keysym == "space" and event.state & 0x4:
+            return # Releasing Ctrl+Space, which showed the list
+        if event.char and (event.char == "_" or event.char.isalnum()) and not event.state & 0x4: # No Control
+            self.update_completion()
+        elif event.keysym == "BackSpace" and self.completion is not None and self.completion.visible():
+            self.update_completion()
+        elif event.keysym not in ("Up", "Down") and not event.keysym.startswith(("Shift", "Control", "Alt")):
+            self.hide_completion()
 
     def create_bottom_panel(self):
         """Creates the bottom panel with tabs for Terminal, Problems, Output."""
@@ -440,15 +5510,32 @@ class CodeEditor:
         self.bottom_notebook.add(self.terminal_frame, text="Terminal")
         self.create_terminal()
 
-        # Problems Tab (placeholder)
+        # Problems Tab
         self.problems_frame = tk.Frame(self.bottom_notebook, bg='#1e1e1e')
         self.bottom_notebook.add(self.problems_frame, text="Problemas")
-        tk.Label(self.problems_frame, text="No hay problemas detectados (por ahora)", bg='#1e1e1e', fg='white').pack(pady=20)
+        self.problems_list = VirtualList(self.problems_frame, self.open_problem)
+        self.problems_list.frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.problems = [] # Problem of each row of problems_list
+        self.task_problems = [] # Found in the output of the last task
 
         # Output Tab (placeholder)
         self.output_frame = tk.Frame(self.bottom_notebook, bg='#1e1e1e')
         self.bottom_notebook.add(self.output_frame, text="Salida")
-        tk.Label(self.output_frame, text="Aquí se mostrará la salida del programa (futura característica)", bg='#1e1e1e', fg='white').pack(pady=20)
+        self.output_text = scrolledtext.ScrolledText(self.output_frame, wrap='word', bg='#1e1e1e', fg='#d4d4d4',
+                                                     selectbackground='#007acc', font=("Consolas", 10),
+                                                     state='disabled', bd=0, relief=tk.FLAT)
+        self.output_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.output_text.tag_configure("info", foreground="yellow")
+        self.output_text.tag_configure("error", foreground="red")
+        self.output_sink = OutputSink(self.output_text, self.OUTPUT_MAX_LINES) # Shared by anything that logs output
+
+        self.task_process = None # ShellProcess of the running task
+        self.task_parser = None # OutputParser reading the task's output
+        self._task_results = queue.Queue()
+        self._task_token = 0 # Results of older tasks are dropped
+        self._task_parsing = False
+        self._task_drain_job = None
+        self.task_command = self._load_task_command()
 
     def create_terminal(self):
         """Creates a simple text-based terminal."""
@@ -468,6 +5555,7 @@ class CodeEditor:
         self.terminal_output.tag_configure("info", foreground="yellow")
         self.terminal_output.tag_configure("error", foreground="red")
         self.terminal_output.tag_configure("user_input", foreground="#528bff") # Blue for user input
+        self.terminal_sink = OutputSink(self.terminal_output, self.TERMINAL_MAX_LINES)
 
         terminal_input_frame = tk.Frame(self.terminal_frame, bg='#1e1e1e')
         terminal_input_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
@@ -483,51 +5571,373 @@ class CodeEditor:
         )
         self.terminal_input.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.terminal_input.bind("<Return>", self.execute_terminal_command)
+        self.terminal_input.bind("<Control-c>", self.interrupt_terminal_command)
+        self.terminal_output.bind("<Control-c>", self.interrupt_terminal_command)
+
+        self.terminal_process = None # ShellProcess of the running command
+        self.terminal_cwd = None # Set by 'cd'; defaults to the project folder
+        self._terminal_drain_job = None
+        self._terminal_line_open = False
 
         self.print_to_terminal("Bienvenido a TkCode Terminal. Escribe 'ayuda' para ver comandos.", tag="info")
 
     def print_to_terminal(self, message, tag=None):
-        """Appends a message to the terminal output."""
-        self.terminal_output.config(state='normal') # Enable editing
-        timestamp = datetime.datetime.now().strftime("[%H:%M:%S] ")
-        if tag:
-            self.terminal_output.insert(tk.END, timestamp + message + "\n", tag)
-        else:
-            self.terminal_output.insert(tk.END, timestamp + message + "\n")
-        self.terminal_output.see(tk.END) # Scroll to end
-        self.terminal_output.config(state='disabled') # Disable editing
+        """Appends a timestamped message to the terminal output (shown on the next frame)."""
+        if self._terminal_line_open: # A command's output ended without a newline
+            self.terminal_sink.write("\n")
+            self._terminal_line_open = False
+        self.terminal_sink.write(message + "\n", tag, stamp=True)
 
     def execute_terminal_command(self, event=None):
         command = self.terminal_input.get().strip()
-        self.print_to_terminal(f"> {command}", tag="user_input") # Tag user input
         self.terminal_input.delete(0, tk.END) # Clear input
+        if self.terminal_process is not None:
+            self.print_to_terminal(command, tag="user_input")
+            self.terminal_process.write(command) # Input for the running command
+            return
+        self.print_to_terminal(f"> {command}", tag="user_input") # Tag user input
 
-        if command.lower() == "ayuda":
-            self.print_to_terminal("Comandos disponibles:\n - ayuda: Muestra esta ayuda.\n - hola: Saluda.\n - clear: Limpia la terminal.\n - info: Muestra info del editor.\n - ls: Lista archivos (simulado).")
+        if not command:
+            return
+        elif command.lower() == "ayuda":
+            self.print_to_terminal("Comandos disponibles:\n - ayuda: Muestra esta ayuda.\n - hola: Saluda.\n - clear: Limpia la terminal.\n - info: Muestra info del editor.\n - stats: Muestra cuánto trabajo de refresco se ha combinado.\n - perf [on|off|export <archivo>]: Instrumentación de rendimiento (sin argumentos, el informe).\n - cd <carpeta>: Cambia la carpeta de trabajo.\nCualquier otro comando se ejecuta en la shell del sistema (Ctrl+C lo interrumpe).")
         elif command.lower() == "hola":
             self.print_to_terminal("¡Hola desde TkCode!")
         elif command.lower() == "clear":
-            self.terminal_output.config(state='normal')
-            self.terminal_output.delete(1.0, tk.END)
-            self.terminal_output.config(state='disabled')
+            self.terminal_sink.clear()
+            self._terminal_line_open = False
             self.print_to_terminal("Terminal limpiada.", tag="info")
         elif command.lower() == "info":
             self.print_to_terminal("TkCode v0.1 - Editor de código simple con Tkinter.")
             self.print_to_terminal("Creado por tu asistente IA.")
-        elif command.lower() == "ls":
-            if self.project_root and os.path.isdir(self.project_root):
-                self.print_to_terminal(f"Contenido de '{os.path.basename(self.project_root)}':")
-                for item in sorted(os.listdir(self.project_root)): # Sort for readability
-                    item_path = os.path.join(self.project_root, item)
-                    if os.path.isdir(item_path):
-                        self.print_to_terminal(f" - {item}/", tag="info") # Indicate folders
-                    else:
-                        self.print_to_terminal(f" - {item}")
+        elif command.lower() == "stats":
+            self.print_to_terminal("Planificador de refresco:")
+            self.print_to_terminal(self.scheduler.format_stats())
+        elif command.lower() == "perf" or command.lower().startswith("perf "):
+            self.perf_command(command[4:].strip())
+        elif command == "cd" or command.startswith("cd "):
+            target = os.path.expanduser(command[2:].strip() or "~")
+            target = os.path.normpath(os.path.join(self._terminal_directory(), target))
+            if os.path.isdir(target):
+                self.terminal_cwd = target
+                self.print_to_terminal(target, tag="info")
+            else:
+                self.print_to_terminal(f"No existe la carpeta: {target}", tag="error")
+        else:
+            try:
+                self.terminal_process = ShellProcess(command, self._terminal_directory())
+            except OSError as e:
+                self.print_to_terminal(f"No se pudo ejecutar '{command}': {e}", tag="error")
+                return
+            self._terminal_drain_job = self.master.after(self.TERMINAL_TICK_MS, self._drain_terminal)
+
+    def perf_command(self, argument):
+        """The terminal's perf command: on, off, export [file], or the report when empty."""
+        action, _, target = argument.partition(" ")
+        action = action.lower()
+        if action in ("on", "off"):
+            self.set_perf(action == "on")
+            self.print_to_terminal("Instrumentación " + ("activada." if action == "on" else "desactivada."), tag="info")
+        elif not self.perf.enabled:
+            self.print_to_terminal("La instrumentación está desactivada: 'perf on' o 'python app.py --perf'.", tag="info")
+        elif action == "export":
+            if target:
+                path = os.path.join(self._terminal_directory(), os.path.expanduser(target))
+            else:
+                path = os.path.join(_cache_dir("perf"), time.strftime("traza-%Y%m%d-%H%M%S.json"))
+            try:
+                count = self.perf.export(path)
+            except OSError as e:
+                self.print_to_terminal(f"No se pudo exportar la traza: {e}", tag="error")
+                return
+            self.print_to_terminal(f"{count} eventos exportados a {path} (ábrelo en chrome://tracing o ui.perfetto.dev)", tag="info")
+        elif not action:
+            self.print_to_terminal(self.perf.report())
+        else:
+            self.print_to_terminal("Uso: perf [on|off|export <archivo>]", tag="error")
+
+    def _terminal_directory(self):
+        return self.terminal_cwd or self.project_root or os.getcwd()
+
+    def interrupt_terminal_command(self, event=None):
+        """Ctrl+C: interrupts the running command (a second press kills it); otherwise copies as usual."""
+        if self.terminal_process is None:
+            return None
+        self.terminal_process.interrupt()
+        self.print_to_terminal("^C", tag="info")
+        return "break"
+
+    def _drain_terminal(self):
+        """Moves the running command's output into the terminal sink, which inserts it once per frame."""
+        self._terminal_drain_job = None
+        process = self.terminal_process
+        if process is None:
+            return
+        finished = process.finished() # Checked before draining, so no output arrives after the last drain
+        chunks, dropped = process.drain()
+        sink = self.terminal_sink
+        if dropped:
+            sink.write(f"[… {dropped} caracteres omitidos …]\n", "info")
+        for text, tag in chunks:
+            sink.write(text, tag)
+        if chunks:
+            self._terminal_line_open = not chunks[-1][0].endswith("\n")
+        if not finished:
+            self._terminal_drain_job = self.master.after(self.TERMINAL_TICK_MS, self._drain_terminal)
+            return
+        self.terminal_process = None
+        code = process.process.returncode
+        self.print_to_terminal(f"Proceso terminado (código {code})", tag="info" if code == 0 else "error")
+
+    def on_closing(self):
+        self._close_search_index()
+        self._close_symbol_index()
+        for pool in (self.search_pool, self.diagnostics_pool):
+            if pool is not None: # Queued work is dropped; exit only waits for the tasks already running
+                pool.shutdown(wait=False, cancel_futures=True)
+        if self.terminal_process is not None:
+            self.terminal_process.interrupt()
+            self.terminal_process.interrupt() # Killed, not left running without a window
+        self.stop_task(kill=True)
+        if self.journal is not None: # Hot exit: unsaved buffers come back on the next start
+            self._compact_journal()
+            self.journal.close()
+        self.master.destroy()
+
+
+    def _task_config_path(self):
+        return os.path.join(_cache_dir("tasks"), "commands.json")
+
+    def _load_task_command(self):
+        """The build/test command last configured for the current project."""
+        try:
+            with open(self._task_config_path(), encoding="utf-8") as config:
+                return json.load(config).get(os.path.abspath(self.project_root or os.getcwd()), "")
+        except (OSError, ValueError):
+            return ""
+
+    def _save_task_command(self, command):
+        path = self._task_config_path()
+        try:
+            with open(path, encoding="utf-8") as config:
+                commands = json.load(config)
+        except (OSError, ValueError):
+            commands = {}
+        commands[os.path.abspath(self.project_root or os.getcwd())] = command
+        try:
+            with open(path, "w", encoding="utf-8") as config:
+                json.dump(commands, config, indent=1)
+        except OSError:
+            pass
+
+    def run_current_file(self, event=None):
+        """Runs the current file (saving it first) and shows its output in the Output panel."""
+        if self.viewer is not None:
+            return
+        if self.current_file is None or self.doc.modified():
+            self.save_file(on_saved=self.run_current_file) # Runs once the file is on disk
+            return
+        extension = os.path.splitext(self.current_file)[1].lower()
+        runner = self.FILE_RUNNERS.get(extension)
+        if runner is None:
+            messagebox.showinfo("Ejecutar", f"No se sabe cómo ejecutar archivos '{extension or os.path.basename(self.current_file)}'.\n"
+                                "Usa 'Ejecutar tarea...' con un comando propio.")
+            return
+        self.start_task(runner.format(python=sys.executable, path=self.current_file),
+                        os.path.dirname(self.current_file))
+
+    def run_task(self, event=None, ask=False):
+        """Runs the project's build/test command, asking for it the first time (or when ask is set)."""
+        command = self.task_command
+        if ask or not command:
+            command = simpledialog.askstring("Ejecutar tarea", "Comando de compilación o pruebas:",
+                                             initialvalue=command or "python -m pytest", parent=self.master)
+            if not command:
+                return
+            self.task_command = command
+            self._save_task_command(command)
+        self.start_task(command, self.project_root or os.getcwd())
+
+    def start_task(self, command, cwd):
+        """Runs command in cwd, streaming its output to the Output panel and parsing it for problems."""
+        self.stop_task(kill=True)
+        self._task_token += 1
+        self.task_problems = []
+        self._show_problems()
+        self.output_sink.clear()
+        self.output_sink.write(f"> {command}\n", "info", stamp=True)
+        if not self.bottom_panel_visible:
+            self.toggle_bottom_panel()
+        self.bottom_notebook.select(self.output_frame)
+        self.task_parser = OutputParser(cwd, self._task_results, self._task_token)
+        try:
+            # The parser is fed by the reader threads, so it sees output the panel drops when flooded
+            self.task_process = ShellProcess(command, cwd, listener=self.task_parser.feed)
+        except OSError as e:
+            self.task_parser.close()
+            self.task_parser = None
+            self.output_sink.write(f"No se pudo ejecutar: {e}\n", "error", stamp=True)
+            return
+        self._task_parsing = True # Until the parser's end marker arrives
+        if self._task_drain_job is None:
+            self._task_drain_job = self.master.after(self.TASK_TICK_MS, self._drain_task)
+
+    def stop_task(self, event=None, kill=False):
+        if self.task_process is None:
+            return
+        self.task_process.interrupt()
+        if kill:
+            self.task_process.interrupt()
+            self.task_process = None
+            self.task_parser.close()
+            self.task_parser = None
+            self._task_parsing = False
+
+    def _drain_task(self):
+        """Moves the task's output to the Output panel and its parser, and parsed problems to the list."""
+        self._task_drain_job = None
+        process = self.task_process
+        if process is not None:
+            finished = process.finished() # Checked before draining, so no output arrives after the last drain
+            chunks, dropped = process.drain()
+            if dropped:
+                self.output_sink.write(f"[… {dropped} caracteres omitidos …]\n", "info")
+            for text, tag in chunks:
+                self.output_sink.write(text, tag)
+            if finished:
+                self.task_process = None
+                self.task_parser.close()
+                self.task_parser = None
+                code = process.process.returncode
+                self.output_sink.write(f"\nTarea terminada (código {code})\n", "info" if code == 0 else "error",
+                                       stamp=True)
+        added = []
+        while True:
+            try:
+                token, problems = self._task_results.get_nowait()
+            except queue.Empty:
+                break
+            if token != self._task_token:
+                continue
+            if problems is None:
+                self._task_parsing = False
             else:
-                self.print_to_terminal("No hay una carpeta abierta para listar.", tag="error")
+                added += problems
+        if added:
+            self._add_problems(added)
+        if self.task_process is not None or self._task_parsing:
+            self._task_drain_job = self.master.after(self.TASK_TICK_MS, self._drain_task)
+
+    def _problem_row(self, problem):
+        if problem.path is None:
+            name = problem.document.name()
+        elif self.project_root:
+            name = os.path.relpath(problem.path, self.project_root)
+        else:
+            name = problem.path
+        icon, color = ("✖", '#f14c4c') if problem.severity == "error" else ("⚠", '#cca700')
+        return (f"{icon} {name}:{problem.line}:{problem.column + 1}  {problem.message}", color)
+
+    def _show_problems(self):
+        """Refills the Problems panel: diagnostics of the open documents, then the last task's problems."""
+        self.problems = [problem for doc in self.documents for problem in doc.diagnostics] + self.task_problems
+        self.problems_list.set_items([self._problem_row(problem) for problem in self.problems])
+        self._update_problems_tab()
+
+    def _add_problems(self, problems):
+        """Appends problems found by the running task; its rows are last, so only new rows are drawn."""
+        self.task_problems += problems
+        self.problems += problems
+        self.problems_list.append([self._problem_row(problem) for problem in problems])
+        self._update_problems_tab()
+
+    def _update_problems_tab(self):
+        count = len(self.problems)
+        self.bottom_notebook.tab(self.problems_frame, text=f"Problemas ({count})" if count else "Problemas")
+        self.status_bar_problems_label.config(text=f" {count} problema{'' if count == 1 else 's'}")
+
+    def open_problem(self, index):
+        problem = self.problems[index]
+        if problem.document in self.documents: # Diagnostics of an open buffer, maybe untitled
+            self.activate_document(problem.document)
+            problem.document.pending_goto = (problem.line, problem.column, 0)
+            if problem.document.loader is None:
+                self._apply_pending_goto(problem.document)
         else:
-            self.print_to_terminal(f"Comando no reconocido: '{command}'", tag="error")
+            self.open_file_at(problem.path, problem.line, problem.column)
 
+    def run_diagnostics(self):
+        """Checks the active Python buffer in a worker process; results for the same text come from a cache."""
+        doc = self.doc
+        if (doc.text is None or doc.loader is not None or doc.viewer is not None or doc.large_file_mode
+                or doc.highlighter.grammar is not GRAMMARS["python"]):
+            return
+        buffer = doc.buffer
+        if buffer.version == doc.checked_version or buffer.char_count > self.DIAGNOSTICS_MAX_CHARS:
+            return
+        source = buffer.snapshot().text()
+        doc.checked_version = buffer.version
+        digest = hashlib.sha1(source.encode("utf-8", "surrogatepass")).hexdigest()
+        if digest == doc.checked_digest:
+            return
+        doc.checked_digest = digest
+        if doc.check_future is not None:
+            doc.check_future.cancel() # Dropped if it has not started; a running check is ignored when done
+            doc.check_future = None
+        cached = self._diagnostics_cache.get(digest)
+        if cached is not None:
+            self._diagnostics_cache.move_to_end(digest)
+            self._set_diagnostics(doc, cached)
+            return
+        try:
+            future = self._buffer_pool().submit(_check_python, source, doc.path or "<sin título>")
+        except RuntimeError: # The worker died (e.g. killed); start a new one on the next run
+            self.diagnostics_pool = None
+            doc.checked_digest = doc.checked_version = None
+            return
+        doc.check_future = future
+        future.add_done_callback(lambda done: self._diagnostics_queue.put((doc, digest, done)))
+        if self._diagnostics_poll_job is None:
+            self._diagnostics_poll_job = self.master.after(self.TASK_TICK_MS, self._poll_diagnostics)
+
+    def _poll_diagnostics(self):
+        self._diagnostics_poll_job = None
+        while True:
+            try:
+                doc, digest, future = self._diagnostics_queue.get_nowait()
+            except queue.Empty:
+                break
+            if future.cancelled() or future.exception() is not None:
+                continue
+            self._diagnostics_cache[digest] = future.result()
+            if len(self._diagnostics_cache) > self.DIAGNOSTICS_CACHE_SIZE:
+                self._diagnostics_cache.popitem(last=False)
+            if doc.check_future is future:
+                doc.check_future = None
+            if digest == doc.checked_digest and doc in self.documents:
+                self._set_diagnostics(doc, future.result())
+            # Otherwise the text changed while checking: a newer run is on its way
+        if any(doc.check_future is not None for doc in self.documents):
+            self._diagnostics_poll_job = self.master.after(self.TASK_TICK_MS, self._poll_diagnostics)
+
+    def _set_diagnostics(self, doc, results):
+        """Shows results of _check_python as squiggles in doc and rows in the Problems panel."""
+        doc.diagnostics = [Problem(severity, doc.path, line, column, message, doc)
+                           for severity, line, column, message in results]
+        text = doc.text
+        if text is not None:
+            ranges = {"error": [], "warning": []}
+            for problem in doc.diagnostics:
+                start = text.index(f"{problem.line}.{problem.column}")
+                end = text.index(f"{start} wordend")
+                if text.compare(end, "<=", start) or text.compare(end, ">", f"{start} lineend"):
+                    end = f"{start}+1c" # Punctuation or end of line: mark one character
+                ranges[problem.severity] += [start, end]
+            for severity, indices in ranges.items():
+                text.tag_remove("diagnostic_" + severity, "1.0", tk.END)
+                if indices:
+                    text.tag_add("diagnostic_" + severity, *indices) # One Tcl call for all ranges
+        self._show_problems()
 
     def toggle_bottom_panel(self):
         if self.bottom_panel_visible:
@@ -535,7 +5945,7 @@ class CodeEditor:
         else:
             self.bottom_panel_frame.pack(side=tk.BOTTOM, fill=tk.X)
         self.bottom_panel_visible = not self.bottom_panel_visible
-        self.master.after(10, self.update_line_numbers) # Update line numbers after layout change
+        self.scheduler.mark_dirty("gutter") # Update line numbers after layout change
 
 
     def create_status_bar(self):
@@ -567,14 +5977,28 @@ class CodeEditor:
         self.status_bar_lang_label = tk.Label(self.status_bar, text="Texto Plano", bg='#007acc', fg='white', padx=10)
         self.status_bar_lang_label.pack(side=tk.RIGHT, padx=(0, 5))
 
-        self.text_area.bind("<KeyRelease>", self.update_status_bar) # Bind to key release
-        self.text_area.bind("<<Modified>>", self.update_status_bar_modified_flag) # Bind to text modification
-
-    def update_status_bar_modified_flag(self, event=None):
-        # This function exists solely to clear the Tkinter modified flag
-        # We also call update_status_bar on KeyRelease for full updates
-        self.text_area.edit_modified(False)
 
+    def set_perf(self, enabled):
+        """Switches the performance instrumentation (PerfMonitor) and its status bar readout."""
+        if enabled:
+            self.perf.enable()
+            if self.status_bar_perf_label is None:
+                self.status_bar_perf_label = tk.Label(self.status_bar, text="", bg='#007acc', fg='white', padx=10)
+            self.status_bar_perf_label.pack(side=tk.RIGHT, padx=(0, 5))
+            if self._perf_job is None:
+                self._show_perf()
+        else:
+            self.perf.disable()
+            if self.status_bar_perf_label is not None:
+                self.status_bar_perf_label.pack_forget()
+            if self._perf_job is not None:
+                self.master.after_cancel(self._perf_job)
+                self._perf_job = None
+
+    def _show_perf(self):
+        p50, p99 = self.perf.key_percentiles()
+        self.status_bar_perf_label.config(text=f"Tecla → pintado p50 {p50:.1f} ms · p99 {p99:.1f} ms")
+        self._perf_job = self.master.after(self.PERF_REPORT_MS, self._show_perf)
 
     def update_status_bar(self, event=None):
         # Update Line and Column
@@ -582,22 +6006,14 @@ class CodeEditor:
         line, col = map(int, cursor_pos.split('.'))
         self.status_bar_file_info_label.config(text=f"Ln {line}, Col {col}")
 
-        # Update Language (basic, could be improved based on file extension)
+        # Update Language from the grammar picked for the file extension
         if self.current_file:
-            ext = os.path.splitext(self.current_file)[1].lower()
-            lang = "Texto Plano"
-            if ext == ".py": lang = "Python"
-            elif ext == ".js": lang = "JavaScript"
-            elif ext == ".html": lang = "HTML"
-            elif ext == ".css": lang = "CSS"
-            elif ext == ".json": lang = "JSON"
-            elif ext == ".xml": lang = "XML"
-            self.status_bar_lang_label.config(text=lang)
+            self.status_bar_lang_label.config(text=self.highlighter.grammar.name)
         else:
             self.status_bar_lang_label.config(text="Texto Plano")
 
-        # You would implement actual Git status, problem counting here
-        # For now, they remain static.
+        # You would implement actual Git status here (the problem count is kept by _update_problems_tab)
+        # For now, it remains static.
 
 
     def create_menu(self):
@@ -611,33 +6027,69 @@ class CodeEditor:
         file_menu.add_separator()
         file_menu.add_command(label="Abrir Archivo...", command=self.open_file)
         file_menu.add_command(label="Abrir Carpeta...", command=lambda: self.open_folder(filedialog.askdirectory()))
+        file_menu.add_command(label="Abrir rápido...", command=self.quick_open, accelerator="Ctrl+P")
+        file_menu.add_command(label="Abrir en visor de solo lectura...", command=self.open_file_in_viewer)
         file_menu.add_separator()
-        file_menu.add_command(label="Guardar", command=self.save_file)
+        file_menu.add_command(label="Guardar", command=lambda: self.save_file())
         file_menu.add_command(label="Guardar como...", command=self.save_file_as)
+        file_menu.add_command(label="Cerrar pestaña", command=self.close_document, accelerator="Ctrl+W")
         file_menu.add_separator()
-        file_menu.add_command(label="Salir", command=self.master.quit)
+        file_menu.add_command(label="Salir", command=self.on_closing)
 
         edit_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Editar", menu=edit_menu)
-        edit_menu.add_command(label="Deshacer", command=self.text_area.edit_undo)
-        edit_menu.add_command(label="Rehacer", command=self.text_area.edit_redo)
+        edit_menu.add_command(label="Deshacer", command=lambda: self.text_area.edit_undo())
+        edit_menu.add_command(label="Rehacer", command=lambda: self.text_area.edit_redo())
         edit_menu.add_separator()
         edit_menu.add_command(label="Cortar", command=lambda: self.text_area.event_generate("<<Cut>>"))
         edit_menu.add_command(label="Copiar", command=lambda: self.text_area.event_generate("<<Copy>>"))
         edit_menu.add_command(label="Pegar", command=lambda: self.text_area.event_generate("<<Paste>>"))
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Ir a línea...", command=self.goto_line, accelerator="Ctrl+G")
+        edit_menu.add_command(label="Buscar en visor...", command=self.search_in_viewer)
+        edit_menu.add_command(label="Buscar...", command=self.open_find_bar, accelerator="Ctrl+F")
+        edit_menu.add_command(label="Reemplazar...", command=lambda: self.open_find_bar(replace=True),
+                              accelerator="Ctrl+H")
+        edit_menu.add_command(label="Buscar siguiente", command=self.find_next, accelerator="F3")
+        edit_menu.add_command(label="Ir a símbolo en el archivo...", command=self.goto_symbol_in_file,
+                              accelerator="Ctrl+Shift+O")
+        edit_menu.add_command(label="Ir a símbolo en el proyecto...", command=self.goto_symbol_in_project,
+                              accelerator="Ctrl+T")
+        self.master.bind("<Control-g>", self.goto_line)
+        self.master.bind("<Control-f>", self.open_find_bar)
+        self.master.bind("<Control-O>", self.goto_symbol_in_file)
+        self.master.bind("<Control-t>", self.goto_symbol_in_project)
+        self.master.bind("<Control-h>", lambda event: self.open_find_bar(replace=True))
+        self.master.bind("<F3>", self.find_next)
+        self.master.bind("<Shift-F3>", self.find_previous)
+        self.master.bind("<Control-p>", self.quick_open)
+        self.master.bind("<Control-w>", lambda event: self.close_document())
+        self.master.bind("<Control-Tab>", self.next_document)
+        self.master.bind("<Escape>", self.cancel_file_load)
+
+        run_menu = Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Ejecutar", menu=run_menu)
+        run_menu.add_command(label="Ejecutar archivo", command=self.run_current_file, accelerator="F5")
+        run_menu.add_command(label="Ejecutar tarea", command=self.run_task, accelerator="Ctrl+Shift+B")
+        run_menu.add_command(label="Configurar tarea...", command=lambda: self.run_task(ask=True))
+        run_menu.add_command(label="Detener", command=self.stop_task, accelerator="Shift+F5")
+        self.master.bind("<F5>", self.run_current_file)
+        self.master.bind("<Shift-F5>", self.stop_task)
+        self.master.bind("<Control-B>", self.run_task)
 
         view_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Ver", menu=view_menu)
         view_menu.add_command(label="Mostrar/Ocultar Barra Lateral", command=self.toggle_sidebar)
         view_menu.add_command(label="Mostrar/Ocultar Panel Inferior", command=self.toggle_bottom_panel)
+        view_menu.add_command(label="Mostrar archivo en el explorador", command=self.reveal_current_file)
+        view_menu.add_command(label="Esquema", command=lambda: self.show_sidebar_view("outline", toggle=False))
+        view_menu.add_command(label="Buscar en el proyecto", command=lambda: self.show_sidebar_view("search", toggle=False),
+                              accelerator="Ctrl+Shift+F")
 
 
     def new_file(self):
-        self.text_area.delete(1.0, tk.END)
-        self.current_file = None
-        self.master.title("TkCode - Sin título")
+        self.activate_document(self._create_document(None))
         self.update_status_bar() # Update all status bar info
-        self.update_line_numbers()
 
     def open_file(self):
         filepath = filedialog.askopenfilename(
@@ -654,20 +6106,85 @@ class CodeEditor:
         self.open_file_by_path(filepath)
 
 
-    def save_file(self):
-        if self.current_file:
-            try:
-                with open(self.current_file, "w", encoding="utf-8") as output_file:
-                    text = self.text_area.get(1.0, tk.END)
-                    output_file.write(text)
-                self.status_bar_file_info_label.config(text=f"Guardado: {os.path.basename(self.current_file)}")
-                self.update_status_bar() # Update new status bar
-            except Exception as e:
-                messagebox.showerror("Error al guardar archivo", f"No se pudo guardar el archivo:\n{e}")
-        else:
-            self.save_file_as()
+    def save_file(self, doc=None, on_saved=None):
+        """Saves doc (the active document by default) on the save thread; on_saved() runs once it is written."""
+        doc = doc or self.doc
+        if doc.viewer is not None:
+            self.status_bar_file_info_label.config(text="El visor de archivos grandes es de solo lectura.")
+            return
+        if doc.loader is not None:
+            self.status_bar_file_info_label.config(text="Espera a que termine la carga del archivo para guardar.")
+            return
+        if doc.path is None:
+            self.activate_document(doc)
+            self.save_file_as(on_saved)
+            return
+        snapshot = self._text_snapshot(doc) # Joined into one string on the save thread
+        doc.text.edit_modified(False) # Edits made while it is written mark it modified again
+        self._update_tabs()
+        self.status_bar_file_info_label.config(text=f"Guardando: {doc.name()}…")
+        self._saves_pending += 1
+        self.save_executor.submit(self._save_worker, doc, doc.path, snapshot, on_saved)
+        if self._save_poll_job is None:
+            self._save_poll_job = self.master.after(self.SAVE_POLL_MS, self._poll_saves)
+
+    def _save_worker(self, doc, path, snapshot, on_saved):
+        # Save thread: skip the write when neither the text nor the file changed since the last save
+        try:
+            text = snapshot.text()
+            digest = hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+            if doc.saved is not None and doc.saved[:2] == (path, digest):
+                try:
+                    current = os.stat(path)
+                    if (current.st_size, current.st_mtime_ns) == doc.saved[2]:
+                        self._save_queue.put((doc, path, snapshot, on_saved, "unchanged"))
+                        return
+                except OSError:
+                    pass # Deleted meanwhile: write it again
+            written = _write_file_atomically(path, text)
+            doc.saved = (path, digest, (written.st_size, written.st_mtime_ns))
+            self._save_queue.put((doc, path, snapshot, on_saved, "written"))
+        except Exception as e:
+            self._save_queue.put((doc, path, snapshot, on_saved, e))
 
-    def save_file_as(self):
+    def _poll_saves(self):
+        """Reports finished saves; a failed save marks the document modified again."""
+        self._save_poll_job = None
+        while True:
+            try:
+                doc, path, snapshot, on_saved, result = self._save_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._saves_pending -= 1
+            name = os.path.basename(path)
+            if isinstance(result, Exception):
+                self.status_bar_file_info_label.config(text=f"Error al guardar: {name}")
+                if doc in self.documents and doc.text is not None:
+                    doc.text.edit_modified(True)
+                    self._journal_snapshot(doc) # The file does not hold what the journal assumed
+                    self._update_tabs()
+                else: # Closed while saving: keep the text in a new tab rather than losing it
+                    recovered = self._create_document(None)
+                    self.activate_document(recovered)
+                    recovered.text.insert("1.0", snapshot.text())
+                messagebox.showerror("Error al guardar archivo", f"No se pudo guardar el archivo:\n{result}")
+                continue
+            if result == "written":
+                self.status_bar_file_info_label.config(text=f"Guardado: {name}")
+                self._on_file_saved(path)
+            else:
+                self.status_bar_file_info_label.config(text=f"Sin cambios: {name}")
+            if doc in self.documents and doc.text is not None:
+                self._journal_saved(doc, path, snapshot)
+            if on_saved is not None:
+                on_saved()
+        if self._saves_pending > 0:
+            self._save_poll_job = self.master.after(self.SAVE_POLL_MS, self._poll_saves)
+
+    def save_file_as(self, on_saved=None):
+        if self.viewer is not None:
+            self.status_bar_file_info_label.config(text="El visor de archivos grandes es de solo lectura.")
+            return
         filepath = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Archivos de texto", "*.txt"),
@@ -680,118 +6197,257 @@ class CodeEditor:
         if not filepath:
             return
         self.current_file = filepath
-        self.save_file()
+        self.save_file(on_saved=on_saved)
         self.master.title(f"TkCode - {os.path.basename(filepath)}")
+        if grammar_for_path(filepath) is not self.highlighter.grammar:
+            self.highlighter.set_grammar(grammar_for_path(filepath))
+            self.highlight_syntax()
 
 
     def on_key_release(self, event=None):
-        self.update_line_numbers()
-        self.highlight_syntax()
-        self.update_status_bar() # Update status bar on key release
+        self.scheduler.mark_dirty("gutter")
+        self.scheduler.mark_dirty("highlight")
+        self.scheduler.mark_dirty("status") # Update status bar on key release
+        if event is not None:
+            self._on_completion_key(event)
 
 
-    def on_vertical_scroll(self, *args):
-        self.line_numbers_canvas.yview_moveto(args[0])
-        self.update_line_numbers()
+    def on_vertical_scroll(self, doc, first, last):
+        if doc.viewer is not None:
+            doc.viewer.on_scroll(first, last) # The scrollbar tracks file lines, not widget lines
+        else:
+            doc.text.vbar.set(first, last)
+        if doc is self.doc:
+            self.scheduler.mark_dirty("gutter", 0)
+            self.scheduler.mark_dirty("highlight") # Tag lines scrolled into view
+            if self.find is not None:
+                self.scheduler.mark_dirty("find_tags")
 
 
     def update_line_numbers(self, event=None):
-        self.line_numbers_canvas.delete("all")
-
-        first_visible_char_index = self.text_area.index("@0,0")
-        # Ensure winfo_height() is available; if not, use a default
-        editor_height = self.text_area.winfo_height()
-        if editor_height <= 1: # If widget not yet rendered or too small
-            editor_height = 20 # Assume a minimum height for initial calculation
-
-        last_visible_char_index = self.text_area.index("@0,%d" % editor_height)
+        # The huge file viewer shows a window of the file starting at window_start
+        self.gutter.line_offset = self.viewer.window_start - 1 if self.viewer is not None else 0
+        self.gutter.redraw()
+
+
+    def _install_edit_hook(self, doc):
+        """Routes a document's Tk text widget command through Python to observe every edit."""
+        widget = doc.text._w
+        orig = widget + "_orig"
+        doc.text.tk.call("rename", widget, orig)
+        doc.text.tk.createcommand(widget, lambda *args: self._text_proxy(doc, orig, *args))
+
+    def _text_proxy(self, doc, orig, *args):
+        call = doc.text.tk.call
+        if args[0] not in ("insert", "delete", "replace"):
+            return call((orig,) + args)
+
+        # Lines touched by the edit, measured before and after it happens
+        first = call(orig, "index", args[1])
+        if call(orig, "compare", first, ">", "end-1c"):
+            first = call(orig, "index", "end-1c")
+        last = first
+        if args[0] != "insert":
+            last = call(orig, "index", args[2] if len(args) > 2 else f"{first}+1c")
+            if call(orig, "compare", last, ">", "end-1c"):
+                last = call(orig, "index", "end-1c")
+        buffer = doc.buffer
+        if buffer is not None:
+            lines_before = buffer.line_count
+        else:
+            lines_before = int(call(orig, "index", "end-1c").split('.')[0])
+        result = call((orig,) + args)
+        lines_after = int(call(orig, "index", "end-1c").split('.')[0])
 
+        if args[0] == "delete" and len(args) > 3: # Several ranges at once: treat it as a change of every line
+            change = TextChange(None, None, "", 1, lines_before, lines_after)
+        else:
+            first_line = int(first.split('.')[0])
+            old_last_line = max(int(last.split('.')[0]), first_line)
+            inserted = "" if args[0] == "delete" else "".join(args[2::2] if args[0] == "insert" else args[3::2])
+            change = TextChange(first, last, inserted, first_line, old_last_line,
+                                old_last_line + lines_after - lines_before)
+        if buffer is None:
+            self.on_text_edit(doc, change)
+        else:
+            # The new lines are read back from the widget, so the buffer matches whatever Tk stored
+            buffer.apply(change, call(orig, "get", f"{change.first_line}.0", f"{change.new_last_line}.end"))
+        return result
+
+    def _journal_edit(self, doc, change):
+        """Appends an edit seen by the text proxy to the journal."""
+        if not doc.journal_base or change.start is None:
+            self._journal_snapshot(doc) # Nothing to replay on, or several ranges deleted at once
+            return
+        if change.end != change.start:
+            self.journal.record(["d", doc.journal_id, change.start, change.end])
+        if change.text:
+            self.journal.record(["i", doc.journal_id, change.start, change.text])
+
+    def _journal_record(self, doc, entry):
+        if self.journal is not None and not self._journal_restoring:
+            self.journal.record(entry)
+            doc.journal_base = True
+
+    def _journal_saved(self, doc, path, snapshot):
+        """Starts doc's journal over from the file it was just saved to."""
+        if doc.path != path or (doc.buffer is not None and doc.buffer.version != snapshot.version):
+            self._journal_snapshot(doc) # Edited while it was written: the file is not the base of new edits
+            return
+        # Until now the edits kept going to the previous base, which still holds if the save never finishes
+        doc.journal_digest = doc.saved[1]
+        self._journal_record(doc, ["base", doc.journal_id, doc.path, None, doc.journal_digest])
+
+    def _journal_snapshot(self, doc):
+        """Starts doc's journal over from its whole current text."""
+        self._journal_record(doc, ["base", doc.journal_id, doc.path, self._text_snapshot(doc).text()])
+
+    def _journal_tabs(self):
+        """Adds the open tabs, with their cursors, to the journal (called by every flush)."""
+        tabs = []
+        for doc in self.documents:
+            if doc.viewer is not None or (doc.path is None and not doc.modified()):
+                continue # Viewer tabs and empty buffers are not worth restoring
+            if doc.text is not None:
+                tabs.append([doc.journal_id, doc.path, doc.text.index(tk.INSERT), doc.text.yview()[0]])
+            else:
+                tabs.append([doc.journal_id, doc.path, doc.cursor, doc.yview])
+        self.journal.pending.append(["tabs", tabs, self.doc.journal_id])
+
+    def _compact_journal(self):
+        """Rewrites the journal as one base per document: the whole text of unsaved ones, else the file."""
+        entries = []
+        for doc in self.documents:
+            if doc.buffer is not None and (doc.modified() or doc.path is None) and doc.loader is None:
+                entries.append(["base", doc.journal_id, doc.path, doc.buffer.snapshot().text()])
+            else:
+                entries.append(["base", doc.journal_id, doc.path, None, doc.journal_digest])
+            doc.journal_base = True
+        self.journal.pending = []
+        self._journal_tabs()
+        self.journal.rewrite(entries + self.journal.pending)
+
+    def _open_journal(self, root):
+        """Switches to root's journal: restores the tabs saved in it, then keeps every open tab in it."""
+        path = _cache_file("journal", root, ".jsonl")
+        old = self.journal
+        if old is not None:
+            if old.path == path:
+                return
+            old.discard() # The open tabs move to the new journal
+        self.journal = EditJournal(self.master, path, self.JOURNAL_INTERVAL_MS, self.JOURNAL_MAX_BYTES)
+        self.journal.before_flush = self._journal_tabs
+        self.journal.on_full = self._compact_journal
+        self._restore_journal()
+        self._compact_journal() # Also drops the previous session's ids
+
+    def _restore_journal(self):
+        tabs, active, chains = EditJournal.read(self.journal.path)
+        restored = {}
+        conflicts = [] # Files changed on disk since their edits were journaled
+        self._journal_restoring = True
         try:
-            first_line_num = int(float(first_visible_char_index))
-        except ValueError:
-            first_line_num = 1
-
+            for journal_id, path, cursor, yview in tabs:
+                if path is not None and self._find_document(path) is not None:
+                    continue
+                chain = chains.get(journal_id)
+                if chain is None or (chain[1] is None and not chain[2]):
+                    if path is None or not os.path.isfile(path):
+                        continue
+                    doc = self._create_document(path) # Loaded when its tab is selected, like an evicted tab
+                    doc.cursor, doc.yview = cursor, yview
+                else:
+                    doc = self._restore_buffer(path, chain[1], chain[2], chain[3], conflicts)
+                    if doc is None:
+                        continue
+                    if doc.text is not None:
+                        doc.text.mark_set(tk.INSERT, cursor)
+                    else:
+                        doc.cursor = cursor
+                    doc.yview = yview
+                restored[journal_id] = doc
+        finally:
+            self._journal_restoring = False
+        if not restored:
+            return
+        blank = self.doc
+        target = restored.get(active) or next(iter(restored.values()))
+        had_widget = target.text is not None
+        self.activate_document(target) # An evicted-style tab restores its own view once loaded
+        if had_widget:
+            target.text.yview_moveto(target.yview)
+        if (blank is not target and blank.path is None and blank.loader is None and not blank.modified()
+                and blank.text.compare("end-1c", "==", "1.0")):
+            self.close_document(blank) # The empty tab opened at startup
+        self.status_bar_file_info_label.config(text=f"Restauradas {len(restored)} pestañas de la sesión anterior")
+        if conflicts:
+            messagebox.showwarning("Recuperación de sesión", "Estos archivos cambiaron en el disco después de la "
+                                   "última sesión, así que sus cambios sin guardar no se han vuelto a aplicar:\n"
+                                   + "\n".join(conflicts) + "\n\nEl texto que se había escrito en ellos está en "
+                                   "pestañas sin título.")
+
+    def _restore_buffer(self, path, base, edits, digest=None, conflicts=None):
+        """A new document holding base (or the file at path) with the journaled edits replayed.
+
+        If the file no longer has the digest the edits were journaled against,
+        they would land at the wrong places: the file is opened as it is, and
+        the inserted text goes to an untitled tab instead (path is added to
+        conflicts).
+        """
+        if base is None and path is None:
+            base = "" # An untitled buffer that started empty
+        elif base is None:
+            try:
+                with open(path, encoding="utf-8") as source:
+                    base = source.read()
+            except (OSError, UnicodeDecodeError):
+                return None
+            if digest is not None and hashlib.sha1(base.encode("utf-8", "surrogatepass")).hexdigest() != digest:
+                typed = "\n".join(edit[3] for edit in edits if edit[0] == "i")
+                if typed.strip():
+                    self._restore_buffer(None, typed, [])
+                    if conflicts is not None:
+                        conflicts.append(path)
+                return self._create_document(path) # Loaded from disk when its tab is selected
+        doc = self._create_document(path)
+        self._create_text_widget(doc)
+        text = doc.text
+        text.config(undo=False)
+        text.insert("1.0", base)
         try:
-            last_line_num = int(float(last_visible_char_index))
-        except ValueError:
-            last_line_num = first_line_num
-
-        if self.text_area.compare("end-1c", "==", "1.0"):
-             first_line_num = 1
-             last_line_num = 1
-
-        y_offset_info = self.text_area.dlineinfo(f"{first_line_num}.0")
-        if y_offset_info:
-            y_offset = y_offset_info[1]
-        else:
-            y_offset = 0
-
-        for i in range(first_line_num, last_line_num + 3): # Draw a few extra lines for smooth scrolling
-            current_line_index = f"{i}.0"
-            dline_info = self.text_area.dlineinfo(current_line_index)
-
-            if dline_info is None:
-                break
-
-            y_coord = dline_info[1] - y_offset
-            self.line_numbers_canvas.create_text(
-                5, y_coord, anchor="nw",
-                text=str(i),
-                fill="#6a737d",
-                font=("Consolas", 10)
-            )
-
-        self.line_numbers_canvas.yview_moveto(self.text_area.yview()[0])
-
+            for edit in edits:
+                if edit[0] == "i":
+                    text.insert(edit[2], edit[3])
+                else:
+                    text.delete(edit[2], edit[3])
+        except tk.TclError:
+            pass # Keep what could be replayed
+        text.config(undo=True)
+        text.edit_reset()
+        text.edit_modified(True)
+        return doc
+
+    def on_text_edit(self, doc, change):
+        """Called after every edit of a document's widget, with its buffer (if any) already updated."""
+        doc.highlighter.on_edit(change.first_line, change.old_last_line, change.new_last_line)
+        if doc.loader is not None:
+            return
+        if doc.words is not None:
+            doc.words.on_edit(change)
+        if doc is self.doc:
+            self.scheduler.mark_dirty("diagnostics")
+            self.scheduler.mark_dirty("symbols")
+            if doc.words is not None and doc.words.version is None:
+                self.scheduler.mark_dirty("words") # Restart the indexing the edit made stale
+        if self.find is not None and doc is self._find_doc:
+            self.find.on_edit(change)
+            self.scheduler.mark_dirty("find_tags")
+        # Viewer windows and large file mode have no buffer, and are not journaled
+        if change.version is not None and self.journal is not None and not self._journal_restoring:
+            self._journal_edit(doc, change)
 
     def highlight_syntax(self, event=None):
-        self.text_area.edit_separator()
-
-        for tag in self.text_area.tag_names():
-            # Exclude internal Tkinter tags and our custom terminal tags
-            if tag not in ["sel", "undo", "redo", "mark", "info", "error", "user_input"]:
-                self.text_area.tag_remove(tag, "1.0", tk.END)
-
-        text = self.text_area.get("1.0", tk.END)
-        lines = text.splitlines()
-
-        for i, line in enumerate(lines):
-            line_num = i + 1
-
-            for match in re.finditer(r"(#.*)", line):
-                start = f"{line_num}.{match.start(1)}"
-                end = f"{line_num}.{match.end(1)}"
-                self.text_area.tag_add("comment", start, end)
-
-            for match in re.finditer(r"(\".*?\"|\'.*?\')", line):
-                start = f"{line_num}.{match.start(1)}"
-                end = f"{line_num}.{match.end(1)}"
-                self.text_area.tag_add("string", start, end)
-
-            for match in re.finditer(r"\b\d+\b", line):
-                start = f"{line_num}.{match.start(0)}"
-                end = f"{line_num}.{match.end(0)}"
-                self.text_area.tag_add("number", start, end)
-
-            for match in re.finditer(r"(\+|\-|\*|\/|=|\!|\<|\>|&|\||\^|%|\~|\.|\:|\,)", line):
-                 start = f"{line_num}.{match.start(1)}"
-                 end = f"{line_num}.{match.end(1)}"
-                 self.text_area.tag_add("operator", start, end)
-
-            for keyword in self.keywords:
-                for match in re.finditer(r"\b" + re.escape(keyword) + r"\b", line):
-                    start = f"{line_num}.{match.start(0)}"
-                    end = f"{line_num}.{match.end(0)}"
-                    self.text_area.tag_add("keyword", start, end)
-
-            for match in re.finditer(r"\bdef\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(", line):
-                func_name_start = match.start(1)
-                func_name_end = match.end(1)
-                start = f"{line_num}.{func_name_start}"
-                end = f"{line_num}.{func_name_end}"
-                self.text_area.tag_add("function", start, end)
-
-        self.text_area.edit_separator()
+        self.scheduler.mark_dirty("highlight")
 
     def show_message(self, feature_name):
         """Placeholder function to show message when an icon is clicked."""
@@ -801,6 +6457,12 @@ class CodeEditor:
 
 # --- Ejecutar la aplicación ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TkCode - Editor de Código")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="muestra el tiempo de cada fase del arranque y sale")
+    parser.add_argument("--perf", action="store_true",
+                        help="activa la instrumentación de rendimiento (comando 'perf' de la terminal)")
+    args = parser.parse_args()
     root = tk.Tk()
-    editor = CodeEditor(root)
+    editor = CodeEditor(root, profile_startup=args.profile_startup, perf=args.perf)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import random
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def searched(text, pattern):
+    """A BufferSearch over text, past its first full search, following the buffer's edits."""
+    buffer = app.TextBuffer(text)
+    search = app.BufferSearch(buffer, pattern)
+    search.matches = app._find_all(buffer.snapshot().text(), pattern)
+    search.version = buffer.version
+    buffer.listeners.append(search.on_edit)
+    return buffer, search
+
+
+class FindAllTest(unittest.TestCase):
+
+    def test_positions(self):
+        self.assertEqual(app._find_all("ab ab\nxab", re.compile("ab")), [(1, 0, 1, 2), (1, 3, 1, 5), (2, 1, 2, 3)])
+        self.assertEqual(app._find_all("a\nb", re.compile("a\nb"), first_line=5), [(5, 0, 6, 1)])
+
+    def test_empty_matches_are_skipped(self):
+        self.assertEqual(app._find_all("aa\n\nb", re.compile("a*|^")), [(1, 0, 1, 2)])
+
+
+class BufferSearchTest(unittest.TestCase):
+
+    def test_edit_shifts_the_matches_below(self):
+        buffer, search = searched("foo\nbar\nfoo\nfoo", re.compile("foo"))
+        buffer.apply(app.TextChange("2.0", "2.3", "foo\nfoo\n", 2, 2, 4), "foo\nfoo\n")
+        self.assertEqual(search.matches, [(1, 0, 1, 3), (2, 0, 2, 3), (3, 0, 3, 3), (5, 0, 5, 3), (6, 0, 6, 3)])
+        self.assertEqual(search.version, buffer.version)
+        self.assertEqual(search.index_at(3, 1), 3)
+        self.assertEqual(search.index_at(7, 0), 5)
+
+    def test_match_spanning_into_the_edit(self):
+        buffer, search = searched("xx\nab\ncd\nyy", re.compile("b\nc"))
+        self.assertEqual(search.matches, [(2, 1, 3, 1)])
+        buffer.apply(app.TextChange("3.0", "3.1", "", 3, 3, 3), "d")
+        self.assertEqual(search.matches, [])
+        buffer.apply(app.TextChange("3.0", "3.0", "c", 3, 3, 3), "cd")
+        self.assertEqual(search.matches, [(2, 1, 3, 1)])
+
+    def test_edits_before_the_first_search_are_ignored(self):
+        buffer = app.TextBuffer("foo")
+        search = app.BufferSearch(buffer, re.compile("foo"))
+        buffer.listeners.append(search.on_edit)
+        buffer.apply(app.TextChange("1.0", "1.0", "foo", 1, 1, 1), "foofoo")
+        self.assertEqual((search.matches, search.version), ([], None))
+
+    def test_on_edit_matches_a_full_search(self):
+        words = ["ab", "abba", "Foo", "foo", "x", ""]
+        for pattern in (re.compile("ab+"), re.compile(r"\bfoo\b", re.I), re.compile("a")):
+            rnd = random.Random(pattern.pattern)
+
+            def random_line():
+                return " ".join(rnd.choice(words) for _ in range(rnd.randint(0, 4)))
+
+            buffer, search = searched("\n".join(random_line() for _ in range(100)), pattern)
+            for _ in range(300):
+                first = rnd.randint(1, buffer.line_count)
+                last = min(buffer.line_count, first + rnd.randint(0, 3))
+                lines = [random_line() for _ in range(rnd.randint(1, 4))]
+                buffer.apply(app.TextChange(None, None, "", first, last, first + len(lines) - 1), "\n".join(lines))
+                self.assertEqual(search.matches, app._find_all(buffer.snapshot().text(), pattern))
+
+
+if __name__ == "__main__":
+    unittest.main()
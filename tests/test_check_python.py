@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+try:
+    import pyflakes
+except ImportError:
+    pyflakes = None
+
+
+class CheckPythonTest(unittest.TestCase):
+
+    def test_syntax_error_position(self):
+        (severity, line, column, message), = app._check_python("x = 1\nif x\n    pass\n", "m.py")
+        self.assertEqual((severity, line), ("error", 2))
+        self.assertGreaterEqual(column, 0) # Python's offsets are 1-based
+        self.assertTrue(message)
+
+    def test_unterminated_string(self):
+        (severity, line, column, message), = app._check_python("a = 1\nb = 'open\n", "m.py")
+        self.assertEqual((severity, line, column), ("error", 2, 4))
+        self.assertIn("unterminated string", message)
+
+    def test_null_byte(self):
+        (severity, line, column, _), = app._check_python("x = 1\0\n", "m.py")
+        self.assertEqual((severity, line, column), ("error", 1, 0))
+
+    def test_valid_source_without_pyflakes(self):
+        with mock.patch.dict(sys.modules, {"pyflakes": None}):
+            self.assertEqual(app._check_python("import os\nprint(undefined)\n", "m.py"), [])
+
+    @unittest.skipIf(pyflakes is None, "pyflakes is not installed")
+    def test_pyflakes_messages_sorted_by_position(self):
+        results = app._check_python("print(undefined)\nimport os\n", "m.py")
+        self.assertEqual([result[:3] for result in results], [("error", 1, 6), ("warning", 2, 0)])
+        self.assertIn("undefined", results[0][3])
+        self.assertIn("os", results[1][3])
+
+
+if __name__ == "__main__":
+    unittest.main()
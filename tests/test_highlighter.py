@@ -0,0 +1,73 @@
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class IncrementalHighlighterTest(unittest.TestCase):
+
+    PIECES = ["x = 1", '"""', "def f():", "# c", "'a'", 's = """ab', 'end"""', ""]
+
+    def highlighter(self, lines):
+        buffer = app.TextBuffer("\n".join(lines))
+        highlighter = app.IncrementalHighlighter(mock.MagicMock(), app.GRAMMARS["python"], buffer)
+        highlighter.reset()
+        self.view = [0, 60]
+        highlighter.visible_range = lambda: tuple(self.view)
+        return buffer, highlighter
+
+    def assertMatchesFullLex(self, buffer, highlighter, message=""):
+        state = None
+        for i, line in enumerate(buffer.lines(1, buffer.line_count)):
+            tokens, state = highlighter.grammar.lex_line(line, state)
+            self.assertEqual((highlighter.tokens[i], highlighter.states[i]), (tokens, state),
+                             f"{message}line {i + 1}")
+
+    def test_refresh_only_lexes_the_viewport(self):
+        buffer, highlighter = self.highlighter(["x = 1"] * 1000)
+        highlighter.refresh()
+        self.assertEqual(highlighter.invalid_from, 61)
+        self.assertIsNone(highlighter.tokens[100])
+
+    def test_opening_a_string_relexes_the_lines_below(self):
+        buffer, highlighter = self.highlighter(["x = 1"] * 100)
+        for _ in highlighter.run():
+            pass
+        buffer.replace_lines(10, 10, ['s = """'])
+        highlighter.on_edit(10, 10, 10)
+        for _ in highlighter.run():
+            pass
+        self.assertEqual(highlighter.tokens[50], [("string", 0, 5)])
+        self.assertMatchesFullLex(buffer, highlighter)
+
+    def test_interrupted_fills_match_a_full_lex(self):
+        # Random edits, each followed by a background fill cut short by the next one
+        for seed in range(10):
+            rnd = random.Random(seed)
+            buffer, highlighter = self.highlighter(rnd.choice(self.PIECES) for _ in range(300))
+            for _ in highlighter.run():
+                pass
+            for _ in range(300):
+                first = rnd.randint(1, buffer.line_count)
+                last = min(buffer.line_count, first + rnd.randint(0, 2))
+                lines = [rnd.choice(self.PIECES) for _ in range(rnd.randint(1, 3))]
+                buffer.replace_lines(first, last, lines)
+                highlighter.on_edit(first, last, first + len(lines) - 1)
+                self.view[:] = [max(0, first - 30), max(0, first - 30) + 60]
+                job = highlighter.run()
+                for _ in range(rnd.randint(0, 2)):
+                    next(job, None)
+                if rnd.random() < 0.2:
+                    for _ in job:
+                        pass
+            for _ in highlighter.run():
+                pass
+            self.assertMatchesFullLex(buffer, highlighter, f"seed {seed}, ")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import collections
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def built(buffer):
+    index = app.IdentifierIndex(buffer)
+    for _ in index.build(buffer.snapshot()):
+        pass
+    return index
+
+
+class IdentifierIndexTest(unittest.TestCase):
+
+    def test_complete_ignores_case(self):
+        index = built(app.TextBuffer("Buffer buffer buffered\nbu _private 2abc über Über\nbuffer"))
+        self.assertEqual(index.complete("BUF"), [("Buffer", 1), ("buffer", 2), ("buffered", 1)])
+        self.assertEqual(index.complete("üb"), [("Über", 1), ("über", 1)])
+        self.assertEqual(index.complete("_p"), [("_private", 1)])
+        self.assertEqual(index.complete("abc"), []) # Identifiers do not start with a digit
+        self.assertEqual(index.complete("bu")[0][0], "Buffer") # "bu" is too short to be indexed
+
+    def test_edits_update_counts_and_names(self):
+        buffer = app.TextBuffer("alpha beta\nalpha")
+        index = built(buffer)
+        buffer.listeners.append(index.on_edit)
+        buffer.apply(app.TextChange("1.6", "1.10", "gamma", 1, 1, 1), "alpha gamma")
+        self.assertEqual(index.counts, {"alpha": 2, "gamma": 1})
+        self.assertEqual(index.names, [("alpha", "alpha"), ("gamma", "gamma")])
+        buffer.apply(app.TextChange("1.0", "2.5", "Alpha", 1, 2, 1), "Alpha")
+        self.assertEqual(index.complete("al"), [("Alpha", 1)])
+        self.assertEqual(index.version, buffer.version)
+
+    def test_build_is_dropped_if_the_buffer_changed(self):
+        buffer = app.TextBuffer("first second")
+        index = app.IdentifierIndex(buffer)
+        build = index.build(buffer.snapshot())
+        next(build)
+        buffer.replace_lines(1, 1, ["third"])
+        for _ in build:
+            pass
+        self.assertIsNone(index.version)
+        self.assertEqual(index.complete(""), [])
+
+    def test_reset_from_counts(self):
+        index = app.IdentifierIndex()
+        index.reset(collections.Counter({"Symbol": 3, "symbolic": 1, "other": 2}))
+        self.assertEqual(index.complete("sym"), [("Symbol", 3), ("symbolic", 1)])
+
+    def test_scan_limit(self):
+        index = app.IdentifierIndex()
+        index.reset({f"name{n:03}": 1 for n in range(300)})
+        with mock.patch.object(app.IdentifierIndex, "SCAN_LIMIT", 50):
+            self.assertEqual(len(index.complete("name")), 50)
+            self.assertEqual(len(index.complete("name2")), 50) # A longer prefix starts further in
+            self.assertEqual(index.complete("name29")[-1], ("name299", 1))
+
+    def test_on_edit_matches_a_rebuild(self):
+        rnd = random.Random(2)
+        words = ["foo", "Foo", "FOO", "bar", "baz_1", "x", "abba", "Über", "über", ""]
+
+        def random_line():
+            return " ".join(rnd.choice(words) for _ in range(rnd.randint(0, 4)))
+
+        buffer = app.TextBuffer("\n".join(random_line() for _ in range(100)))
+        index = built(buffer)
+        buffer.listeners.append(index.on_edit)
+        for _ in range(300):
+            first = rnd.randint(1, buffer.line_count)
+            last = min(buffer.line_count, first + rnd.randint(0, 3))
+            lines = [random_line() for _ in range(rnd.randint(1, 4))]
+            buffer.apply(app.TextChange(None, None, "", first, last, first + len(lines) - 1), "\n".join(lines))
+            fresh = built(buffer)
+            self.assertEqual((index.counts, index.names, index.lines), (fresh.counts, fresh.names, fresh.lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
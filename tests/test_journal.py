@@ -0,0 +1,199 @@
+import functools
+import hashlib
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class FakeMaster:
+    """after() only remembers the callback; the tests flush by hand."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def after(self, ms, callback):
+        self.jobs[len(self.jobs) + 1] = callback
+        return len(self.jobs)
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+
+class FakeText:
+    """A Text widget reduced to what _restore_buffer uses, with "line.column" indices."""
+
+    def __init__(self):
+        self.content = ""
+        self.modified = False
+
+    def _offset(self, index):
+        line, column = map(int, index.split("."))
+        lines = self.content.split("\n")
+        if line > len(lines) or column > len(lines[line - 1]):
+            raise app.tk.TclError(f"bad index {index}")
+        return sum(len(text) + 1 for text in lines[:line - 1]) + column
+
+    def insert(self, index, text):
+        offset = self._offset(index)
+        self.content = self.content[:offset] + text + self.content[offset:]
+
+    def delete(self, first, last):
+        first, last = self._offset(first), self._offset(last)
+        self.content = self.content[:first] + self.content[last:]
+
+    def config(self, **options):
+        pass
+
+    def edit_reset(self):
+        pass
+
+    def edit_modified(self, flag):
+        self.modified = flag
+
+
+def sha1(text):
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class EditJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "journal.jsonl")
+        self.master = FakeMaster()
+
+    def journal(self, max_bytes=1 << 20):
+        journal = app.EditJournal(self.master, self.path, 500, max_bytes)
+        self.addCleanup(journal.writer.shutdown)
+        return journal
+
+    def test_typing_and_backspace_are_merged(self):
+        journal = self.journal()
+        journal.record(["base", 1, "a.py", None, "digest"])
+        for column, char in enumerate("abc"):
+            journal.record(["i", 1, f"1.{column}", char])
+        journal.record(["i", 1, "1.3", "\n"])
+        journal.record(["i", 1, "2.0", "x"]) # A run ends after a newline
+        journal.record(["d", 1, "2.0", "2.1"])
+        journal.record(["d", 1, "1.2", "1.3"])
+        journal.record(["d", 1, "1.1", "1.2"]) # Backspace
+        self.assertEqual(journal.pending, [["base", 1, "a.py", None, "digest"], ["i", 1, "1.0", "abc\n"],
+                                           ["i", 1, "2.0", "x"],
+                                           ["d", 1, "2.0", "2.1"], ["d", 1, "1.1", "1.3"]])
+        self.assertEqual(len(self.master.jobs), 1) # One flush scheduled
+
+    def test_flush_and_read_back(self):
+        journal = self.journal()
+        journal.before_flush = lambda: journal.pending.append(["tabs", [[1, "a.py", "1.3", 0.0], [2, None, "1.0", 0.5]], 2])
+        journal.record(["base", 1, "a.py", None, "d1"])
+        journal.record(["i", 1, "1.0", "héllo"])
+        journal.record(["base", 2, None, "untitled", None])
+        journal.record(["d", 2, "1.0", "1.2"])
+        journal.flush()
+        self.assertEqual(self.master.jobs, {})
+        journal.record(["base", 1, "a.py", None, "d2"]) # Saved: a new base drops the earlier edits
+        journal.record(["i", 1, "1.0", "#"])
+        journal.flush()
+        journal.close()
+        tabs, active, chains = app.EditJournal.read(self.path)
+        self.assertEqual(tabs, [[1, "a.py", "1.3", 0.0], [2, None, "1.0", 0.5]])
+        self.assertEqual(active, 2)
+        self.assertEqual(chains, {1: ("a.py", None, [["i", 1, "1.0", "#"]], "d2"),
+                                  2: (None, "untitled", [["d", 2, "1.0", "1.2"]], None)})
+
+    def test_read_skips_a_line_cut_short_and_old_bases(self):
+        with open(self.path, "w", encoding="utf-8") as journal:
+            journal.write('["base",1,"a.py",null]\n["i",1,"1.0","x"]\n["i",7,"1.0","orphan"]\n["i",1,"1.1","y')
+        tabs, active, chains = app.EditJournal.read(self.path)
+        self.assertEqual((tabs, active), ([], None))
+        self.assertEqual(chains, {1: ("a.py", None, [["i", 1, "1.0", "x"]], None)})
+
+    def test_missing_file(self):
+        self.assertEqual(app.EditJournal.read(self.path), ([], None, {}))
+
+    def test_full_journal_asks_for_compaction(self):
+        journal = self.journal(max_bytes=100)
+        full = []
+        journal.on_full = lambda: full.append(True) or journal.rewrite([["base", 1, None, "x" * 150, None]])
+        journal.record(["base", 1, None, "x" * 150, None])
+        journal.flush()
+        self.assertEqual(full, [True])
+        self.assertGreaterEqual(journal.limit, 2 * journal.size) # A big buffer does not compact every flush
+        journal.record(["i", 1, "1.0", "y"])
+        journal.flush()
+        self.assertEqual(full, [True])
+        journal.close()
+        self.assertEqual(app.EditJournal.read(self.path)[2],
+                         {1: (None, "x" * 150, [["i", 1, "1.0", "y"]], None)})
+
+    def test_discard_deletes_the_file(self):
+        journal = self.journal()
+        journal.record(["base", 1, None, "text", None])
+        journal.flush()
+        journal.discard()
+        journal.writer.shutdown(wait=True)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class RestoreBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "a.py")
+        with open(self.path, "w", encoding="utf-8") as source:
+            source.write("def f():\n    return 1\n")
+        self.created = []
+        editor = types.SimpleNamespace(_create_document=self._create_document,
+                                       _create_text_widget=lambda doc: setattr(doc, "text", FakeText()))
+        editor._restore_buffer = functools.partial(app.CodeEditor._restore_buffer, editor)
+        self.restore = editor._restore_buffer
+
+    def _create_document(self, path):
+        doc = types.SimpleNamespace(path=path, text=None)
+        self.created.append(doc)
+        return doc
+
+    def test_edits_are_replayed_on_the_file_they_were_made_on(self):
+        edits = [["i", 1, "1.0", "# top\n"], ["d", 1, "3.11", "3.12"], ["i", 1, "3.11", "2"]]
+        conflicts = []
+        doc = self.restore(self.path, None, edits, sha1("def f():\n    return 1\n"), conflicts)
+        self.assertEqual(doc.text.content, "# top\ndef f():\n    return 2\n")
+        self.assertTrue(doc.text.modified)
+        self.assertEqual(conflicts, [])
+
+    def test_changed_file_keeps_its_content_and_the_typed_text_goes_to_a_new_tab(self):
+        edits = [["i", 1, "1.0", "# top\n"], ["d", 1, "2.0", "2.4"], ["i", 1, "2.0", "extra"]]
+        conflicts = []
+        doc = self.restore(self.path, None, edits, sha1("something else"), conflicts)
+        self.assertEqual(doc.path, self.path)
+        self.assertIsNone(doc.text) # Loaded from disk when selected
+        untitled, = [created for created in self.created if created.path is None]
+        self.assertEqual(untitled.text.content, "# top\n\nextra")
+        self.assertEqual(conflicts, [self.path])
+
+    def test_changed_file_with_only_deletions(self):
+        conflicts = []
+        doc = self.restore(self.path, None, [["d", 1, "1.0", "1.3"]], sha1("other"), conflicts)
+        self.assertIsNone(doc.text)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(conflicts, [])
+
+    def test_untitled_buffer_and_bad_edits(self):
+        doc = self.restore(None, "one\ntwo", [["i", 1, "2.3", "!"], ["i", 1, "9.0", "lost"], ["i", 1, "1.0", "x"]])
+        self.assertEqual(doc.text.content, "one\ntwo!") # Replay stops at the first edit that does not apply
+        self.assertEqual(self.restore(None, None, [["i", 1, "1.0", "new"]]).text.content, "new")
+
+    def test_missing_file(self):
+        os.remove(self.path)
+        self.assertIsNone(self.restore(self.path, None, [["i", 1, "1.0", "x"]], "digest"))
+
+
+if __name__ == "__main__":
+    unittest.main()
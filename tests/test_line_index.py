@@ -0,0 +1,65 @@
+import mmap
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class LineIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patch = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.directory, "cache")})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def index(self, data=None):
+        path = os.path.join(self.directory, "big.log")
+        if data is not None:
+            with open(path, "wb") as output:
+                output.write(data)
+        with open(path, "rb") as source:
+            data = source.read()
+            mm = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        self.addCleanup(mm.close)
+        index = app.LineIndex(path, mm, len(data))
+        self.addCleanup(index.close)
+        deadline = time.monotonic() + 10
+        while not index.complete and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(index.complete)
+        return index
+
+    @mock.patch.object(app.LineIndex, "CHUNK_BYTES", 7) # Lines cut across chunks
+    def test_lines_match_split(self):
+        lines = [b"x" * (n % 11) for n in range(200)]
+        for data in (b"\n".join(lines), b"\n".join(lines) + b"\n"):
+            index = self.index(data)
+            expected = data.split(b"\n")
+            if data.endswith(b"\n"):
+                expected.pop()
+            self.assertEqual(index.line_count(), len(expected))
+            for number, line in enumerate(expected, 1):
+                start, end = index.line_span(number)
+                self.assertEqual(data[start:end], line)
+                self.assertEqual(index.line_of_offset(start), number)
+
+    def test_cache_is_reused_until_the_file_changes(self):
+        first = self.index(b"a\nb\nc")
+        with mock.patch.object(app.LineIndex, "_build") as build:
+            again = self.index()
+        build.assert_not_called()
+        self.assertEqual(list(again.offsets), list(first.offsets))
+        changed = self.index(b"a\nbb\nc\n")
+        self.assertEqual(list(changed.offsets), [0, 2, 5, 7])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import queue
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class OutputParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.project = os.path.join(self.tmp.name, "project")
+        os.makedirs(self.project)
+        self.main = self._touch(os.path.join(self.project, "main.py"))
+        self.util = self._touch(os.path.join(self.project, "util.py"))
+        self.library = self._touch(os.path.join(self.tmp.name, "library.py")) # Outside the project
+
+    def _touch(self, path):
+        open(path, "w").close()
+        return path
+
+    def parse(self, *chunks):
+        """Problems found in chunks, (text, tag) pairs, as (severity, path, line, column, message)."""
+        results = queue.Queue()
+        parser = app.OutputParser(self.project, results, "token")
+        for text, tag in chunks:
+            parser.feed(text, tag)
+        parser.close()
+        problems = []
+        while True:
+            token, batch = results.get(timeout=10)
+            self.assertEqual(token, "token")
+            if batch is None:
+                return problems
+            problems += [(p.severity, p.path, p.line, p.column, p.message) for p in batch]
+
+    def test_traceback_points_at_the_innermost_project_frame(self):
+        traceback = ("Traceback (most recent call last):\n"
+                     f'  File "{self.main}", line 10, in <module>\n'
+                     "    run()\n"
+                     f'  File "util.py", line 4, in run\n'
+                     "    helper()\n"
+                     f'  File "{self.library}", line 7, in helper\n'
+                     "    raise ValueError('bad')\n"
+                     "ValueError: bad\n"
+                     "done\n")
+        # Split at every few characters, lines included
+        chunks = [(traceback[i:i + 5], "stderr") for i in range(0, len(traceback), 5)]
+        self.assertEqual(self.parse(*chunks), [("error", self.util, 4, 0, "ValueError: bad")])
+
+    def test_library_frame_when_no_project_frame(self):
+        problems = self.parse(("Traceback (most recent call last):\n"
+                               f'  File "{self.library}", line 7, in helper\n'
+                               "KeyError: 'x'\n\nnext\n", "stderr"))
+        self.assertEqual(problems, [("error", self.library, 7, 0, "KeyError: 'x'")])
+
+    def test_stdout_does_not_interrupt_a_stderr_traceback(self):
+        problems = self.parse(("Traceback (most recent call last):\n", "stderr"),
+                              ("progress 50%\n", None),
+                              (f'  File "{self.main}", line 3, in <module>\n', "stderr"),
+                              ("progress 100%\n", None),
+                              ("RuntimeError: stop\n", "stderr"))
+        self.assertEqual(problems, [("error", self.main, 3, 0, "RuntimeError: stop")])
+
+    def test_only_the_last_chained_exception_is_reported(self):
+        for chain in app.TRACEBACK_CHAIN:
+            problems = self.parse(("Traceback (most recent call last):\n"
+                                   f'  File "{self.util}", line 2, in load\n'
+                                   "KeyError: 'x'\n"
+                                   "\n" + chain + "\n\n"
+                                   "Traceback (most recent call last):\n"
+                                   f'  File "{self.main}", line 8, in <module>\n'
+                                   "ValueError: missing x\n", "stderr"))
+            self.assertEqual(problems, [("error", self.main, 8, 0, "ValueError: missing x")])
+
+    def test_exception_line_at_the_end_of_the_output(self):
+        # Without a trailing newline, and with the other stream having printed after it
+        problems = self.parse(("Traceback (most recent call last):\n"
+                               f'  File "{self.main}", line 5, in <module>\n'
+                               "SystemError: last", "stderr"),
+                              ("bye\n", None))
+        self.assertEqual(problems, [("error", self.main, 5, 0, "SystemError: last")])
+
+    def test_diagnostic_lines(self):
+        problems = self.parse((f"main.py:3:5: E225 missing whitespace\r\n"
+                               f"{self.util}:9: warning: unused value\n"
+                               "missing.py:1: not a file\n"
+                               "ratio 1:2: not a path\n", None))
+        self.assertEqual(problems, [("error", self.main, 3, 4, "E225 missing whitespace"),
+                                    ("warning", self.util, 9, 0, "warning: unused value")])
+
+
+if __name__ == "__main__":
+    unittest.main()
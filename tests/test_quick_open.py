@@ -0,0 +1,94 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def run(job):
+    try:
+        while True:
+            next(job)
+    except StopIteration as done:
+        return done.value
+
+
+class GitignoreTest(unittest.TestCase):
+
+    def rules(self, text, relative=""):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, ".gitignore"), "w", encoding="utf-8") as source:
+                source.write(text)
+            return app._gitignore_rules(directory, relative)
+
+    def test_patterns(self):
+        rules = self.rules("# comment\n*.pyc\nbuild/\n/dist\ndocs/**/*.tmp\n!keep.pyc\nlog?.txt\n[ab].md\n")
+        cases = [("x.pyc", False, True), ("src/x.pyc", False, True), ("src/keep.pyc", False, False),
+                 ("build", True, True), ("build", False, False), ("src/build", True, True),
+                 ("dist", True, True), ("src/dist", True, False),
+                 ("docs/a.tmp", False, True), ("docs/a/b/c.tmp", False, True), ("a.tmp", False, False),
+                 ("log1.txt", False, True), ("log10.txt", False, False), ("a.md", False, True), ("c.md", False, False)]
+        for relative, is_dir, ignored in cases:
+            self.assertEqual(app._is_ignored(rules, relative, is_dir), ignored, relative)
+
+    def test_nested_rules_are_relative_to_their_directory(self):
+        rules = self.rules("/out\n*.log\n", "pkg")
+        self.assertTrue(app._is_ignored(rules, "pkg/out", True))
+        self.assertFalse(app._is_ignored(rules, "out", True))
+        self.assertFalse(app._is_ignored(rules, "pkg/src/out", True))
+        self.assertTrue(app._is_ignored(rules, "pkg/src/a.log", False))
+        self.assertFalse(app._is_ignored(rules, "a.log", False))
+
+
+class ProjectFileListTest(unittest.TestCase):
+
+    def test_crawl_honours_gitignore_and_is_cached(self):
+        with tempfile.TemporaryDirectory() as root, \
+                mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(root, ".cache")}):
+            files = {".gitignore": "*.log\n.cache/\n", "a.py": "", "debug.log": "", "pkg/.gitignore": "gen/\n",
+                     "pkg/b.py": "", "pkg/gen/c.py": "", "node_modules/d.js": "", "pkg/e.log": ""}
+            for name, text in files.items():
+                os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+                with open(os.path.join(root, name), "w") as output:
+                    output.write(text)
+            listing = app.ProjectFileList(root)
+            listing._crawl()
+            expected = [".gitignore", "a.py", "pkg/.gitignore", "pkg/b.py"]
+            self.assertEqual(listing.paths, expected)
+            self.assertEqual(app.ProjectFileList(root).paths, expected) # From the cache
+
+
+class FuzzyMatcherTest(unittest.TestCase):
+
+    @mock.patch.object(app.FuzzyMatcher, "CHUNK", 100) # Several slices per query
+    def test_memoized_queries_match_a_fresh_matcher(self):
+        rnd = random.Random(3)
+        words = ["foo", "Foo", "bar", "baz_1", "x", "ab", "abba"]
+        items = ["/".join(rnd.choice(words) + str(rnd.randint(0, 9)) for _ in range(rnd.randint(1, 3)))
+                 for _ in range(3000)]
+        matcher = app.FuzzyMatcher(items)
+        for _ in range(50):
+            query = ""
+            for char in rnd.choice(["foo/bar", "Foo", "ba1", "abba", "bz/x", "F/b"]):
+                query += char
+                self.assertEqual(run(matcher.match(query, 20)), run(app.FuzzyMatcher(items).match(query, 20)))
+
+    def test_capitals_make_the_query_case_sensitive(self):
+        matcher = app.FuzzyMatcher(["src/Main.py", "src/main.py", "domain.txt"])
+        self.assertEqual(run(matcher.match("Main")), ["src/Main.py"])
+        self.assertEqual(set(run(matcher.match("main"))), {"src/Main.py", "src/main.py", "domain.txt"})
+
+    def test_file_name_match_with_a_long_path_is_ranked(self):
+        # Thousands of shorter paths matching the query only as a scattered subsequence
+        items = [f"s{n}/e/t/t/i/n/g/s.txt" for n in range(5000)]
+        deep = "very/deeply/nested/package/directory/of/the/project/settings.py"
+        matcher = app.FuzzyMatcher(items + [deep])
+        self.assertEqual(run(matcher.match("settings", 5))[0], deep)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import queue
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class FakeText:
+    """What StreamingFileLoader needs of a Text widget; after() runs the step at once."""
+
+    def __init__(self):
+        self.content = ""
+
+    def config(self, **options):
+        pass
+
+    def insert(self, index, chunk):
+        self.content += chunk
+
+    def after(self, ms, callback):
+        callback()
+
+
+class WriteFileAtomicallyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "file.txt")
+
+    def test_replaces_content_and_keeps_the_mode(self):
+        with open(self.path, "w") as output_file:
+            output_file.write("old content, longer than the new one")
+        os.chmod(self.path, 0o640)
+        written = app._write_file_atomically(self.path, "new\ntext")
+        with open(self.path) as input_file:
+            self.assertEqual(input_file.read(), "new\ntext")
+        self.assertEqual(os.stat(self.path).st_mode & 0o7777, 0o640)
+        self.assertEqual(written.st_mtime_ns, os.stat(self.path).st_mtime_ns)
+        self.assertEqual(os.listdir(self.tmp.name), ["file.txt"]) # No temporary file left
+
+    def test_new_file_follows_the_umask(self):
+        for umask in (0o022, 0o077, 0o002):
+            with mock.patch.object(app, "_UMASK", umask):
+                path = os.path.join(self.tmp.name, f"new{umask:o}.txt")
+                app._write_file_atomically(path, "x")
+                self.assertEqual(os.stat(path).st_mode & 0o7777, 0o666 & ~umask)
+
+    def test_umask_is_the_process_umask(self):
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(app._UMASK, umask)
+
+    @unittest.skipIf(os.name == "nt", "symlinks need privileges on Windows")
+    def test_symlink_target_is_replaced(self):
+        with open(self.path, "w") as output_file:
+            output_file.write("old")
+        link = os.path.join(self.tmp.name, "link.txt")
+        os.symlink(self.path, link)
+        app._write_file_atomically(link, "via link")
+        self.assertTrue(os.path.islink(link))
+        with open(self.path) as input_file:
+            self.assertEqual(input_file.read(), "via link")
+
+    def test_failed_write_keeps_the_old_file(self):
+        with open(self.path, "w") as output_file:
+            output_file.write("old")
+        with self.assertRaises(UnicodeEncodeError):
+            app._write_file_atomically(self.path, "lone surrogate \udc80")
+        with open(self.path) as input_file:
+            self.assertEqual(input_file.read(), "old")
+        self.assertEqual(os.listdir(self.tmp.name), ["file.txt"])
+
+
+class SaveSkipTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "file.txt")
+        with open(self.path, "w") as output_file:
+            output_file.write("first line\nsecond line ñ\n")
+        self.editor = types.SimpleNamespace(_save_queue=queue.Queue())
+
+    def load(self):
+        """A document as _on_load_done leaves it, and the text loaded."""
+        text = FakeText()
+        loader = app.StreamingFileLoader(text, self.path)
+        done = []
+        loader.start(lambda read, size: None, lambda: done.append(True), self.fail)
+        self.assertEqual(done, [True])
+        doc = types.SimpleNamespace(path=self.path, loader=loader, saved=None, journal_id=1, text=mock.Mock(),
+                                    large_file_mode=False, restore_view=False)
+        app.CodeEditor._on_load_done(mock.Mock(), doc) # A background tab: only its own state is set up
+        self.assertIsNone(doc.loader)
+        return doc, text.content
+
+    def save(self, doc, text):
+        snapshot = app.TextSnapshot((tuple(text.split("\n")),), 1, text.count("\n") + 1)
+        app.CodeEditor._save_worker(self.editor, doc, self.path, snapshot, None)
+        return self.editor._save_queue.get_nowait()[-1]
+
+    def test_saving_a_file_just_loaded_skips_the_write(self):
+        doc, text = self.load()
+        before = os.stat(self.path).st_mtime_ns
+        self.assertEqual(self.save(doc, text), "unchanged")
+        self.assertEqual(os.stat(self.path).st_mtime_ns, before)
+
+    def test_edited_text_is_written_then_skipped(self):
+        doc, text = self.load()
+        self.assertEqual(self.save(doc, text + "third\n"), "written")
+        self.assertEqual(self.save(doc, text + "third\n"), "unchanged")
+        with open(self.path) as input_file:
+            self.assertEqual(input_file.read(), text + "third\n")
+
+    def test_file_changed_on_disk_is_written(self):
+        doc, text = self.load()
+        with open(self.path, "w") as output_file:
+            output_file.write("changed elsewhere\n")
+        os.utime(self.path, ns=(0, doc.saved[2][1] + 1))
+        self.assertEqual(self.save(doc, text), "written")
+        with open(self.path) as input_file:
+            self.assertEqual(input_file.read(), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
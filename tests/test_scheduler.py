@@ -0,0 +1,94 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class FakeMaster:
+    """Just the after() scheduling of a Tk root, run by hand."""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.errors = []
+        self._ids = 0
+
+    def after(self, ms, callback):
+        self._ids += 1
+        self.callbacks[self._ids] = callback
+        return self._ids
+
+    def after_cancel(self, job):
+        self.callbacks.pop(job, None)
+
+    def report_callback_exception(self, kind, value, traceback):
+        self.errors.append(value)
+
+    def run(self, ticks=20):
+        for _ in range(ticks):
+            if not self.callbacks:
+                return
+            job = min(self.callbacks)
+            self.callbacks.pop(job)()
+
+
+class RefreshSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.master = FakeMaster()
+        self.scheduler = app.RefreshScheduler(self.master)
+        self.calls = []
+
+    def test_requests_before_a_run_are_merged(self):
+        self.scheduler.register("gutter", lambda: self.calls.append("gutter"), 0)
+        for _ in range(5):
+            self.scheduler.mark_dirty("gutter")
+        self.master.run()
+        self.assertEqual(self.calls, ["gutter"])
+        self.assertEqual(self.scheduler.stats["gutter"]["requests"], 5)
+
+    def test_sliced_job_runs_to_the_end(self):
+        def job():
+            for step in range(3):
+                self.calls.append(step)
+                yield
+        self.scheduler.register("highlight", job, 0)
+        self.scheduler.mark_dirty("highlight")
+        self.master.run()
+        self.assertEqual(self.calls, [0, 1, 2])
+        self.assertFalse(self.scheduler._running)
+
+    def test_failing_job_is_reported_and_the_others_keep_running(self):
+        def fail():
+            raise ValueError("job")
+        self.scheduler.register("diagnostics", fail, 0)
+        self.scheduler.register("status", lambda: self.calls.append("status"), 0)
+        self.scheduler.mark_dirty("diagnostics")
+        self.scheduler.mark_dirty("status")
+        self.master.run()
+        self.assertEqual(self.calls, ["status"])
+        self.assertEqual([str(error) for error in self.master.errors], ["job"])
+        self.scheduler.mark_dirty("status") # Not stalled
+        self.master.run()
+        self.assertEqual(self.calls, ["status", "status"])
+
+    def test_failing_slice_is_dropped(self):
+        def job():
+            self.calls.append("slice")
+            yield
+            raise ValueError("slice")
+        self.scheduler.register("symbols", job, 0)
+        self.scheduler.register("gutter", lambda: self.calls.append("gutter"), 0)
+        self.scheduler.mark_dirty("symbols")
+        self.master.run()
+        self.assertEqual(self.calls, ["slice"])
+        self.assertEqual(len(self.master.errors), 1)
+        self.assertFalse(self.scheduler._running)
+        self.scheduler.mark_dirty("gutter")
+        self.master.run()
+        self.assertEqual(self.calls, ["slice", "gutter"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import random
+import re
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+WORDS = ["foo", "Foo", "bar", "baz_1", "x", "ab", "abba", "Über", "def", "kelvin", "\u212aelvin", "Stra\u00dfe",
+         "STRA\u1e9eE", "\u017fs", "  "]
+
+
+class RequiredLiteralsTest(unittest.TestCase):
+
+    def test_plain_text_is_its_own_literal(self):
+        self.assertEqual(app._required_literals("a.b|c", False), ["a.b|c"])
+
+    def test_regex_literals(self):
+        cases = {
+            r"foo\s+bar": ["foo", "bar"],
+            r"def\.run": ["def.run"],
+            "colou?r": ["colo"],
+            "abc*def": ["def"],
+            "x{2}abcd": ["abcd"],
+            "[abc]def(ghi)jkl": ["def", "jkl"],
+            r"\bword\d+": ["word"],
+            "(foo|bar)baz": ["baz"],
+            "foo|bar": [],
+            "ab": [],
+            "(?x) foo bar": [],
+        }
+        for pattern, literals in cases.items():
+            self.assertEqual(app._required_literals(pattern, True), literals, pattern)
+
+
+class TrigramIndexTest(unittest.TestCase):
+
+    QUERIES = [("foo", False), ("Baz_1", False), ("ab ab", False), (r"foo\s+bar", True), ("ab+a", True),
+               ("(foo|bar)baz", True), (r"def\.x", True), ("ba[rz]_?1", True), ("x{2}abba", True),
+               ("KELVIN", False), ("\u212aelvin", False), ("strasse", False), ("STRA\u00dfe", False),
+               ("sss", False), ("(?i)ELVIN", True), ("über", False)]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        patch = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.root, ".cache")})
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.pool = ThreadPoolExecutor(2)
+        self.addCleanup(self.pool.shutdown)
+
+    def write(self, name, text):
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(text)
+        return path
+
+    def test_candidates_cover_every_matching_file(self):
+        rnd = random.Random(4)
+        sources = {}
+        for n in range(80):
+            text = "\n".join(" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 4)))
+                             for _ in range(rnd.randint(1, 5)))
+            sources[self.write(f"f{n}.txt", text)] = text
+        index = app.TrigramIndex(self.root)
+        index.update(self.pool)
+        for query, is_regex in self.QUERIES:
+            for flags in (0, re.IGNORECASE):
+                pattern = re.compile(query if is_regex else re.escape(query), flags)
+                matching = {path for path, text in sources.items() if pattern.search(text)}
+                candidates = index.candidates(app._required_literals(query, is_regex),
+                                              bool(pattern.flags & re.IGNORECASE))
+                if candidates is not None:
+                    self.assertLessEqual(matching, set(candidates), (query, flags))
+
+    def test_kelvin_sign_matches_ignoring_case(self):
+        ascii_file = self.write("a.txt", "kelvin")
+        sign_file = self.write("b.txt", "\u212aelvin")
+        self.write("c.txt", "celsius")
+        index = app.TrigramIndex(self.root)
+        index.update(self.pool)
+        self.assertEqual(set(index.candidates(["kelvin"], True)), {ascii_file, sign_file})
+        self.assertEqual(set(index.candidates(["\u212aelvin"], True)), {ascii_file, sign_file})
+        self.assertEqual(index.candidates(["kelvin"]), [ascii_file])
+
+    def test_update_follows_the_files_on_disk(self):
+        kept = self.write("kept.txt", "alpha")
+        changed = self.write("changed.txt", "alpha")
+        removed = self.write("removed.txt", "alpha")
+        index = app.TrigramIndex(self.root)
+        index.update(self.pool)
+        self.assertEqual(set(index.candidates(["alpha"])), {kept, changed, removed})
+        self.write("changed.txt", "omega, now longer")
+        os.remove(removed)
+        added = self.write("added.txt", "alpha")
+        index.update(self.pool)
+        self.assertEqual(set(index.candidates(["alpha"])), {kept, added})
+        self.assertEqual(index.candidates(["omega"]), [changed])
+        reloaded = app.TrigramIndex(self.root)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(set(reloaded.candidates(["alpha"])), {kept, added})
+
+
+if __name__ == "__main__":
+    unittest.main()
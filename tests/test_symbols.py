@@ -0,0 +1,157 @@
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class PythonSymbolsTest(unittest.TestCase):
+
+    def test_scopes_and_containers(self):
+        source = ("import os\n"
+                  "LIMIT = 10\n"
+                  "class Outer:\n"
+                  "    size: int = 0\n"
+                  "    class Inner:\n"
+                  "        def run(self):\n"
+                  "            local = 1\n"
+                  "            def helper():\n"
+                  "                pass\n"
+                  "    async def fetch(self):\n"
+                  "        pass\n"
+                  "if os.name == 'nt':\n"
+                  "    def platform(): pass\n"
+                  "else:\n"
+                  "    try:\n"
+                  "        import fcntl\n"
+                  "    except ImportError:\n"
+                  "        fcntl = None\n"
+                  "a, b = 1, 2\n")
+        self.assertEqual(app._python_symbols(source), [
+            ("LIMIT", "variable", 2, 0, ""),
+            ("Outer", "clase", 3, 0, ""),
+            ("size", "variable", 4, 4, "Outer"),
+            ("Inner", "clase", 5, 4, "Outer"),
+            ("run", "método", 6, 8, "Outer.Inner"),
+            ("helper", "función", 8, 12, "Outer.Inner.run"),
+            ("fetch", "método", 10, 4, "Outer"),
+            ("platform", "función", 13, 4, ""),
+            ("fcntl", "variable", 18, 8, ""),
+        ])
+
+    def test_columns_count_characters(self):
+        self.assertEqual(app._python_symbols("ñandú = 1; café = 2\n"),
+                         [("ñandú", "variable", 1, 0, ""), ("café", "variable", 1, 11, "")])
+
+    def test_source_that_does_not_parse_falls_back_to_regexes(self):
+        source = "class A:\n    def f(self):\n        return (\n"
+        self.assertEqual(app._python_symbols(source), [("A", "clase", 1, 6, ""), ("f", "función", 2, 8, "")])
+
+
+class RegexSymbolsTest(unittest.TestCase):
+
+    def test_javascript(self):
+        source = ("export default class Widget {\n"
+                  "  render(props) {\n"
+                  "    if (props) {\n"
+                  "    }\n"
+                  "  }\n"
+                  "}\n"
+                  "async function* load() {}\n"
+                  "const add = (a, b) => a + b;\n"
+                  "let value = 3;\n")
+        self.assertEqual([symbol[:3] for symbol in app._source_symbols(source, "javascript")],
+                         [("Widget", "clase", 1), ("render", "método", 2), ("load", "función", 7),
+                          ("add", "función", 8)])
+
+    def test_css(self):
+        source = "body, p {\n  margin: 0;\n}\n@media (max-width: 600px) {\n  .card > a {\n  }\n}\n"
+        self.assertEqual([symbol[:4] for symbol in app._source_symbols(source, "css")],
+                         [("body, p", "selector", 1, 0), ("@media (max-width: 600px)", "regla @", 4, 0),
+                          (".card > a", "selector", 5, 2)])
+
+
+class SymbolIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        patch = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.root, ".cache")})
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.pool = ThreadPoolExecutor(2)
+        self.addCleanup(self.pool.shutdown)
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(text)
+        if mtime is not None:
+            os.utime(path, ns=(mtime, mtime))
+        return path
+
+    def names(self, index):
+        return {os.path.relpath(path, self.root): [symbol[0] for symbol in symbols]
+                for path, symbols in index.symbols().items()}
+
+    def test_update_follows_the_tree(self):
+        self.write("a.py", "def a(): pass\n")
+        self.write("web/b.js", "function b() {}\n")
+        self.write("notes.txt", "def not_code(): pass\n")
+        index = app.SymbolIndex(self.root)
+        index.update(self.pool)
+        self.assertTrue(index.complete)
+        self.assertEqual(self.names(index), {"a.py": ["a"], os.path.join("web", "b.js"): ["b"]})
+
+        version = index.version
+        index.update(self.pool)
+        self.assertEqual(index.version, version) # Nothing changed
+
+        self.write("a.py", "def a2(): pass\n", mtime=1)
+        os.remove(os.path.join(self.root, "web", "b.js"))
+        self.write("c.css", ".c {}\n")
+        index.update(self.pool)
+        self.assertGreater(index.version, version)
+        self.assertEqual(self.names(index), {"a.py": ["a2"], "c.css": [".c"]})
+
+    def test_touched_file_is_not_parsed_again(self):
+        path = self.write("a.py", "class A: pass\n", mtime=1)
+        index = app.SymbolIndex(self.root)
+        index.update(self.pool)
+        os.utime(path, ns=(2, 2))
+        with mock.patch.object(app, "_source_symbols") as parse:
+            index.update(self.pool)
+        parse.assert_not_called()
+        self.assertEqual(index.files[path][:2], (os.path.getsize(path), 2))
+        self.assertEqual(self.names(index), {"a.py": ["A"]})
+
+    def test_cache_is_reloaded(self):
+        self.write("a.py", "def a(): pass\n")
+        index = app.SymbolIndex(self.root)
+        self.assertFalse(index.load())
+        index.update(self.pool)
+        reloaded = app.SymbolIndex(self.root)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.files, index.files)
+        with mock.patch.object(app, "_file_symbols") as parse:
+            reloaded.update(self.pool)
+        parse.assert_not_called()
+
+    def test_update_file(self):
+        path = self.write("a.py", "def a(): pass\n")
+        index = app.SymbolIndex(self.root)
+        index.update(self.pool)
+        self.write("a.py", "def a(): pass\ndef saved(): pass\n")
+        index.update_file(path)
+        index.update_file(self.write("readme.md", "# Title\n"))
+        self.assertEqual(self.names(index), {"a.py": ["a", "saved"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class TextBufferTest(unittest.TestCase):
+
+    def test_lookups(self):
+        buffer = app.TextBuffer("one\ntwo\n\nfour")
+        self.assertEqual((buffer.line_count, buffer.char_count), (4, 13))
+        self.assertEqual(buffer.line(2), "two")
+        self.assertEqual(buffer.lines(2, 9), ["two", "", "four"]) # Clipped at the end
+        self.assertEqual(buffer.offset(4, 2), 11)
+        self.assertEqual(buffer.position(11), (4, 2))
+        self.assertEqual(buffer.position(4), (2, 0))
+        self.assertEqual(buffer.position(3), (1, 3)) # The newline belongs to its line
+        self.assertEqual(buffer.position(99), (4, 4))
+
+    def test_apply_updates_version_and_notifies(self):
+        buffer = app.TextBuffer("a\nb\nc")
+        seen = []
+        buffer.listeners.append(lambda change: seen.append((change.version, buffer.lines(1, buffer.line_count))))
+        change = app.TextChange("2.0", "2.1", "x\ny", 2, 2, 3)
+        buffer.apply(change, "x\ny")
+        self.assertEqual(change.version, buffer.version)
+        self.assertEqual(seen, [(buffer.version, ["a", "x", "y", "c"])])
+
+    def test_snapshot_is_not_changed_by_later_edits(self):
+        buffer = app.TextBuffer("a\nb")
+        snapshot = buffer.snapshot()
+        buffer.replace_lines(1, 2, ["c"])
+        buffer.reset("d\ne\nf")
+        self.assertEqual(snapshot.text(), "a\nb")
+        self.assertEqual(list(snapshot.lines()), ["a", "b"])
+        self.assertEqual((snapshot.version, snapshot.line_count), (1, 2))
+
+    @mock.patch.object(app.TextBuffer, "CHUNK_LINES", 4) # Many chunks, split often
+    @mock.patch.object(app.TextBuffer, "MAX_CHUNK", 8)
+    def test_edits_match_a_list_of_lines(self):
+        rnd = random.Random(1)
+        words = ["foo", "bar", "ñu", "", "  "]
+
+        def random_line():
+            return " ".join(rnd.choice(words) for _ in range(rnd.randint(0, 4)))
+
+        model = [random_line() for _ in range(50)]
+        buffer = app.TextBuffer("\n".join(model))
+        for _ in range(500):
+            first = rnd.randint(1, len(model))
+            last = min(len(model), first + rnd.randint(0, 12))
+            lines = [random_line() for _ in range(rnd.randint(1, 12))]
+            buffer.replace_lines(first, last, lines)
+            model[first - 1:last] = lines
+            text = "\n".join(model)
+            self.assertEqual((buffer.line_count, buffer.char_count), (len(model), len(text)))
+            self.assertEqual(buffer.snapshot().text(), text)
+            self.assertLessEqual(max(map(len, buffer.chunks)), app.TextBuffer.MAX_CHUNK)
+            first = rnd.randint(1, len(model))
+            last = rnd.randint(first, len(model))
+            self.assertEqual(buffer.lines(first, last), model[first - 1:last])
+            offset = rnd.randint(0, len(text))
+            line = text.count("\n", 0, offset) + 1
+            column = offset - text.rfind("\n", 0, offset) - 1
+            self.assertEqual(buffer.position(offset), (line, column))
+            self.assertEqual(buffer.offset(line, column), offset)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+class InlineExecutor:
+    def submit(self, function, *args):
+        function(*args)
+
+
+class DiffSnapshotsTest(unittest.TestCase):
+
+    def test_added_removed_and_renamed(self):
+        old = {"a.py": (1, "file"), "b.py": (2, "file"), "src": (3, "folder")}
+        new = {"a.py": (1, "file"), "c.py": (2, "file"), "lib": (4, "folder")}
+        added, removed, renamed = app._diff_snapshots(old, new)
+        self.assertEqual(added, [("lib", "folder")])
+        self.assertEqual(removed, [("src", "folder")])
+        self.assertEqual(renamed, [("b.py", "c.py", "file")])
+
+    def test_unknown_inodes_are_not_renames(self):
+        added, removed, renamed = app._diff_snapshots({"a": (0, "file")}, {"b": (0, "file")})
+        self.assertEqual((added, removed, renamed), ([("b", "file")], [("a", "file")], []))
+
+
+class DirectoryWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        for name in ("keep.txt", "old.txt", "gone.txt"):
+            open(os.path.join(self.root, name), "w").close()
+        self.changes = []
+
+    def watcher(self):
+        watcher = app.DirectoryWatcher(mock.MagicMock(), InlineExecutor(),
+                                       lambda *change: self.changes.append(change))
+        watcher.watch(self.root, "node", app._snapshot_directory(self.root))
+        return watcher
+
+    def change_files(self):
+        os.rename(os.path.join(self.root, "old.txt"), os.path.join(self.root, "new.txt"))
+        os.remove(os.path.join(self.root, "gone.txt"))
+        os.mkdir(os.path.join(self.root, "sub"))
+
+    def assertReported(self):
+        self.assertEqual(self.changes, [("node", self.root, [("sub", "folder")], [("gone.txt", "file")],
+                                         [("old.txt", "new.txt", "file")])])
+
+    def test_polling_reports_the_changes_once(self):
+        with mock.patch.object(app._Inotify, "create", return_value=None):
+            watcher = self.watcher()
+        self.change_files()
+        watcher.dirs[self.root]["mtime"] = None # Never equal, whatever the mtime resolution
+        watcher._tick()
+        self.assertReported()
+        watcher._last_poll = 0
+        watcher._tick()
+        self.assertEqual(len(self.changes), 1)
+
+    def test_inotify_reports_the_changes(self):
+        watcher = self.watcher()
+        if watcher._inotify is None:
+            self.skipTest("inotify is not available")
+        self.addCleanup(os.close, watcher._inotify.fd)
+        self.assertIsNotNone(watcher.dirs[self.root]["wd"])
+        self.change_files()
+        watcher._tick()
+        self.assertReported()
+
+
+if __name__ == "__main__":
+    unittest.main()